@@ -0,0 +1,158 @@
+import argparse
+import json
+import os
+import platform
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from wsgiref.util import setup_testing_defaults
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'voting_backend.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.handlers.wsgi import WSGIHandler  # noqa: E402
+from django.db import connection, connections  # noqa: E402
+from django.db.backends.signals import connection_created  # noqa: E402
+
+from benchmarks.stats import summarize  # noqa: E402
+from voting_backend.models import VoteCampaign  # noqa: E402
+
+MODES = ('per-request', 'persistent', 'pooled')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Measure what connecting to PostgreSQL costs per request, with and without connection reuse'
+    )
+    parser.add_argument('--modes', nargs='+', choices=MODES, default=list(MODES))
+    parser.add_argument('--requests', type=int, default=2000, help='Number of requests per mode')
+    parser.add_argument('--concurrency', type=int, default=8)
+    parser.add_argument('--pool-size', type=int, default=4, help='Maximum connections of the pool in pooled mode')
+    parser.add_argument('--campaign', type=int, help='Campaign ID whose detail is requested, first campaign by default')
+    parser.add_argument('--connect-samples', type=int, default=200, help='Number of bare connects to time')
+    parser.add_argument('--label', default='run')
+    parser.add_argument('--output', help='Write JSON report to this file instead of stdout')
+    args = parser.parse_args()
+    if connection.vendor != 'postgresql':
+        parser.error('DATABASE_URL must point to PostgreSQL')
+    return args
+
+
+def get_options(mode, pool_size):
+    """
+    Database settings of a mode, as set by settings.py from the environment
+    """
+    if mode == 'per-request':
+        return {'CONN_MAX_AGE': 0, 'CONN_HEALTH_CHECKS': False, 'POOL': None}
+    if mode == 'persistent':
+        return {'CONN_MAX_AGE': 60, 'CONN_HEALTH_CHECKS': True, 'POOL': None}
+    return {
+        'CONN_MAX_AGE': 0,
+        'CONN_HEALTH_CHECKS': True,
+        'POOL': {'MIN_SIZE': pool_size, 'MAX_SIZE': pool_size, 'TIMEOUT': 10},
+    }
+
+
+def measure_connect(samples):
+    """
+    Time opening and closing a bare connection, what each request pays without reuse
+    """
+    conn_params = connection.get_connection_params()
+    elapsed = []
+    for _ in range(samples):
+        start = time.perf_counter()
+        raw_connection = connection.Database.connect(**conn_params)
+        raw_connection.close()
+        elapsed.append(time.perf_counter() - start)
+    return summarize(elapsed)
+
+
+def get_environ(path):
+    host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS and settings.ALLOWED_HOSTS[0] != '*' else 'localhost'
+    environ = {'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'HTTP_HOST': host.lstrip('.')}
+    setup_testing_defaults(environ)
+    return environ
+
+
+def run_mode(mode, args, path):
+    """
+    Send requests through the WSGI handler from concurrent threads. Unlike the Django test client,
+    the handler closes connections at the end of each request as configured, as a server would.
+    """
+    connections.databases['default'].update(get_options(mode, args.pool_size))
+    handler = WSGIHandler()
+    lock = threading.Lock()
+    # Backend process IDs of connections handed to requests, pooled connections are handed out many times
+    connects = []
+    latencies = []
+    statuses = set()
+
+    def count_connection(sender, connection, **kwargs):
+        with lock:
+            connects.append(connection.connection.get_backend_pid())
+
+    def worker(count):
+        try:
+            for _ in range(count):
+                start = time.perf_counter()
+                response = handler(get_environ(path), lambda status, headers: None)
+                b''.join(response)
+                response.close()
+                elapsed = time.perf_counter() - start
+                with lock:
+                    latencies.append(elapsed)
+                    statuses.add(response.status_code)
+        finally:
+            connections.close_all()
+
+    connection_created.connect(count_connection)
+    started = time.perf_counter()
+    try:
+        counts = [args.requests // args.concurrency] * args.concurrency
+        counts[0] += args.requests % args.concurrency
+        with ThreadPoolExecutor(max_workers=args.concurrency) as executor:
+            list(executor.map(worker, counts))
+    finally:
+        connection_created.disconnect(count_connection)
+    elapsed = time.perf_counter() - started
+    return {
+        'mode': mode,
+        'database': {
+            key: value for key, value in connections.databases['default'].items()
+            if key in ('CONN_MAX_AGE', 'CONN_HEALTH_CHECKS', 'POOL')
+        },
+        'statuses': sorted(statuses),
+        'connects': len(connects),
+        'server_connections': len(set(connects)),
+        'latency_ms': summarize(latencies),
+        'requests_per_s': len(latencies) / elapsed if elapsed else None,
+    }
+
+
+def main():
+    args = parse_args()
+    campaign_id = args.campaign or VoteCampaign.objects.order_by('campaign_id').values_list('campaign_id', flat=True)[0]
+    connection.close()
+    path = f'/campaign/{campaign_id}/'
+    report = {
+        'label': args.label,
+        'python': platform.python_version(),
+        'requests': args.requests,
+        'concurrency': args.concurrency,
+        'path': path,
+        'connect_ms': measure_connect(args.connect_samples),
+        'modes': [run_mode(mode, args, path) for mode in args.modes],
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
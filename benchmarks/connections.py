@@ -0,0 +1,113 @@
+import argparse
+import asyncio
+import json
+import time
+from urllib.parse import urlsplit
+
+from benchmarks.stats import summarize
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Hold many live result streams open on a running server and probe its latency meanwhile'
+    )
+    parser.add_argument('--url', default='http://localhost:8000', help='Base URL of the server')
+    parser.add_argument('--campaign', type=int, required=True, help='Campaign ID to stream and probe')
+    parser.add_argument('--connections', type=int, default=1000, help='Number of streams to open')
+    parser.add_argument('--hold', type=float, default=10, help='Seconds to keep the streams open')
+    parser.add_argument('--probes', type=int, default=50, help='Number of campaign detail requests sent while holding')
+    parser.add_argument('--timeout', type=float, default=5, help='Seconds to wait for response headers')
+    parser.add_argument('--label', default='run')
+    parser.add_argument('--output', help='Write JSON report to this file instead of stdout')
+    return parser.parse_args()
+
+
+async def request(host, port, path, timeout, headers=''):
+    """
+    Send GET request and return (reader, writer, seconds until response headers)
+    """
+    start = time.perf_counter()
+    reader, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    writer.write(f'GET {path} HTTP/1.1\r\nHost: {host}:{port}\r\n{headers}\r\n'.encode('latin-1'))
+    head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout)
+    if not head.split(b' ', 2)[1].startswith(b'2'):
+        writer.close()
+        raise ConnectionError(head.split(b'\r\n', 1)[0].decode('latin-1'))
+    return reader, writer, time.perf_counter() - start
+
+
+async def hold_stream(host, port, path, timeout, until):
+    """
+    Open live result stream and read it until the given time, return seconds until headers or None on failure
+    """
+    try:
+        reader, writer, elapsed = await request(host, port, path, timeout, 'Accept: text/event-stream\r\n')
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+        return None
+    try:
+        while time.monotonic() < until:
+            try:
+                if not await asyncio.wait_for(reader.read(4096), until - time.monotonic()):
+                    break
+            except asyncio.TimeoutError:
+                break
+    finally:
+        writer.close()
+    return elapsed
+
+
+async def probe(host, port, path, timeout):
+    start = time.perf_counter()
+    try:
+        reader, writer, _ = await request(host, port, path, timeout, 'Connection: close\r\n')
+        await asyncio.wait_for(reader.read(), timeout)
+        writer.close()
+        return time.perf_counter() - start
+    except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError):
+        return None
+
+
+async def run(args):
+    url = urlsplit(args.url)
+    host, port = url.hostname, url.port or 80
+    until = time.monotonic() + args.timeout + args.hold
+    streams = [
+        asyncio.ensure_future(hold_stream(host, port, f'/campaign/{args.campaign}/live/', args.timeout, until))
+        for _ in range(args.connections)
+    ]
+    # Let the streams connect before probing
+    await asyncio.sleep(args.timeout)
+    probe_started = time.perf_counter()
+    probes = []
+    for _ in range(args.probes):
+        probes.append(await probe(host, port, f'/campaign/{args.campaign}/', args.timeout))
+    probe_elapsed = time.perf_counter() - probe_started
+    connected = [elapsed for elapsed in await asyncio.gather(*streams) if elapsed is not None]
+    answered = [elapsed for elapsed in probes if elapsed is not None]
+    return {
+        'label': args.label,
+        'url': args.url,
+        'connections': args.connections,
+        'connected': len(connected),
+        'connect_ms': summarize(connected),
+        'probes': args.probes,
+        'probes_answered': len(answered),
+        'probe_ms': summarize(answered),
+        'probe_requests_per_s': len(answered) / probe_elapsed if probe_elapsed else None,
+    }
+
+
+def main():
+    args = parse_args()
+    loop = asyncio.get_event_loop()
+    report = loop.run_until_complete(run(args))
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
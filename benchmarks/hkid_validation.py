@@ -0,0 +1,117 @@
+import argparse
+import json
+import platform
+import random
+import re
+import string
+import timeit
+
+from benchmarks.hkids import iter_hkids
+from voting_backend.forms import check_hkid, check_hkids
+
+
+class LegacyHKIDValidator:
+    """
+    HKID validation as HKIDField did it before the table-driven validator, kept as reference.
+    Check digit 0 is compared as a string, the original compared it to the integer 0 and so
+    rejected every HKID whose check digit is 0.
+    """
+    @staticmethod
+    def id_char_to_value(char):
+        try:
+            digit_value = int(char)
+            return digit_value
+        except ValueError:
+            return ord(char) - ord('A') + 10
+
+    @staticmethod
+    def hkid_checksum(digit_sum, checksum):
+        remainder = digit_sum % 11
+        if remainder == 0 and checksum == '0':
+            return True
+        if remainder == 1 and checksum == 'A':
+            return True
+        if str(11-remainder) == checksum:
+            return True
+        return False
+
+    def get_digit_sum(self, value):
+        if len(value) == 9:
+            return sum([(9-ix) * self.id_char_to_value(digit) for ix, digit in enumerate(value)])
+        return  58*9 + sum([(8-ix)*self.id_char_to_value(digit) for ix, digit in enumerate(value)])
+
+    def check(self, value):
+        if not re.match('^([A-Z]{1,2})([0-9]{6})([A0-9])$', value):
+            return 'INCORRECT_PATTERN'
+        if not self.hkid_checksum(self.get_digit_sum(value[:-1]), value[-1]):
+            return 'INCORRECT_CHECKSUM'
+        return None
+
+
+def get_sample(size, invalid_ratio, seed=0):
+    """
+    Return valid HKIDs from across the prefix space, with invalid_ratio of them broken
+    by a wrong check digit or a character out of pattern
+    """
+    generator = random.Random(seed)
+    sample = [next(iter_hkids(generator.randrange(702000000))) for _ in range(size)]
+    for index in generator.sample(range(size), int(size * invalid_ratio)):
+        hkid = sample[index]
+        if generator.random() < 0.5:
+            sample[index] = hkid[:-1] + ('A' if hkid[-1] != 'A' else '0')
+        else:
+            position = generator.randrange(len(hkid))
+            sample[index] = hkid[:position] + generator.choice(string.punctuation) + hkid[position + 1:]
+    return sample
+
+
+def measure(function, repeat):
+    """
+    Return best time of function over repeat runs in seconds
+    """
+    return min(timeit.repeat(function, number=1, repeat=repeat))
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Compare the HKID validator with the implementation it replaced, one by one and in bulk'
+    )
+    parser.add_argument('--size', type=int, default=100000, help='Number of HKIDs validated per run')
+    parser.add_argument('--invalid-ratio', type=float, default=0.1)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--label', default='run')
+    parser.add_argument('--output', help='Write JSON report to this file instead of stdout')
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    sample = get_sample(args.size, args.invalid_ratio)
+    legacy = LegacyHKIDValidator()
+    if [legacy.check(value) for value in sample] != check_hkids(sample):
+        raise SystemExit('Validators disagree on the sample')
+
+    timings = {
+        'legacy': measure(lambda: [legacy.check(value) for value in sample], args.repeat),
+        'single': measure(lambda: [check_hkid(value) for value in sample], args.repeat),
+        'bulk': measure(lambda: check_hkids(sample), args.repeat),
+    }
+    report = {
+        'label': args.label,
+        'python': platform.python_version(),
+        'size': args.size,
+        'invalid_ratio': args.invalid_ratio,
+        'invalid': sum(1 for error in check_hkids(sample) if error),
+        'ns_per_hkid': {name: timing * 1e9 / args.size for name, timing in timings.items()},
+        'speedup': {name: timings['legacy'] / timing for name, timing in timings.items() if name != 'legacy'},
+    }
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
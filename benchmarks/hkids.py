@@ -0,0 +1,40 @@
+import string
+
+from voting_backend.forms import CHECK_DIGITS, get_digit_sum
+
+PREFIXES = list(string.ascii_uppercase) + [a + b for a in string.ascii_uppercase for b in string.ascii_uppercase]
+
+
+def get_weights(prefix):
+    """
+    Return digit sum of the prefix followed by zeros, and weight of each of the six digits.
+    Derived from the HKID validator so generated HKIDs follow exactly the rules enforced by the vote API.
+    """
+    base = get_digit_sum(prefix + '000000')
+    weights = [
+        get_digit_sum(prefix + '0' * position + '1' + '0' * (5 - position)) - base
+        for position in range(6)
+    ]
+    return base, weights
+
+
+def get_check_digit(digit_sum):
+    """
+    Return check digit accepted by the HKID validator
+    """
+    return CHECK_DIGITS[digit_sum % 11]
+
+
+def iter_hkids(start=0):
+    """
+    Iterate distinct valid HKIDs in a fixed order, starting from position start of the
+    (prefix, number) space. Iterations from positions far enough apart yield disjoint HKIDs.
+    """
+    prefix_index, first_number = divmod(start, 1000000)
+    for prefix in PREFIXES[prefix_index:]:
+        base, weights = get_weights(prefix)
+        for number in range(first_number, 1000000):
+            digits = f'{number:06d}'
+            digit_sum = base + sum(weight * int(digit) for weight, digit in zip(weights, digits))
+            yield prefix + digits + get_check_digit(digit_sum)
+        first_number = 0
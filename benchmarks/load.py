@@ -0,0 +1,275 @@
+import argparse
+import datetime
+import itertools
+import json
+import os
+import platform
+import sys
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.error import HTTPError
+from urllib.parse import urlencode
+from urllib.request import Request, urlopen
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'voting_backend.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.management.color import no_style  # noqa: E402
+from django.db import connection, connections  # noqa: E402
+from django.db.models import Max  # noqa: E402
+from django.test import Client  # noqa: E402
+from django.utils import timezone  # noqa: E402
+
+from benchmarks.hkids import iter_hkids  # noqa: E402
+from benchmarks.stats import summarize  # noqa: E402
+from voting_backend import counters, hashers  # noqa: E402
+from voting_backend.models import VoteCampaign, VoteOption, VoteRecord  # noqa: E402
+
+ENDPOINTS = ('vote', 'list', 'detail')
+QUESTION = 'Benchmark campaign {}'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description='Seed data and load test the public endpoints')
+    subparsers = parser.add_subparsers(dest='command')
+
+    seed_parser = subparsers.add_parser('seed', help='Insert active campaigns, options and vote records')
+    seed_parser.add_argument('--campaigns', type=int, default=10)
+    seed_parser.add_argument('--options', type=int, default=4)
+    seed_parser.add_argument('--records', type=int, default=1000000)
+    seed_parser.add_argument('--batch-size', type=int, default=5000)
+
+    run_parser = subparsers.add_parser('run', help='Send requests and report latency, throughput and queries')
+    run_parser.add_argument('--url', help='Base URL of a running server, requests go through Django test client in process if omitted')
+    run_parser.add_argument('--endpoints', nargs='+', choices=ENDPOINTS, default=list(ENDPOINTS))
+    run_parser.add_argument('--requests', type=int, default=1000, help='Number of requests per endpoint')
+    run_parser.add_argument('--concurrency', type=int, default=8)
+    run_parser.add_argument('--campaign', type=int, nargs='*', help='Campaign IDs to use, active campaigns by default')
+    run_parser.add_argument('--hkid-start', type=int, default=500000000,
+                            help='Position of first HKID voting, change it to repeat votes on the same campaigns')
+    run_parser.add_argument('--label', default='run')
+    run_parser.add_argument('--output', help='Write JSON report to this file instead of stdout')
+
+    args = parser.parse_args()
+    if args.command is None:
+        parser.error('choose seed or run')
+    return args
+
+
+def seed(campaigns, options, records, batch_size):
+    """
+    Insert campaigns active for 30 days, and records spread round robin over every option.
+    Records are bulk inserted without signals, counters are rebuilt afterwards.
+    """
+    now = timezone.now()
+    first_campaign_id = (VoteCampaign.objects.aggregate(value=Max('campaign_id'))['value'] or 0) + 1
+    first_option_id = (VoteOption.objects.aggregate(value=Max('id'))['value'] or 0) + 1
+    campaign_ids = list(range(first_campaign_id, first_campaign_id + campaigns))
+    VoteCampaign.objects.bulk_create([
+        VoteCampaign(
+            campaign_id=campaign_id,
+            question=QUESTION.format(campaign_id),
+            start_time=now - datetime.timedelta(days=1),
+            end_time=now + datetime.timedelta(days=30),
+            status='ACTIVE'
+        )
+        for campaign_id in campaign_ids
+    ])
+    vote_options = [
+        VoteOption(
+            id=first_option_id + index * options + code,
+            campaign_id=campaign_id,
+            option_code=str(code + 1),
+            option_detail=f'Option {code + 1}'
+        )
+        for index, campaign_id in enumerate(campaign_ids)
+        for code in range(options)
+    ]
+    VoteOption.objects.bulk_create(vote_options)
+    # Explicit IDs do not advance sequences on PostgreSQL
+    with connection.cursor() as cursor:
+        for sql in connection.ops.sequence_reset_sql(no_style(), [VoteCampaign, VoteOption]):
+            cursor.execute(sql)
+
+    # Seeded campaigns hash voter IDs with the default algorithm
+    hasher = hashers.get_hasher(VoteCampaign.objects.get(campaign_id=first_campaign_id).voter_id_algorithm)
+    # Each voter votes once in every campaign, voters take turns over options
+    voters = enumerate(iter_hkids())
+    inserted = 0
+    while inserted < records:
+        size = min(batch_size, records - inserted)
+        batch = []
+        for voter, hkid in itertools.islice(voters, (size + campaigns - 1) // campaigns):
+            user_id = hasher.hash(hkid)
+            for index in range(campaigns):
+                option = vote_options[index * options + (voter + index) % options]
+                batch.append(VoteRecord(campaign_id=option.campaign_id, option_id=option.id, user_id=user_id))
+        VoteRecord.objects.bulk_create(batch[:size])
+        inserted += size
+        print(f'Inserted {inserted}/{records} records', file=sys.stderr)
+    counters.rebuild(campaign_ids)
+    return campaign_ids
+
+
+class QueryCounter:
+    """
+    Database execute wrapper counting queries
+    """
+    def __init__(self):
+        self.count = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        self.count += 1
+        return execute(sql, params, many, context)
+
+
+class InProcessClient:
+    """
+    Send requests through the full Django stack within this process, measuring queries per request
+    """
+    def __init__(self):
+        self.local = threading.local()
+        host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS and settings.ALLOWED_HOSTS[0] != '*' else 'localhost'
+        self.host = host.lstrip('.')
+
+    def request(self, method, path, data=None):
+        client = getattr(self.local, 'client', None)
+        if client is None:
+            client = self.local.client = Client(HTTP_HOST=self.host)
+        query_counter = QueryCounter()
+        with connection.execute_wrapper(query_counter):
+            if method == 'POST':
+                response = client.post(path, data)
+            else:
+                response = client.get(path)
+        return response.status_code, response.content, query_counter.count
+
+    def close(self):
+        connections.close_all()
+
+
+class HTTPClient:
+    """
+    Send requests to a running server, queries per request are not known
+    """
+    def __init__(self, url):
+        self.url = url.rstrip('/')
+
+    def request(self, method, path, data=None):
+        body = urlencode(data).encode('utf-8') if data is not None else None
+        request = Request(self.url + path, data=body, method=method)
+        try:
+            with urlopen(request) as response:
+                return response.status, response.read(), None
+        except HTTPError as error:
+            return error.code, error.read(), None
+
+    def close(self):
+        pass
+
+
+def get_campaigns(client, campaign_ids):
+    """
+    Return list of (campaign_id, option codes) to send requests to
+    """
+    if not campaign_ids:
+        _, content, _ = client.request('GET', '/campaign/?' + urlencode({'status': 'ACTIVE', 'vote_count': 'false'}))
+        campaign_ids = [campaign['campaign_id'] for campaign in json.loads(content.decode('utf-8'))]
+    campaigns = []
+    for campaign_id in campaign_ids:
+        _, content, _ = client.request('GET', f'/campaign/{campaign_id}/')
+        campaigns.append((campaign_id, [option['option_code'] for option in json.loads(content.decode('utf-8'))['options']]))
+    if not campaigns:
+        sys.exit('No active campaign to send requests to, seed some first')
+    return campaigns
+
+
+def get_requests(endpoint, campaigns, total, hkid_start):
+    if endpoint == 'list':
+        return [('GET', '/campaign/', None)] * total
+    if endpoint == 'detail':
+        return [('GET', f'/campaign/{campaigns[ix % len(campaigns)][0]}/', None) for ix in range(total)]
+    requests = []
+    hkids = iter_hkids(hkid_start)
+    for ix in range(total):
+        campaign_id, option_codes = campaigns[ix % len(campaigns)]
+        requests.append(('POST', f'/vote/{campaign_id}/', {
+            'hkid': next(hkids),
+            'option_code': option_codes[ix % len(option_codes)],
+        }))
+    return requests
+
+
+def run(client, requests, concurrency):
+    """
+    Send requests over concurrent workers, return summary of latency, throughput, status codes and queries
+    """
+    def send(request):
+        start = time.perf_counter()
+        status, _, queries = client.request(*request)
+        return time.perf_counter() - start, status, queries
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='load') as executor:
+        results = list(executor.map(send, requests))
+    elapsed = time.perf_counter() - start
+
+    queries = [count for _, _, count in results if count is not None]
+    return {
+        'requests': len(results),
+        'duration_s': elapsed,
+        'requests_per_s': len(results) / elapsed if elapsed else None,
+        'latency_ms': summarize([latency for latency, _, _ in results]),
+        'queries_per_request': sum(queries) / len(queries) if queries else None,
+        'status': dict(Counter(str(status) for _, status, _ in results)),
+    }
+
+
+def main():
+    args = parse_args()
+    if args.command == 'seed':
+        start = time.perf_counter()
+        campaign_ids = seed(args.campaigns, args.options, args.records, args.batch_size)
+        print(json.dumps({
+            'campaign_ids': campaign_ids,
+            'records': args.records,
+            'duration_s': time.perf_counter() - start,
+        }, indent=2))
+        return
+
+    client = HTTPClient(args.url) if args.url else InProcessClient()
+    try:
+        campaigns = get_campaigns(client, args.campaign)
+        report = {
+            'label': args.label,
+            'target': args.url or 'in-process',
+            'database': connection.vendor,
+            'python': platform.python_version(),
+            'concurrency': args.concurrency,
+            'endpoints': {
+                endpoint: run(
+                    client,
+                    get_requests(endpoint, campaigns, args.requests, args.hkid_start),
+                    args.concurrency
+                )
+                for endpoint in args.endpoints
+            },
+        }
+    finally:
+        client.close()
+
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,178 @@
+import argparse
+import json
+import os
+import platform
+import sys
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'voting_backend.settings')
+django.setup()
+
+from django.db import connection  # noqa: E402
+
+CAMPAIGN_TABLE = 'voting_backend_votecampaign'
+OPTION_TABLE = 'voting_backend_voteoption'
+RECORD_TABLE = 'voting_backend_voterecord'
+
+# Hot queries of the vote and result paths, written in SQL so the same run works before and after migrations
+QUERIES = {
+    'active_campaigns': (
+        f'SELECT campaign_id FROM {CAMPAIGN_TABLE} WHERE start_time <= %(now)s AND end_time > %(now)s '
+        'ORDER BY end_time DESC, campaign_id DESC LIMIT 50'
+    ),
+    'campaign_list_page': (
+        f'SELECT campaign_id FROM {CAMPAIGN_TABLE} WHERE (end_time, campaign_id) < (%(end_time)s, %(campaign_id)s) '
+        'ORDER BY end_time DESC, campaign_id DESC LIMIT 50'
+    ),
+    'option_counts': (
+        f'SELECT option_id, COUNT(*) FROM {RECORD_TABLE} WHERE campaign_id = %(campaign_id)s GROUP BY option_id'
+    ),
+    'already_voted': (
+        f'SELECT 1 FROM {RECORD_TABLE} WHERE user_id = %(user_id)s AND campaign_id = %(campaign_id)s LIMIT 1'
+    ),
+}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Seed vote tables on PostgreSQL and record plans and timings of the hot queries'
+    )
+    parser.add_argument('--label', default='run', help='Name of this run, e.g. before or after')
+    parser.add_argument('--seed', type=int, default=0, help='Insert this many vote records first, e.g. 10000000')
+    parser.add_argument('--campaigns', type=int, default=10000, help='Number of campaigns to seed')
+    parser.add_argument('--options', type=int, default=4, help='Number of options per seeded campaign')
+    parser.add_argument('--repeat', type=int, default=20, help='Number of timed executions per query')
+    parser.add_argument('--output', help='Write JSON report to this file instead of stdout')
+    return parser.parse_args()
+
+
+def is_binary_user_id(cursor):
+    cursor.execute(
+        'SELECT data_type FROM information_schema.columns WHERE table_name = %s AND column_name = %s',
+        [RECORD_TABLE, 'user_id']
+    )
+    return cursor.fetchone()[0] == 'bytea'
+
+
+def seed(cursor, records, campaigns, options):
+    """
+    Insert campaigns spread over ten years, options and records spread evenly over campaigns
+    """
+    cursor.execute(f'SELECT COALESCE(MAX(campaign_id), 0) FROM {CAMPAIGN_TABLE}')
+    offset = cursor.fetchone()[0]
+    cursor.execute(
+        f'INSERT INTO {CAMPAIGN_TABLE} (campaign_id, question, start_time, end_time, counter_shards) '
+        "SELECT %s + i, 'Question ' || i, "
+        "TIMESTAMP '2015-01-01' + i * INTERVAL '8 hours', "
+        "TIMESTAMP '2015-01-01' + i * INTERVAL '8 hours' + INTERVAL '30 days', 4 "
+        'FROM generate_series(1, %s) AS i',
+        [offset, campaigns]
+    )
+    cursor.execute(
+        f'INSERT INTO {OPTION_TABLE} (campaign_id, option_code, option_detail) '
+        "SELECT %s + c, o::text, 'Option ' || o FROM generate_series(1, %s) AS c, generate_series(1, %s) AS o",
+        [offset, campaigns, options]
+    )
+    # 64 hex characters unique per record, like a SHA-256 digest
+    user_id = "md5(i::text) || md5((i + 1)::text)"
+    if is_binary_user_id(cursor):
+        user_id = f"decode({user_id}, 'hex')"
+    cursor.execute(
+        f'INSERT INTO {RECORD_TABLE} (campaign_id, option_id, user_id, create_time) '
+        f'SELECT o.campaign_id, o.id, {user_id}, NOW() '
+        'FROM generate_series(1, %s) AS i '
+        f'JOIN {OPTION_TABLE} o ON o.campaign_id = %s + 1 + i %% %s AND o.option_code = (1 + i %% %s)::text',
+        [records, offset, campaigns, options]
+    )
+    cursor.execute(f'ANALYZE {CAMPAIGN_TABLE}')
+    cursor.execute(f'ANALYZE {OPTION_TABLE}')
+    cursor.execute(f'ANALYZE {RECORD_TABLE}')
+
+
+def get_params(cursor):
+    cursor.execute(
+        f'SELECT campaign_id, end_time, start_time FROM {CAMPAIGN_TABLE} ORDER BY campaign_id '
+        f'OFFSET (SELECT COUNT(*) / 2 FROM {CAMPAIGN_TABLE}) LIMIT 1'
+    )
+    campaign_id, end_time, start_time = cursor.fetchone()
+    cursor.execute(f'SELECT user_id FROM {RECORD_TABLE} WHERE campaign_id = %s LIMIT 1', [campaign_id])
+    row = cursor.fetchone()
+    return {
+        'now': start_time,
+        'end_time': end_time,
+        'campaign_id': campaign_id,
+        'user_id': row[0] if row else None,
+    }
+
+
+def get_sizes(cursor):
+    # Indexes are listed by their table, as named indexes do not share its prefix
+    cursor.execute(
+        'SELECT c.relname, pg_relation_size(c.oid) FROM pg_class c '
+        "JOIN pg_namespace n ON n.oid = c.relnamespace AND n.nspname = current_schema() "
+        'LEFT JOIN pg_index i ON i.indexrelid = c.oid LEFT JOIN pg_class t ON t.oid = i.indrelid '
+        "WHERE COALESCE(t.relname, c.relname) LIKE 'voting_backend_vote%' AND c.relkind IN ('r', 'i') "
+        'ORDER BY c.relname'
+    )
+    return dict(cursor.fetchall())
+
+
+def measure(cursor, sql, params, repeat):
+    cursor.execute('EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) ' + sql, params)
+    plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        timings.append((time.perf_counter() - start) * 1000)
+    timings.sort()
+    return {
+        'plan': plan[0]['Plan'],
+        'planning_ms': plan[0].get('Planning Time'),
+        'execution_ms': plan[0].get('Execution Time'),
+        'median_ms': timings[len(timings) // 2],
+        'min_ms': timings[0],
+        'max_ms': timings[-1],
+    }
+
+
+def main():
+    args = parse_args()
+    if connection.vendor != 'postgresql':
+        sys.exit('Query plans are only benchmarked on PostgreSQL, set DATABASE_URL accordingly')
+
+    with connection.cursor() as cursor:
+        if args.seed:
+            start = time.perf_counter()
+            seed(cursor, args.seed, args.campaigns, args.options)
+            print(f'Seeded {args.seed} records in {time.perf_counter() - start:.1f}s', file=sys.stderr)
+
+        params = get_params(cursor)
+        cursor.execute(f'SELECT COUNT(*) FROM {RECORD_TABLE}')
+        report = {
+            'label': args.label,
+            'python': platform.python_version(),
+            'records': cursor.fetchone()[0],
+            'binary_user_id': is_binary_user_id(cursor),
+            'sizes': get_sizes(cursor),
+            'queries': {
+                name: measure(cursor, sql, params, args.repeat)
+                for name, sql in QUERIES.items()
+            },
+        }
+
+    output = json.dumps(report, indent=2, default=str)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,116 @@
+import argparse
+import datetime
+import json
+import os
+import platform
+import time
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'voting_backend.settings')
+django.setup()
+
+from rest_framework.renderers import JSONRenderer  # noqa: E402
+
+from voting_backend import rendering  # noqa: E402
+from voting_backend.models import VoteCampaign, VoteOption  # noqa: E402
+from voting_backend.serializers import (VoteCampaignDetailSerializer,  # noqa: E402
+                                        VoteCampaignListSerializer)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Measure what turning fetched campaigns into JSON bytes costs, by serializers and by rendering'
+    )
+    parser.add_argument('--campaigns', type=int, default=100, help='Number of campaigns per list')
+    parser.add_argument('--options', type=int, default=4, help='Number of options per campaign detail')
+    parser.add_argument('--repeat', type=int, default=200, help='Number of times each path renders the campaigns')
+    parser.add_argument('--label', default='run')
+    parser.add_argument('--output', help='Write JSON report to this file instead of stdout')
+    return parser.parse_args()
+
+
+def get_campaigns(size, options):
+    """
+    Return campaigns as the list view and the detail view fetch them, without a database:
+    (model instances, value rows of the list view, option rows of the detail view)
+    """
+    start_time = datetime.datetime(2020, 1, 1, 8, 30, 15, 123456)
+    campaigns = []
+    rows = []
+    option_rows = []
+    for campaign_id in range(1, size + 1):
+        campaign = VoteCampaign(
+            campaign_id=campaign_id,
+            question=f'Which option do you prefer in campaign {campaign_id}?',
+            start_time=start_time,
+            end_time=start_time + datetime.timedelta(days=campaign_id),
+            status='ACTIVE'
+        )
+        campaign.number_of_vote = campaign_id * 1000
+        option_set = []
+        for index in range(options):
+            option = VoteOption(campaign=campaign, option_code=str(index), option_detail=f'Option {index}')
+            option.number_of_vote = campaign_id * index
+            option_set.append(option)
+            option_rows.append((campaign_id, option.option_code, option.option_detail, option.number_of_vote))
+        campaign._prefetched_objects_cache = {'option_set': option_set}
+        campaigns.append(campaign)
+        rows.append(tuple(getattr(campaign, field) for field in VoteCampaignListSerializer.Meta.fields))
+    return campaigns, rows, option_rows
+
+
+def measure(render, repeat, size):
+    """
+    Time render repeat times, return microseconds per campaign and the bytes rendered
+    """
+    body = render()
+    start = time.perf_counter()
+    for _ in range(repeat):
+        render()
+    return (time.perf_counter() - start) * 1e6 / repeat / size, body
+
+
+def main():
+    args = parse_args()
+    campaigns, rows, option_rows = get_campaigns(args.campaigns, args.options)
+    fields = VoteCampaignListSerializer.Meta.fields
+    paths = {
+        'list': {
+            'serializer': lambda: JSONRenderer().render(VoteCampaignListSerializer(campaigns, many=True).data),
+            'rendering': lambda: rendering.render(rendering.get_campaign_list(rows, fields)),
+        },
+        'detail': {
+            'serializer': lambda: [
+                JSONRenderer().render(VoteCampaignDetailSerializer(campaign).data) for campaign in campaigns
+            ],
+            'rendering': lambda: [
+                rendering.render(data)
+                for data in rendering.build_campaign_details(campaigns, option_rows).values()
+            ],
+        },
+    }
+    report = {
+        'label': args.label,
+        'python': platform.python_version(),
+        'campaigns': args.campaigns,
+        'options': args.options,
+        'repeat': args.repeat,
+        'us_per_campaign': {},
+    }
+    for view, renders in paths.items():
+        results = {name: measure(render, args.repeat, args.campaigns) for name, render in renders.items()}
+        if results['serializer'][1] != results['rendering'][1]:
+            raise AssertionError(f'Rendering of {view} differs from the serializer')
+        report['us_per_campaign'][view] = {name: result[0] for name, result in results.items()}
+        report['us_per_campaign'][view]['speedup'] = results['serializer'][0] / results['rendering'][0]
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
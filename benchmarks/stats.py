@@ -0,0 +1,20 @@
+def percentile(values, ratio):
+    """
+    Return nearest rank percentile of sorted values
+    """
+    if not values:
+        return None
+    return values[min(len(values) - 1, max(0, int(round(ratio * len(values))) - 1))]
+
+
+def summarize(values):
+    """
+    Return p50/p95/p99 and max of values in milliseconds
+    """
+    values = sorted(value * 1000 for value in values)
+    return {
+        'p50': percentile(values, 0.5),
+        'p95': percentile(values, 0.95),
+        'p99': percentile(values, 0.99),
+        'max': values[-1] if values else None,
+    }
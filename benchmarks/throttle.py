@@ -0,0 +1,135 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import tempfile
+import time
+from io import BytesIO
+from urllib.parse import urlencode
+from wsgiref.util import setup_testing_defaults
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'voting_backend.settings')
+django.setup()
+
+from django.conf import settings  # noqa: E402
+from django.core.handlers.wsgi import WSGIHandler  # noqa: E402
+from django.test.utils import override_settings  # noqa: E402
+
+from benchmarks.hkids import iter_hkids  # noqa: E402
+from benchmarks.stats import summarize  # noqa: E402
+from voting_backend import throttling  # noqa: E402
+
+STORES = ('local', 'shared')
+# Never runs out, so every request goes all the way through the view
+UNLIMITED_RATE = '1000000000/s'
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(
+        description='Measure what the vote throttles cost per check and per request, for each bucket store'
+    )
+    parser.add_argument('--stores', nargs='+', choices=STORES, default=list(STORES))
+    parser.add_argument('--checks', type=int, default=200000, help='Number of bucket checks per store')
+    parser.add_argument('--requests', type=int, default=5000, help='Number of vote requests per mode')
+    parser.add_argument('--clients', type=int, default=1000, help='Number of distinct client IPs')
+    parser.add_argument('--label', default='run')
+    parser.add_argument('--output', help='Write JSON report to this file instead of stdout')
+    return parser.parse_args()
+
+
+def get_throttle_settings(store, path):
+    return dict(
+        settings.VOTE_THROTTLE,
+        ENABLED=store is not None,
+        STORE=store or 'local',
+        SHARED_PATH=path,
+        IP_RATE=UNLIMITED_RATE,
+        VOTER_RATE=UNLIMITED_RATE,
+    )
+
+
+def measure_checks(checks, keys):
+    """
+    Time taking tokens from buckets of keys in turn, return nanoseconds per check
+    """
+    capacity, rate = throttling.parse_rate(UNLIMITED_RATE)
+    bucket_store = throttling.get_store()
+    keys = itertools.cycle(keys)
+    start = time.perf_counter()
+    for _ in range(checks):
+        bucket_store.take(next(keys), capacity, rate)
+    return (time.perf_counter() - start) * 1e9 / checks
+
+
+def get_environ(path, body, client):
+    host = settings.ALLOWED_HOSTS[0] if settings.ALLOWED_HOSTS and settings.ALLOWED_HOSTS[0] != '*' else 'localhost'
+    environ = {
+        'REQUEST_METHOD': 'POST',
+        'PATH_INFO': path,
+        'HTTP_HOST': host.lstrip('.'),
+        'REMOTE_ADDR': client,
+        'CONTENT_TYPE': 'application/x-www-form-urlencoded',
+        'CONTENT_LENGTH': str(len(body)),
+        'wsgi.input': BytesIO(body),
+    }
+    setup_testing_defaults(environ)
+    return environ
+
+
+def measure_requests(requests, clients):
+    """
+    Send votes with a wrong check digit through the WSGI handler, which the throttles check
+    and the form rejects without any query, and return latency of the requests
+    """
+    handler = WSGIHandler()
+    hkids = iter_hkids()
+    latencies = []
+    statuses = set()
+    for index in range(requests):
+        hkid = next(hkids)
+        body = urlencode({'hkid': hkid[:-1] + ('0' if hkid[-1] != '0' else '1'), 'option_code': '1'}).encode()
+        environ = get_environ('/vote/1/', body, '10.{}.{}.{}'.format(*(index % clients).to_bytes(3, 'big')))
+        start = time.perf_counter()
+        response = handler(environ, lambda status, headers: None)
+        b''.join(response)
+        response.close()
+        latencies.append(time.perf_counter() - start)
+        statuses.add(response.status_code)
+    return {'statuses': sorted(statuses), 'latency_ms': summarize(latencies)}
+
+
+def main():
+    args = parse_args()
+    keys = [f'ip:10.0.{index // 256}.{index % 256}' for index in range(args.clients)]
+    report = {
+        'label': args.label,
+        'python': platform.python_version(),
+        'checks': args.checks,
+        'requests': args.requests,
+        'clients': args.clients,
+        'ns_per_check': {},
+        'requests_by_store': {},
+    }
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, 'throttle.buckets')
+        with override_settings(VOTE_THROTTLE=get_throttle_settings(None, path)):
+            # Warm up imports and caches of the request path first
+            measure_requests(min(args.requests, 1000), args.clients)
+            report['requests_by_store']['off'] = measure_requests(args.requests, args.clients)
+        for store in args.stores:
+            with override_settings(VOTE_THROTTLE=get_throttle_settings(store, path)):
+                report['ns_per_check'][store] = measure_checks(args.checks, keys)
+                report['requests_by_store'][store] = measure_requests(args.requests, args.clients)
+    output = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, 'w') as file:
+            file.write(output)
+    else:
+        print(output)
+
+
+if __name__ == '__main__':
+    main()
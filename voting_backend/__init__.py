@@ -1,5 +1,11 @@
 from django.apps import AppConfig
 
+default_app_config = 'voting_backend.VotingBackendConfig'
+
+
 class VotingBackendConfig(AppConfig):
     name = 'voting_backend'
-    verbose_name = 'Voting Backend'
\ No newline at end of file
+    verbose_name = 'Voting Backend'
+
+    def ready(self):
+        from . import signals  # noqa: F401
@@ -0,0 +1,247 @@
+"""
+ASGI config for voting_backend project.
+
+It exposes the ASGI callable as a module-level variable named ``application``,
+to be served by an ASGI server such as uvicorn, see README.
+"""
+
+import asyncio
+import logging
+import os
+import sys
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+import django
+
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'voting_backend.settings')
+django.setup(set_prefix=False)
+
+from django.conf import settings  # noqa: E402
+from django.core.handlers.wsgi import WSGIHandler  # noqa: E402
+from django.http import HttpResponseServerError  # noqa: E402
+
+from voting_backend import live  # noqa: E402
+
+logger = logging.getLogger(__name__)
+
+# Request bodies larger than this are spooled to disk
+BODY_SPOOL_SIZE = 1024 * 1024
+
+
+def get_environ(scope, body):
+    """
+    Translate an ASGI HTTP scope into a WSGI environ
+    """
+    root_path = scope.get('root_path', '')
+    path = scope['path']
+    if root_path and path.startswith(root_path):
+        path = path[len(root_path):]
+    server = scope.get('server') or ('localhost', 80)
+    client = scope.get('client') or ('', 0)
+    environ = {
+        'REQUEST_METHOD': scope['method'],
+        'SCRIPT_NAME': root_path.encode('utf-8').decode('latin-1'),
+        'PATH_INFO': path.encode('utf-8').decode('latin-1'),
+        'QUERY_STRING': scope.get('query_string', b'').decode('latin-1'),
+        'SERVER_NAME': server[0],
+        'SERVER_PORT': str(server[1]),
+        'SERVER_PROTOCOL': 'HTTP/{}'.format(scope.get('http_version', '1.1')),
+        'REMOTE_ADDR': client[0],
+        'wsgi.version': (1, 0),
+        'wsgi.url_scheme': scope.get('scheme', 'http'),
+        'wsgi.input': body,
+        'wsgi.errors': sys.stderr,
+        'wsgi.multithread': True,
+        'wsgi.multiprocess': True,
+        'wsgi.run_once': False,
+        live.ASYNC_KEY: True,
+    }
+    for name, value in scope.get('headers', []):
+        name = name.decode('latin-1')
+        if name == 'content-length':
+            key = 'CONTENT_LENGTH'
+        elif name == 'content-type':
+            key = 'CONTENT_TYPE'
+        else:
+            key = 'HTTP_' + name.upper().replace('-', '_')
+        value = value.decode('latin-1')
+        if key in environ:
+            value = environ[key] + ',' + value
+        environ[key] = value
+    if body is not None:
+        # Body is complete and de-chunked by the server, its actual size is authoritative
+        body.seek(0, os.SEEK_END)
+        environ['CONTENT_LENGTH'] = str(body.tell())
+        body.seek(0)
+    return environ
+
+
+class ASGIHandler:
+    """
+    ASGI application in front of the Django request handler.
+    Requests go through middleware and views in a thread pool of ASGI['THREADS'] threads,
+    which also bounds database connections of the process, while waiting connections cost
+    the event loop nothing. Live result streams continue on the event loop once the view answered,
+    and long-polls wait there once the view checked the campaign, so idle clients hold no thread.
+    """
+    def __init__(self, threads=None):
+        self.handler = WSGIHandler()
+        self.executor = ThreadPoolExecutor(
+            max_workers=threads or settings.ASGI['THREADS'],
+            thread_name_prefix='asgi'
+        )
+        self.hub = None
+
+    async def __call__(self, scope, receive, send):
+        if scope['type'] == 'lifespan':
+            await self.lifespan(receive, send)
+            return
+        if scope['type'] != 'http':
+            raise ValueError('Unsupported ASGI scope type {}'.format(scope['type']))
+
+        body = await self.read_body(receive)
+        if body is None:
+            return
+        disconnected = threading.Event()
+        watcher = asyncio.ensure_future(self.watch_disconnect(receive, disconnected))
+        loop = asyncio.get_event_loop()
+        try:
+            response = await loop.run_in_executor(
+                self.executor, self.handle, get_environ(scope, body), send, loop, disconnected
+            )
+            if isinstance(response, live.PollResponse):
+                await self.answer_poll(response, send, watcher, disconnected)
+            elif isinstance(response, live.LiveResponse):
+                await self.stream_live(response, send, disconnected)
+        finally:
+            watcher.cancel()
+            body.close()
+
+    async def lifespan(self, receive, send):
+        while True:
+            message = await receive()
+            if message['type'] == 'lifespan.startup':
+                await send({'type': 'lifespan.startup.complete'})
+            elif message['type'] == 'lifespan.shutdown':
+                self.executor.shutdown(wait=False)
+                await send({'type': 'lifespan.shutdown.complete'})
+                return
+
+    @staticmethod
+    async def read_body(receive):
+        """
+        Return request body as a file, or None if the client disconnected before sending it
+        """
+        body = tempfile.SpooledTemporaryFile(max_size=BODY_SPOOL_SIZE)
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                body.close()
+                return None
+            body.write(message.get('body', b''))
+            if not message.get('more_body', False):
+                body.seek(0)
+                return body
+
+    @staticmethod
+    async def watch_disconnect(receive, disconnected):
+        while True:
+            message = await receive()
+            if message['type'] == 'http.disconnect':
+                disconnected.set()
+                return
+
+    @staticmethod
+    def get_start_message(response):
+        headers = [
+            (name.encode('latin-1'), str(value).encode('latin-1'))
+            for name, value in response.items()
+        ]
+        for cookie in response.cookies.values():
+            headers.append((b'Set-Cookie', cookie.output(header='').strip().encode('latin-1')))
+        return {'type': 'http.response.start', 'status': response.status_code, 'headers': headers}
+
+    def handle(self, environ, send, loop, disconnected):
+        """
+        Run the request through Django and send the response, within one pool thread
+        so streamed responses keep using the database connection of the thread.
+        Return live result responses and long-polls unsent, for the event loop to wait on.
+        """
+        response = self.handler(environ, lambda status, headers: None)
+        if isinstance(response, (live.LiveResponse, live.PollResponse)):
+            return response
+        self.send_response(response, response, environ['PATH_INFO'], send, loop, disconnected)
+        return None
+
+    def send_response(self, response, finished_response, path, send, loop, disconnected):
+        """
+        Send response, then close finished_response, the one returned by Django for the request
+        """
+        def send_message(message):
+            asyncio.run_coroutine_threadsafe(send(message), loop).result()
+
+        try:
+            send_message(self.get_start_message(response))
+            for chunk in response:
+                if disconnected.is_set():
+                    return
+                if chunk:
+                    send_message({'type': 'http.response.body', 'body': chunk, 'more_body': True})
+            send_message({'type': 'http.response.body', 'body': b''})
+        except Exception:
+            logger.exception('Failed to send response of %s', path)
+        finally:
+            # Fires request_finished, releasing database connection of this thread
+            finished_response.close()
+
+    def send_poll_answer(self, response, entry, send, loop, disconnected):
+        try:
+            answer = response.get_answer(entry)
+        except Exception:
+            logger.exception('Failed to answer long-poll of campaign %s', response.campaign_id)
+            answer = HttpResponseServerError()
+        self.send_response(answer, response, response.request.path_info, send, loop, disconnected)
+
+    async def answer_poll(self, response, send, watcher, disconnected):
+        """
+        Wait on the event loop until results changed, then send them from a pool thread
+        without running the request through middleware and view again
+        """
+        loop = asyncio.get_event_loop()
+        waiter = asyncio.ensure_future(live.poll_async(
+            response.campaign_id, response.etags, settings.LIVE_RESULTS['POLL_TIMEOUT'], self.get_hub()
+        ))
+        await asyncio.wait([waiter, watcher], return_when=asyncio.FIRST_COMPLETED)
+        if not waiter.done():
+            # Client disconnected
+            waiter.cancel()
+            response.close()
+            return
+        await loop.run_in_executor(
+            self.executor, self.send_poll_answer, response, waiter.result(), send, loop, disconnected
+        )
+
+    def get_hub(self):
+        if self.hub is None:
+            self.hub = live.LiveHub(asyncio.get_event_loop())
+        return self.hub
+
+    async def stream_live(self, response, send, disconnected):
+        events = live.stream_events_async(response.campaign_id, response.last_event_id, self.get_hub())
+        try:
+            await send(self.get_start_message(response))
+            async for event in events:
+                if disconnected.is_set():
+                    break
+                await send({'type': 'http.response.body', 'body': event.encode('utf-8'), 'more_body': True})
+            if not disconnected.is_set():
+                await send({'type': 'http.response.body', 'body': b''})
+        finally:
+            await events.aclose()
+            # Fires request_finished once the stream ended or the client disconnected
+            response.close()
+
+
+application = ASGIHandler()
@@ -0,0 +1,160 @@
+import os
+import threading
+from collections import deque
+
+from django.db.backends.postgresql import base
+from psycopg2 import pool
+
+from .introspection import DatabaseIntrospection
+
+Database = base.Database
+
+# (process ID, database alias, connection parameters) -> ConnectionPool
+pools = {}
+pools_lock = threading.Lock()
+
+
+class ConnectionPool(pool.ThreadedConnectionPool):
+    """
+    Thread safe pool of at most maxconn connections, waiting up to timeout seconds for a free one.
+    Waiting threads are served first come first served, so none starves while others keep returning.
+    Up to minconn connections are opened upfront and kept open once returned, others are closed.
+    """
+    def __init__(self, minconn, maxconn, timeout, **kwargs):
+        super().__init__(minconn, maxconn, **kwargs)
+        self.timeout = timeout
+        self.free = maxconn
+        # Events of waiting threads, in order of arrival
+        self.waiters = deque()
+        self.slots_lock = threading.Lock()
+
+    def acquire_slot(self):
+        with self.slots_lock:
+            if self.free and not self.waiters:
+                self.free -= 1
+                return True
+            waiter = threading.Event()
+            self.waiters.append(waiter)
+        if waiter.wait(self.timeout):
+            return True
+        with self.slots_lock:
+            # Slot may have been handed over right after the wait timed out
+            if waiter.is_set():
+                return True
+            self.waiters.remove(waiter)
+            return False
+
+    def release_slot(self):
+        with self.slots_lock:
+            if self.waiters:
+                # Hand the slot over to the longest waiting thread
+                self.waiters.popleft().set()
+            else:
+                self.free += 1
+
+    def getconn(self, key=None):
+        if not self.acquire_slot():
+            raise Database.OperationalError(
+                'No free connection in pool within {} seconds'.format(self.timeout)
+            )
+        try:
+            return super().getconn(key)
+        except Exception:
+            self.release_slot()
+            raise
+
+    def putconn(self, conn, key=None, close=False):
+        try:
+            super().putconn(conn, key, close)
+        except Database.Error:
+            # Rolling back a broken connection failed, drop it
+            super().putconn(conn, key, close=True)
+        finally:
+            self.release_slot()
+
+
+def get_pool(alias, conn_params, options):
+    """
+    Return pool of the process for the database, forked processes get their own
+    """
+    key = (os.getpid(), alias, repr(sorted(conn_params.items())))
+    with pools_lock:
+        connection_pool = pools.get(key)
+        if connection_pool is None:
+            connection_pool = pools[key] = ConnectionPool(
+                options['MIN_SIZE'], options['MAX_SIZE'], options['TIMEOUT'], **conn_params
+            )
+        return connection_pool
+
+
+def is_usable(connection):
+    try:
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        if not connection.autocommit:
+            connection.rollback()
+    except Database.Error:
+        return False
+    return True
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    PostgreSQL backend with two additions configured in the database settings:
+    - CONN_HEALTH_CHECKS checks a persistent connection once before its first use in a request,
+      and a pooled connection when taken from the pool, so a connection dropped by the server
+      is replaced instead of failing the request
+    - POOL takes connections from a pool shared by the threads of the process,
+      closing a connection returns it to the pool
+    Partitioned tables are introspected as tables.
+    """
+    introspection_class = DatabaseIntrospection
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.pool = None
+        self.health_check_done = False
+
+    def get_new_connection(self, conn_params):
+        options = self.settings_dict.get('POOL')
+        if not options:
+            self.pool = None
+            return super().get_new_connection(conn_params)
+
+        self.pool = get_pool(self.alias, conn_params, options)
+        connection = self.pool.getconn()
+        if self.settings_dict.get('CONN_HEALTH_CHECKS') and not is_usable(connection):
+            self.pool.putconn(connection, close=True)
+            connection = self.pool.getconn()
+        options = self.settings_dict['OPTIONS']
+        self.isolation_level = options.get('isolation_level', connection.isolation_level)
+        if self.isolation_level != connection.isolation_level:
+            connection.set_session(isolation_level=self.isolation_level)
+        return connection
+
+    def connect(self):
+        super().connect()
+        self.health_check_done = True
+
+    def close_if_unusable_or_obsolete(self):
+        # Called when a request starts and finishes
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
+
+    def close_if_health_check_failed(self):
+        if self.connection is None or self.health_check_done or not self.settings_dict.get('CONN_HEALTH_CHECKS'):
+            return
+        if not self.is_usable():
+            self.close()
+        self.health_check_done = True
+
+    def _cursor(self, name=None):
+        self.close_if_health_check_failed()
+        return super()._cursor(name)
+
+    def _close(self):
+        if self.pool is None:
+            return super()._close()
+        with self.wrap_database_errors:
+            # Connection is rolled back by the pool, unless errors left it in doubt
+            self.pool.putconn(self.connection, close=self.errors_occurred)
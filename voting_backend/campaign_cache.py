@@ -0,0 +1,103 @@
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import transitions
+from .models import VoteCampaign, VoteOption
+
+# campaign is None for campaign not exist, options map option_code to option ID
+CampaignEntry = namedtuple('CampaignEntry', ['campaign', 'options'])
+
+
+class CampaignCache:
+    """
+    In-process LRU cache of campaign and option codes used by the vote path.
+    Entries are loaded lazily, expire after timeout seconds or at the next transition of their campaign,
+    and are invalidated by post_save and post_delete of campaigns and options.
+    A transition due but not applied yet is applied on load.
+    Invalidation only reaches the current process, other processes rely on the timeout.
+    """
+    def __init__(self, timeout=60, max_size=1024):
+        self.timeout = timeout
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        # campaign_id -> (expire time, CampaignEntry)
+        self.entries = OrderedDict()
+        # Bumped on every invalidation so entries loaded before it are not stored
+        self.generation = 0
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, campaign_id):
+        now = time.monotonic()
+        with self.lock:
+            item = self.entries.get(campaign_id)
+            if item is not None and item[0] > now:
+                self.entries.move_to_end(campaign_id)
+                self.hits += 1
+                return item[1]
+            self.misses += 1
+            generation = self.generation
+
+        entry = self.load(campaign_id)
+        timeout = self.get_timeout(entry)
+        with self.lock:
+            if generation == self.generation:
+                self.entries[campaign_id] = (now + timeout, entry)
+                self.entries.move_to_end(campaign_id)
+                while len(self.entries) > self.max_size:
+                    self.entries.popitem(last=False)
+                    self.evictions += 1
+        return entry
+
+    @staticmethod
+    def load(campaign_id):
+        campaign = VoteCampaign.objects.filter(campaign_id=campaign_id).first()
+        if campaign is None:
+            return CampaignEntry(None, {})
+        status = campaign.get_status()
+        if campaign.status != status:
+            transitions.apply(campaign, status)
+        options = dict(VoteOption.objects.filter(campaign_id=campaign_id).values_list('option_code', 'id'))
+        return CampaignEntry(campaign, options)
+
+    def get_timeout(self, entry):
+        if entry.campaign is None:
+            return self.timeout
+        transition_time = entry.campaign.get_next_transition_time()
+        if transition_time is None:
+            return self.timeout
+        return max(0, min(self.timeout, (transition_time - timezone.now()).total_seconds()))
+
+    def invalidate(self, campaign_id=None):
+        with self.lock:
+            self.generation += 1
+            if campaign_id is None:
+                self.entries.clear()
+            else:
+                self.entries.pop(campaign_id, None)
+
+    def clear(self):
+        """
+        Drop every entry, e.g. between tests whose campaigns were created without save()
+        """
+        self.invalidate()
+
+    def stats(self):
+        with self.lock:
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+                'size': len(self.entries),
+            }
+
+
+campaign_cache = CampaignCache(
+    timeout=settings.CAMPAIGN_CACHE['TIMEOUT'],
+    max_size=settings.CAMPAIGN_CACHE['MAX_SIZE'],
+)
@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.middleware.gzip import GZipMiddleware, re_accepts_gzip
+from django.utils.text import compress_string
+
+
+def is_enabled():
+    return settings.RESPONSE_COMPRESSION['ENABLED']
+
+
+def compress(body):
+    """
+    Return body gzipped as GZipMiddleware does, or None if it is not worth compressing
+    """
+    if not is_enabled() or len(body) < settings.RESPONSE_COMPRESSION['MIN_LENGTH']:
+        return None
+    compressed_body = compress_string(body)
+    if len(compressed_body) >= len(body):
+        return None
+    return compressed_body
+
+
+def accepts_gzip(request):
+    return bool(re_accepts_gzip.search(request.META.get('HTTP_ACCEPT_ENCODING', '')))
+
+
+class CompressionMiddleware(GZipMiddleware):
+    """
+    Gzip responses of at least RESPONSE_COMPRESSION['MIN_LENGTH'] bytes not compressed by their views.
+    Streams are left alone, the compressor would hold events back until it has a block to write.
+    """
+    def process_response(self, request, response):
+        if not is_enabled() or response.streaming:
+            return response
+        if len(response.content) < settings.RESPONSE_COMPRESSION['MIN_LENGTH']:
+            return response
+        return super().process_response(request, response)
@@ -0,0 +1,73 @@
+import zlib
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Sum
+
+from . import snapshots
+from .models import VoteCounter, VoteOption, VoteRecord
+
+
+def shard_for(user_id, shards):
+    """
+    Pick counter shard of a voter, spreading votes of one option evenly over its shards
+    """
+    return zlib.crc32(user_id.encode('utf-8')) % max(shards, 1)
+
+
+def increment(campaign_id, option_id, shard=0, amount=1):
+    """
+    Add votes to one shard of the running tally of an option.
+    Must be called inside the transaction inserting the corresponding VoteRecord.
+    """
+    counter = VoteCounter.objects.filter(option_id=option_id, shard=shard)
+    if counter.update(count=F('count') + amount):
+        return
+    try:
+        # First vote on the shard, counter row is created lazily
+        with transaction.atomic():
+            VoteCounter.objects.create(campaign_id=campaign_id, option_id=option_id, shard=shard, count=amount)
+    except IntegrityError:
+        # Another request created the row in between
+        counter.update(count=F('count') + amount)
+
+
+def find_drift(campaign_ids=None):
+    """
+    Compare stored counters, summed over shards, with VoteRecord.
+    Return list of (campaign_id, option_id, stored, actual) for every mismatching option.
+    """
+    # Records of archived campaigns are no longer in VoteRecord, their counters are final
+    options = VoteOption.objects.filter(campaign__records_archived=False)
+    records = VoteRecord.objects.all()
+    counters = VoteCounter.objects.all()
+    if campaign_ids:
+        options = options.filter(campaign_id__in=campaign_ids)
+        records = records.filter(campaign_id__in=campaign_ids)
+        counters = counters.filter(campaign_id__in=campaign_ids)
+
+    actual = dict(records.values_list('option_id').annotate(total=Count('id')).order_by())
+    stored = dict(counters.values_list('option_id').annotate(total=Sum('count')).order_by())
+    drift = []
+    for campaign_id, option_id in options.values_list('campaign_id', 'id').order_by('campaign_id', 'id'):
+        if stored.get(option_id, 0) != actual.get(option_id, 0):
+            drift.append((campaign_id, option_id, stored.get(option_id, 0), actual.get(option_id, 0)))
+    return drift
+
+
+def rebuild(campaign_ids=None):
+    """
+    Recount VoteRecord and collapse the shards of every drifted option into shard 0.
+    Counter rows are locked so votes landing during the rebuild are added on top of the recount.
+    Return the drift that has been fixed.
+    """
+    with transaction.atomic():
+        counters = VoteCounter.objects.select_for_update()
+        if campaign_ids:
+            counters = counters.filter(campaign_id__in=campaign_ids)
+        list(counters.values_list('id'))
+        drift = find_drift(campaign_ids)
+        for campaign_id, option_id, _, actual in drift:
+            VoteCounter.objects.filter(option_id=option_id).delete()
+            VoteCounter.objects.create(campaign_id=campaign_id, option_id=option_id, shard=0, count=actual)
+        snapshots.discard({campaign_id for campaign_id, _, _, _ in drift})
+    return drift
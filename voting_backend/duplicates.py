@@ -0,0 +1,194 @@
+import math
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+
+from .models import VoteRecord
+
+GENERATION_KEY = 'vote_filter:generation'
+
+
+def is_enabled():
+    return settings.VOTE_FILTER['ENABLED']
+
+
+class BloomFilter:
+    """
+    Bloom filter of voter IDs, which are uniformly distributed digests already.
+    Bit positions are derived from the digest by double hashing instead of hashing it again.
+    """
+    def __init__(self, capacity, error_rate):
+        self.capacity = capacity
+        self.size = max(8, math.ceil(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def get_positions(self, user_id):
+        digest = bytes.fromhex(user_id)
+        first = int.from_bytes(digest[:8], 'little')
+        # Odd step visits distinct positions
+        step = int.from_bytes(digest[8:16], 'little') | 1
+        return [(first + index * step) % self.size for index in range(self.hashes)]
+
+    def add(self, user_id):
+        for position in self.get_positions(user_id):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, user_id):
+        bits = self.bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self.get_positions(user_id))
+
+    @property
+    def is_full(self):
+        return self.count > self.capacity
+
+    @property
+    def nbytes(self):
+        return len(self.bits)
+
+
+class DuplicateVoteFilter:
+    """
+    Per-process filter of voters of each campaign, warmed from VoteRecord on the first vote of a campaign
+    and updated on every vote accepted by the process. A voter found in the filter is confirmed by an
+    indexed lookup instead of a failed insert, as a Bloom filter match may be false, and confirmed repeats
+    are remembered for repeat_timeout seconds so resubmissions are rejected without any query.
+    The unique constraint stays the final check for voters the filter misses, e.g. accepted by another process.
+    """
+    def __init__(self, error_rate=0.001, min_capacity=10000, max_campaigns=64,
+                 repeat_cache_size=10000, repeat_timeout=60, check_interval=5):
+        self.error_rate = error_rate
+        self.min_capacity = min_capacity
+        self.max_campaigns = max_campaigns
+        self.repeat_cache_size = repeat_cache_size
+        self.repeat_timeout = repeat_timeout
+        self.check_interval = check_interval
+        self.lock = threading.Lock()
+        # campaign_id -> BloomFilter, least recently used first
+        self.filters = OrderedDict()
+        # (campaign_id, user_id) -> expire time, least recently confirmed first
+        self.repeats = OrderedDict()
+        self.generation = None
+        self.checked_at = None
+        self.rejections = 0
+        self.false_positives = 0
+
+    def load(self, campaign_id):
+        records = VoteRecord.objects.filter(campaign_id=campaign_id)
+        bloom = BloomFilter(max(self.min_capacity, 2 * records.count()), self.error_rate)
+        for user_id in records.values_list('user_id', flat=True).iterator():
+            bloom.add(user_id)
+        return bloom
+
+    def get_filter(self, campaign_id):
+        self.check_generation()
+        with self.lock:
+            bloom = self.filters.get(campaign_id)
+            if bloom is not None:
+                self.filters.move_to_end(campaign_id)
+                return bloom
+        loaded = self.load(campaign_id)
+        with self.lock:
+            # Concurrent warm up of the same campaign keeps the first filter
+            bloom = self.filters.setdefault(campaign_id, loaded)
+            while len(self.filters) > self.max_campaigns:
+                self.filters.popitem(last=False)
+        return bloom
+
+    def is_repeat(self, campaign_id, user_id):
+        """
+        Return True if the voter already voted in the campaign, False if unknown
+        """
+        key = (campaign_id, user_id)
+        with self.lock:
+            expire_time = self.repeats.get(key)
+            if expire_time is not None and expire_time > time.monotonic():
+                self.rejections += 1
+                return True
+        if user_id not in self.get_filter(campaign_id):
+            return False
+        if not VoteRecord.objects.filter(campaign_id=campaign_id, user_id=user_id).exists():
+            with self.lock:
+                self.false_positives += 1
+            return False
+        self.remember_repeat(campaign_id, user_id)
+        with self.lock:
+            self.rejections += 1
+        return True
+
+    def remember_repeat(self, campaign_id, user_id):
+        with self.lock:
+            self.repeats[(campaign_id, user_id)] = time.monotonic() + self.repeat_timeout
+            self.repeats.move_to_end((campaign_id, user_id))
+            while len(self.repeats) > self.repeat_cache_size:
+                self.repeats.popitem(last=False)
+
+    def add(self, campaign_id, user_id):
+        bloom = self.get_filter(campaign_id)
+        with self.lock:
+            bloom.add(user_id)
+            if bloom.is_full and self.filters.get(campaign_id) is bloom:
+                # Reloaded with twice the capacity on next use, before false matches pile up
+                del self.filters[campaign_id]
+
+    def clear(self):
+        with self.lock:
+            self.filters.clear()
+            self.repeats.clear()
+
+    def check_generation(self):
+        """
+        Drop filters once per check_interval if rebuild_vote_filters asked every process to
+        """
+        now = time.monotonic()
+        if self.checked_at is not None and now - self.checked_at < self.check_interval:
+            return
+        self.checked_at = now
+        generation = get_cache().get(GENERATION_KEY)
+        if generation != self.generation:
+            self.clear()
+            self.generation = generation
+
+    def stats(self):
+        with self.lock:
+            return {
+                'campaigns': {
+                    campaign_id: {
+                        'voters': bloom.count,
+                        'capacity': bloom.capacity,
+                        'hashes': bloom.hashes,
+                        'bytes': bloom.nbytes,
+                    }
+                    for campaign_id, bloom in self.filters.items()
+                },
+                'bytes': sum(bloom.nbytes for bloom in self.filters.values()),
+                'repeats': len(self.repeats),
+                'rejections': self.rejections,
+                'false_positives': self.false_positives,
+            }
+
+
+def get_cache():
+    return caches[settings.VOTE_FILTER['CACHE_ALIAS']]
+
+
+def request_rebuild():
+    """
+    Make every process sharing the cache drop its filters within VOTE_FILTER['CHECK_INTERVAL'] seconds
+    """
+    get_cache().set(GENERATION_KEY, int(time.time() * 1000), None)
+
+
+vote_filter = DuplicateVoteFilter(
+    error_rate=settings.VOTE_FILTER['ERROR_RATE'],
+    min_capacity=settings.VOTE_FILTER['MIN_CAPACITY'],
+    max_campaigns=settings.VOTE_FILTER['MAX_CAMPAIGNS'],
+    repeat_cache_size=settings.VOTE_FILTER['REPEAT_CACHE_SIZE'],
+    repeat_timeout=settings.VOTE_FILTER['REPEAT_TIMEOUT'],
+    check_interval=settings.VOTE_FILTER['CHECK_INTERVAL'],
+)
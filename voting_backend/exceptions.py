@@ -1,3 +1,5 @@
+import math
+
 from django.utils.translation import gettext_lazy as _
 from rest_framework import exceptions, status
 
@@ -18,3 +20,12 @@ class NotFoundException(exceptions.NotFound):
 
 class InternalServerError(exceptions.APIException):
     default_detail = _('INTERNAL_SERVER_ERROR')
+
+
+class TooManyRequestsException(exceptions.Throttled):
+    default_detail = _('TOO_MANY_REQUESTS')
+
+    def __init__(self, wait=None):
+        # Wait goes to Retry-After only, detail stays a code like other errors
+        exceptions.APIException.__init__(self)
+        self.wait = None if wait is None else math.ceil(wait)
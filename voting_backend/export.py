@@ -0,0 +1,69 @@
+import csv
+import json
+
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+
+from .models import VoteOption, VoteRecord
+
+RECORD_FIELDS = ('record_id', 'campaign_id', 'option_code', 'user_id', 'create_time')
+RESULT_FIELDS = ('campaign_id', 'option_code', 'option_detail', 'number_of_vote')
+FORMATS = ('csv', 'ndjson')
+
+
+class Echo:
+    """
+    File-like object handing each written line back to the caller instead of buffering it
+    """
+    def write(self, value):
+        return value
+
+
+def iter_records(campaign_ids=None, start_time=None, end_time=None, chunk_size=2000):
+    """
+    Iterate vote records as tuples of RECORD_FIELDS, fetched in chunks through a server-side cursor
+    """
+    records = VoteRecord.objects.all()
+    if campaign_ids:
+        records = records.filter(campaign_id__in=campaign_ids)
+    if start_time is not None:
+        records = records.filter(create_time__gte=start_time)
+    if end_time is not None:
+        records = records.filter(create_time__lt=end_time)
+    return records.order_by('id').values_list(
+        'id', 'campaign_id', 'option__option_code', 'user_id', 'create_time'
+    ).iterator(chunk_size=chunk_size)
+
+
+def iter_results(campaign_ids=None, chunk_size=2000):
+    """
+    Iterate per-option tallies as tuples of RESULT_FIELDS
+    """
+    options = VoteOption.objects.all()
+    if campaign_ids:
+        options = options.filter(campaign_id__in=campaign_ids)
+    return options.order_by('campaign_id', 'option_code').annotate(
+        number_of_vote=Coalesce(Sum('counter_set__count'), 0)
+    ).values_list(
+        'campaign_id', 'option_code', 'option_detail', 'number_of_vote'
+    ).iterator(chunk_size=chunk_size)
+
+
+def to_value(value):
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    return value
+
+
+def render_lines(fields, rows, output_format='csv'):
+    """
+    Render rows one line at a time, starting with CSV header
+    """
+    if output_format == 'ndjson':
+        for row in rows:
+            yield json.dumps(dict(zip(fields, map(to_value, row))), ensure_ascii=False) + '\n'
+        return
+    writer = csv.writer(Echo())
+    yield writer.writerow(fields)
+    for row in rows:
+        yield writer.writerow([to_value(value) for value in row])
@@ -0,0 +1,28 @@
+from django.db import models
+
+
+class HexDigestField(models.BinaryField):
+    """
+    Store a hex digest as raw bytes, half the size of its text form in column and indexes.
+    The value is kept as lower case hex string in Python, in fixtures and in queries.
+    """
+    def from_db_value(self, value, expression, connection):
+        if value is None:
+            return value
+        return bytes(value).hex()
+
+    def to_python(self, value):
+        if isinstance(value, (bytes, memoryview)):
+            return bytes(value).hex()
+        if isinstance(value, str):
+            return value.lower()
+        return value
+
+    def get_prep_value(self, value):
+        value = super().get_prep_value(value)
+        if isinstance(value, str):
+            return bytes.fromhex(value)
+        return value
+
+    def value_to_string(self, obj):
+        return self.to_python(self.value_from_object(obj))
@@ -0,0 +1,17 @@
+from django_filters import rest_framework as filters
+
+from .models import STATUS_CHOICES, VoteCampaign
+
+
+class CampaignFilter(filters.FilterSet):
+    """
+    Filter campaign by stored status, covered by campaign_status_idx
+    """
+    status = filters.MultipleChoiceFilter(choices=STATUS_CHOICES, method='filter_status')
+
+    class Meta:
+        model = VoteCampaign
+        fields = ('status',)
+
+    def filter_status(self, queryset, name, value):
+        return queryset.filter(status__in=value)
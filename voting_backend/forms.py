@@ -1,50 +1,115 @@
+import itertools
 import re
+import string
 
 from django import forms
 from django.core.exceptions import ValidationError
 
+HKID_PATTERN = re.compile('^([A-Z]{1,2})([0-9]{6})([A0-9])$')
+
+INCORRECT_PATTERN = 'INCORRECT_PATTERN'
+INCORRECT_CHECKSUM = 'INCORRECT_CHECKSUM'
+
+# Digits count as their value, letters from 10 for A
+CHAR_VALUES = {char: value for value, char in enumerate(string.digits + string.ascii_uppercase)}
+
+
+def get_position_sums(weights):
+    """
+    Return weighted sum of every three digits, weighted by position
+    """
+    return {
+        ''.join(digits): sum(weight * int(digit) for weight, digit in zip(weights, digits))
+        for digits in itertools.product(string.digits, repeat=3)
+    }
+
+
+# Weighted sum of an HKID is 58 weighted 9, followed by every character before the check digit
+# weighted from 8 down, whether the prefix has one letter or two
+SINGLE_LETTER_SUMS = (get_position_sums((7, 6, 5)), get_position_sums((4, 3, 2)))
+DOUBLE_LETTER_SUMS = (get_position_sums((6, 5, 4)), get_position_sums((3, 2, 1)))
+# Prefix -> (weighted sum of the prefix, weighted sums of the first three digits, of the last three digits)
+PREFIX_TABLES = dict(
+    [
+        (first, (58 * 9 + 8 * CHAR_VALUES[first],) + SINGLE_LETTER_SUMS)
+        for first in string.ascii_uppercase
+    ]
+    + [
+        (first + second, (58 * 9 + 8 * CHAR_VALUES[first] + 7 * CHAR_VALUES[second],) + DOUBLE_LETTER_SUMS)
+        for first in string.ascii_uppercase for second in string.ascii_uppercase
+    ]
+)
+# Check digit by remainder of the weighted sum modulo 11
+CHECK_DIGITS = ('0', 'A', '9', '8', '7', '6', '5', '4', '3', '2', '1')
+
+
+def get_digit_sum(value):
+    """
+    Return weighted sum of an HKID without its check digit
+    """
+    prefix_sum, high_sums, low_sums = PREFIX_TABLES[value[:-6]]
+    return prefix_sum + high_sums[value[-6:-3]] + low_sums[value[-3:]]
+
+
+def check_hkid(value):
+    """
+    Return None for a valid upper case HKID, INCORRECT_PATTERN or INCORRECT_CHECKSUM otherwise
+    """
+    match = HKID_PATTERN.match(value)
+    if match is None:
+        return INCORRECT_PATTERN
+    prefix, digits, check_digit = match.groups()
+    prefix_sum, high_sums, low_sums = PREFIX_TABLES[prefix]
+    if CHECK_DIGITS[(prefix_sum + high_sums[digits[:3]] + low_sums[digits[3:]]) % 11] != check_digit:
+        return INCORRECT_CHECKSUM
+    return None
+
+
+def check_hkids(values):
+    """
+    Check a list of upper case HKIDs in one pass, return None or error code per HKID
+    """
+    # Bound locally, lookups of globals would cost more than the check itself
+    match, prefix_tables, check_digits = HKID_PATTERN.match, PREFIX_TABLES, CHECK_DIGITS
+    errors = [None] * len(values)
+    for index, value in enumerate(values):
+        matched = match(value)
+        if matched is None:
+            errors[index] = INCORRECT_PATTERN
+            continue
+        prefix, digits, check_digit = matched.groups()
+        prefix_sum, high_sums, low_sums = prefix_tables[prefix]
+        if check_digits[(prefix_sum + high_sums[digits[:3]] + low_sums[digits[3:]]) % 11] != check_digit:
+            errors[index] = INCORRECT_CHECKSUM
+    return errors
+
 
 class HKIDField(forms.CharField):
     """
     Custom field to check if the id is valid HKID
     """
-    @staticmethod
-    def id_char_to_value(char):
-        try:
-            digit_value = int(char)
-            return digit_value
-        except ValueError:
-            return ord(char) - ord('A') + 10
-
-    @staticmethod
-    def hkid_checksum(digit_sum, checksum):
-        remainder = digit_sum % 11
-        if remainder == 0 and checksum == 0:
-            return True
-        if remainder == 1 and checksum == 'A':
-            return True
-        if str(11-remainder) == checksum:
-            return True
-        return False
-    
-    def get_digit_sum(self, value):
-        if len(value) == 9:
-            return sum([(9-ix) * self.id_char_to_value(digit) for ix, digit in enumerate(value)])
-        return  58*9 + sum([(8-ix)*self.id_char_to_value(digit) for ix, digit in enumerate(value)])
-
     def clean(self, data, initial=None):
         # Turn all letter to upper before performing clean
         if type(data) == str:
             return super().clean(data.upper())
         return super().clean(data)
 
+    def clean_many(self, values):
+        """
+        Clean a list of HKID in one pass without raising ValidationError per item.
+        Return list of (cleaned value, None) for valid HKID, (None, error message) otherwise.
+        """
+        cleaned_values = [value.strip().upper() if isinstance(value, str) else '' for value in values]
+        return [
+            (None, error) if error else (value, None)
+            for value, error in zip(cleaned_values, check_hkids(cleaned_values))
+        ]
+
     def validate(self, value):
         super().validate(value)
-        if not re.match('^([A-Z]{1,2})([0-9]{6})([A0-9])$', value):
-            raise ValidationError(message='INCORRECT_PATTERN')
-        digit_sum = self.get_digit_sum(value[:-1])
-        if not self.hkid_checksum(digit_sum, value[-1]):
-            raise ValidationError(message='INCORRECT_CHECKSUM')
+        error = check_hkid(value)
+        if error:
+            raise ValidationError(message=error)
 
 
 class VoteRecordForm(forms.Form):
@@ -0,0 +1,180 @@
+import datetime
+import functools
+import hashlib
+import hmac
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.db import connection, transaction
+from django.db.models import Q
+from django.dispatch import receiver
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from . import snapshots
+from .campaign_cache import campaign_cache
+from .models import VoteCampaign, VoteRecord
+
+# Algorithm of voter IDs stored before hashers became configurable, the only one which can be rehashed
+REHASHABLE_ALGORITHM = 'sha256'
+
+
+class VoterIDHasher:
+    """
+    Derive the stored voter ID of an HKID from the SHA-256 digest of the HKID, so IDs stored
+    as plain SHA-256 can be rehashed into any algorithm without knowing the HKIDs
+    """
+    algorithm = None
+
+    def digest(self, sha256_digest):
+        raise NotImplementedError
+
+    def hash(self, hkid):
+        return self.digest(hashlib.sha256(hkid.encode('utf-8')).digest()).hex()
+
+    def rehash(self, user_id):
+        """
+        Return voter ID of a user_id stored as plain SHA-256
+        """
+        return self.digest(bytes.fromhex(user_id)).hex()
+
+
+class SHA256VoterIDHasher(VoterIDHasher):
+    """
+    Plain SHA-256, which anyone can reverse by hashing every possible HKID
+    """
+    algorithm = 'sha256'
+
+    def digest(self, sha256_digest):
+        return sha256_digest
+
+
+class KeyedVoterIDHasher(VoterIDHasher):
+    """
+    Hash keyed with VOTER_ID_HASHING['KEY'], which must never change once votes are stored
+    """
+    def __init__(self):
+        if not settings.VOTER_ID_HASHING['KEY']:
+            raise ImproperlyConfigured(f'Voter ID algorithm {self.algorithm} requires VOTER_ID_KEY')
+        self.key = settings.VOTER_ID_HASHING['KEY'].encode('utf-8')
+
+
+class BLAKE2bVoterIDHasher(KeyedVoterIDHasher):
+    """
+    Keyed BLAKE2b truncated to 16 bytes, half the size of SHA-256 in the voter unique index
+    """
+    algorithm = 'blake2b'
+    digest_size = 16
+
+    def __init__(self):
+        super().__init__()
+        if len(self.key) > hashlib.blake2b.MAX_KEY_SIZE:
+            self.key = hashlib.blake2b(self.key).digest()
+
+    def digest(self, sha256_digest):
+        return hashlib.blake2b(sha256_digest, key=self.key, digest_size=self.digest_size).digest()
+
+
+class HMACSHA256VoterIDHasher(KeyedVoterIDHasher):
+    algorithm = 'hmac_sha256'
+
+    def digest(self, sha256_digest):
+        return hmac.new(self.key, sha256_digest, hashlib.sha256).digest()
+
+
+@functools.lru_cache()
+def get_hashers():
+    """
+    Return configured hashers by algorithm
+    """
+    hashers = {}
+    for path in settings.VOTER_ID_HASHING['HASHERS']:
+        hasher_class = import_string(path)
+        hashers[hasher_class.algorithm] = hasher_class
+    return hashers
+
+
+@functools.lru_cache()
+def get_hasher(algorithm):
+    try:
+        return get_hashers()[algorithm]()
+    except KeyError:
+        raise ImproperlyConfigured(f"Unknown voter ID algorithm {algorithm}, add its hasher to VOTER_ID_HASHING['HASHERS']")
+
+
+def hash_voter_id(hkid, algorithm):
+    return get_hasher(algorithm).hash(hkid)
+
+
+@receiver(setting_changed)
+def reset_hashers(setting, **kwargs):
+    if setting == 'VOTER_ID_HASHING':
+        get_hashers.cache_clear()
+        get_hasher.cache_clear()
+
+
+def get_rehashable_campaigns():
+    """
+    Return campaigns with voter IDs stored as plain SHA-256 which receive no vote while rehashed:
+    closed for good, or starting once their cached algorithm expired in every process
+    """
+    starts_after = timezone.now() + datetime.timedelta(seconds=settings.CAMPAIGN_CACHE['TIMEOUT'])
+    return VoteCampaign.objects.filter(
+        Q(end_time__lte=snapshots.get_closed_before()) | Q(start_time__gt=starts_after),
+        voter_id_algorithm=REHASHABLE_ALGORITHM
+    )
+
+
+def rehash_campaign(campaign_id, algorithm, batch_size=1000):
+    """
+    Rehash voter IDs of a campaign stored as plain SHA-256, batch_size records per transaction in order
+    of ID, so no lock is held on every record of the campaign. A rehash interrupted halfway resumes after
+    the last batch committed, with the algorithm it started with.
+    Return number of records rehashed, or None if the campaign has no plain SHA-256 voter IDs.
+    """
+    hasher = get_hasher(algorithm)
+    # Campaign in the condition prunes partitioned records
+    sql = 'UPDATE {} SET user_id = %s WHERE id = %s AND campaign_id = %s'.format(
+        connection.ops.quote_name(VoteRecord._meta.db_table)
+    )
+    field = VoteRecord._meta.get_field('user_id')
+    rehashed = 0
+    done = False
+    while not done:
+        with transaction.atomic():
+            # Locked so concurrent runs rehash each batch once
+            campaign = VoteCampaign.objects.select_for_update().filter(campaign_id=campaign_id).first()
+            if campaign is None or campaign.voter_id_algorithm != REHASHABLE_ALGORITHM:
+                # Finished by a concurrent run
+                return rehashed or None
+            if campaign.voter_id_rehash_algorithm not in ('', algorithm):
+                raise ImproperlyConfigured(
+                    f'Voter IDs of campaign {campaign_id} are partly rehashed with '
+                    f'{campaign.voter_id_rehash_algorithm}, finish with the same algorithm'
+                )
+            records = VoteRecord.objects.filter(campaign_id=campaign_id).order_by('id').values_list('id', 'user_id')
+            if campaign.voter_id_rehashed_to is not None:
+                records = records.filter(id__gt=campaign.voter_id_rehashed_to)
+            batch = [
+                (field.get_db_prep_value(hasher.rehash(user_id), connection), record_id, campaign_id)
+                for record_id, user_id in records[:batch_size]
+            ]
+            if batch:
+                with connection.cursor() as cursor:
+                    cursor.executemany(sql, batch)
+                rehashed += len(batch)
+            done = len(batch) < batch_size
+            if done:
+                VoteCampaign.objects.filter(campaign_id=campaign_id).update(
+                    voter_id_algorithm=algorithm,
+                    voter_id_rehash_algorithm='',
+                    voter_id_rehashed_to=None
+                )
+            else:
+                VoteCampaign.objects.filter(campaign_id=campaign_id).update(
+                    voter_id_rehash_algorithm=algorithm,
+                    voter_id_rehashed_to=batch[-1][1]
+                )
+    campaign_cache.invalidate(campaign_id)
+    return rehashed
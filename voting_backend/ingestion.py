@@ -0,0 +1,358 @@
+import atexit
+import glob
+import json
+import logging
+import os
+import threading
+import uuid
+from collections import OrderedDict, defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, close_old_connections, transaction
+from django.utils import timezone
+
+from . import counters, duplicates, result_cache, snapshots
+from .metrics import registry
+from .models import VoteRecord
+
+logger = logging.getLogger(__name__)
+
+# Owner is the PID and a token of the process instance, so a process reusing the PID of a dead one
+# never writes to its files and replays them instead
+JOURNAL_PATTERN = 'journal-{owner}.log'
+SEGMENT_PATTERN = 'flushing-{owner}-{sequence}.log'
+CLAIMED_PATTERN = '{name}.{owner}.replay'
+QUARANTINE_SUFFIX = '.quarantine'
+
+
+def is_enabled():
+    return settings.VOTE_INGESTION['MODE'] == 'queue'
+
+
+def is_process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except (ProcessLookupError, OverflowError):
+        return False
+    except PermissionError:
+        # Process exists but owned by another user
+        return True
+    return True
+
+
+def parse_owner(name):
+    """
+    Return (pid, owner) of a journal, segment or claimed journal file name
+    """
+    if name.endswith('.replay'):
+        # Claimed by a process which may have died during the replay
+        owner = name.rsplit('.', 2)[1]
+    else:
+        parts = name.rsplit('.', 1)[0].split('-')
+        # Files of versions before the instance token have no token
+        has_token = len(parts) == (4 if parts[0] == 'flushing' else 3)
+        owner = '-'.join(parts[1:3] if has_token else parts[1:2])
+    return int(owner.split('-')[0]), owner
+
+
+class VoteIngestionQueue:
+    """
+    Write-behind queue of accepted votes.
+    Each vote is appended to a per-process journal before it is acknowledged,
+    a background thread drains the queue into VoteRecord with bulk_create in batches.
+    Journals left behind by dead processes are replayed on start, so an accepted vote is never lost.
+    A segment failing max_segment_attempts flushes is set aside with QUARANTINE_SUFFIX.
+    Repeat votes are rejected against the database and the last max_recent_voters votes queued here,
+    a voter queued by two processes at once is only found when written, and reported.
+    """
+    max_write_attempts = 3
+    max_segment_attempts = 5
+    max_recent_voters = 100000
+
+    def __init__(self, journal_dir, batch_size=500, flush_interval=0.5, fsync=True):
+        self.journal_dir = journal_dir
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync = fsync
+        self.pid = os.getpid()
+        self.owner = '{}-{}'.format(self.pid, uuid.uuid4().hex[:8])
+        self.lock = threading.Lock()
+        self.wakeup = threading.Event()
+        self.stopped = threading.Event()
+        self.thread = None
+        self.pending = []
+        # path of segment -> number of failed attempts
+        self.failed_segments = {}
+        self.sequence = 0
+        # (campaign_id, user_id) of votes queued recently, oldest first
+        self.recent_voters = OrderedDict()
+        os.makedirs(journal_dir, exist_ok=True)
+        self.journal_path = os.path.join(journal_dir, JOURNAL_PATTERN.format(owner=self.owner))
+        self.journal = open(self.journal_path, 'a', encoding='utf-8')
+
+    def start(self):
+        self.recover()
+        self.thread = threading.Thread(target=self.run, name='vote-ingestion-flusher', daemon=True)
+        self.thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        self.stopped.set()
+        self.wakeup.set()
+        if self.thread is not None:
+            self.thread.join()
+        self.flush()
+
+    def run(self):
+        while not self.stopped.is_set():
+            self.wakeup.wait(self.flush_interval)
+            self.wakeup.clear()
+            try:
+                self.flush()
+            except Exception:
+                logger.exception('Failed to flush vote ingestion queue')
+            finally:
+                close_old_connections()
+
+    def is_recorded(self, campaign_id, user_id):
+        if duplicates.is_enabled():
+            return duplicates.vote_filter.is_repeat(campaign_id, user_id)
+        return VoteRecord.objects.filter(campaign_id=campaign_id, user_id=user_id).exists()
+
+    def forget_campaign(self, campaign_id):
+        with self.lock:
+            for key in [key for key in self.recent_voters if key[0] == campaign_id]:
+                del self.recent_voters[key]
+
+    def submit(self, instance):
+        """
+        Journal and enqueue an unsaved VoteRecord.
+        Return False if the user already voted in the campaign.
+        """
+        instance.create_time = timezone.now()
+        entry = {
+            'campaign_id': instance.campaign_id,
+            'option_id': instance.option_id,
+            'user_id': instance.user_id,
+            'shard': counters.shard_for(instance.user_id, instance.campaign.counter_shards),
+        }
+        key = (instance.campaign_id, instance.user_id)
+        with self.lock:
+            if key in self.recent_voters:
+                return False
+        if self.is_recorded(*key):
+            return False
+        with self.lock:
+            # Same voter may have been queued by another thread meanwhile
+            if key in self.recent_voters:
+                return False
+            self.journal.write(json.dumps(entry) + '\n')
+            self.journal.flush()
+            if self.fsync:
+                os.fsync(self.journal.fileno())
+            self.recent_voters[key] = None
+            if len(self.recent_voters) > self.max_recent_voters:
+                self.recent_voters.popitem(last=False)
+            self.pending.append(entry)
+            if len(self.pending) >= self.batch_size:
+                self.wakeup.set()
+        return True
+
+    def rotate(self):
+        """
+        Swap out the pending entries together with the journal holding exactly these entries
+        """
+        with self.lock:
+            if not self.pending:
+                return None, []
+            entries, self.pending = self.pending, []
+            self.journal.close()
+            self.sequence += 1
+            segment = os.path.join(
+                self.journal_dir, SEGMENT_PATTERN.format(owner=self.owner, sequence=self.sequence)
+            )
+            os.rename(self.journal_path, segment)
+            self.journal = open(self.journal_path, 'a', encoding='utf-8')
+        return segment, entries
+
+    def flush(self):
+        self.retry_failed_segments()
+        segment, entries = self.rotate()
+        while entries:
+            try:
+                for start in range(0, len(entries), self.batch_size):
+                    self.write(entries[start:start + self.batch_size], acknowledged=True)
+            except Exception:
+                # Segment stays on disk and is retried on next flush
+                self.failed_segments[segment] = 1
+                raise
+            os.remove(segment)
+            segment, entries = self.rotate()
+
+    def retry_failed_segments(self):
+        """
+        Replay segments which failed before, setting aside those failing too many times
+        so they do not hold back votes accepted since
+        """
+        for segment, attempts in list(self.failed_segments.items()):
+            try:
+                self.replay(segment)
+            except Exception:
+                attempts += 1
+                if attempts < self.max_segment_attempts:
+                    self.failed_segments[segment] = attempts
+                    logger.exception('Failed to replay %s, attempt %d', segment, attempts)
+                    continue
+                os.rename(segment, segment + QUARANTINE_SUFFIX)
+                logger.exception('Failed to replay %s %d times, moved to %s%s',
+                                 segment, attempts, segment, QUARANTINE_SUFFIX)
+            del self.failed_segments[segment]
+
+    def recover(self):
+        """
+        Replay journals of processes which are no longer running,
+        including those of a previous process with the PID of this one
+        """
+        paths = glob.glob(os.path.join(self.journal_dir, '*.log'))
+        paths += glob.glob(os.path.join(self.journal_dir, '*.replay'))
+        for path in sorted(paths):
+            name = os.path.basename(path)
+            pid, owner = parse_owner(name)
+            if owner == self.owner or (pid != self.pid and is_process_alive(pid)):
+                continue
+            claimed = os.path.join(self.journal_dir, CLAIMED_PATTERN.format(
+                name=name.rsplit('.', 2)[0] if name.endswith('.replay') else name,
+                owner=self.owner
+            ))
+            try:
+                # Rename is atomic, only one starting process claims the journal
+                os.rename(path, claimed)
+            except FileNotFoundError:
+                continue
+            try:
+                self.replay(claimed)
+            except Exception:
+                # Retried by the flusher, without holding back votes of this process
+                self.failed_segments[claimed] = 1
+                logger.exception('Failed to replay %s', claimed)
+
+    def replay(self, path):
+        with open(path, encoding='utf-8') as journal:
+            # A line cut by a crash was never acknowledged
+            entries = [json.loads(line) for line in journal if line.endswith('\n')]
+        for start in range(0, len(entries), self.batch_size):
+            self.write(entries[start:start + self.batch_size])
+        logger.info('Replayed %d vote(s) from %s', len(entries), path)
+        os.remove(path)
+
+    def write(self, entries, acknowledged=False):
+        """
+        Write entries, reporting those already recorded: replayed entries may have been written
+        before a crash, while acknowledged ones were accepted by another process meanwhile
+        """
+        new_entries = write_votes(entries, self.max_write_attempts)
+        skipped = len(entries) - len(new_entries)
+        if skipped and acknowledged:
+            registry.inc('voting_ingestion_repeats_total', amount=skipped)
+            logger.warning('Dropped %d accepted vote(s) of voters recorded by another process', skipped)
+        elif skipped:
+            logger.info('Skipped %d vote(s) already recorded', skipped)
+        return len(new_entries)
+
+
+def write_votes(entries, max_attempts=3):
+    """
+    Insert vote entries not yet in database and add them to the option counters in one transaction.
+    Entries are dicts of campaign_id, option_id, user_id and counter shard.
+    Entries can already exist when replaying or when another process accepted the same voter,
+    only the first entry per voter and campaign is kept. Return the inserted entries,
+    which join the duplicate vote filter once committed.
+    """
+    for attempt in range(1, max_attempts + 1):
+        try:
+            with transaction.atomic():
+                new_entries = exclude_existing(entries)
+                VoteRecord.objects.bulk_create([
+                    VoteRecord(
+                        campaign_id=entry['campaign_id'],
+                        option_id=entry['option_id'],
+                        user_id=entry['user_id'],
+                    )
+                    for entry in new_entries
+                ])
+                totals = defaultdict(int)
+                for entry in new_entries:
+                    totals[(entry['campaign_id'], entry['option_id'], entry['shard'])] += 1
+                for (campaign_id, option_id, shard), amount in totals.items():
+                    counters.increment(campaign_id, option_id, shard, amount)
+                campaign_ids = {entry['campaign_id'] for entry in new_entries}
+                for campaign_id in campaign_ids:
+                    result_cache.mark_changed(campaign_id)
+                if campaign_ids:
+                    # Votes queued before a campaign closed may land after its results were frozen
+                    snapshots.discard(campaign_ids)
+                if new_entries and duplicates.is_enabled():
+                    transaction.on_commit(lambda: add_to_vote_filter(new_entries))
+            return new_entries
+        except IntegrityError:
+            # Conflicting vote committed concurrently, exclude it on retry
+            if attempt == max_attempts:
+                raise
+
+
+def add_to_vote_filter(entries):
+    """
+    Add voters of written entries to the duplicate vote filter of current process.
+    Votes are recorded already, a voter missing from the filter is caught by the unique index.
+    """
+    try:
+        for entry in entries:
+            duplicates.vote_filter.add(entry['campaign_id'], entry['user_id'])
+    except Exception:
+        logger.exception('Failed to add %d voter(s) to duplicate vote filter', len(entries))
+
+
+def exclude_existing(entries):
+    by_campaign = defaultdict(dict)
+    for entry in entries:
+        by_campaign[entry['campaign_id']].setdefault(entry['user_id'], entry)
+    new_entries = []
+    for campaign_id, voters in by_campaign.items():
+        existing = set(VoteRecord.objects.filter(
+            campaign_id=campaign_id,
+            user_id__in=list(voters)
+        ).values_list('user_id', flat=True))
+        new_entries += [entry for user_id, entry in voters.items() if user_id not in existing]
+    return new_entries
+
+
+_queue = None
+_queue_lock = threading.Lock()
+
+
+def forget_campaign(campaign_id):
+    """
+    Drop recent voters of a closed campaign from the queue of current process, if started
+    """
+    if _queue is not None and _queue.pid == os.getpid():
+        _queue.forget_campaign(campaign_id)
+
+
+def get_queue():
+    """
+    Return the queue of current process, started on first use
+    """
+    global _queue
+    if _queue is None or _queue.pid != os.getpid():
+        with _queue_lock:
+            if _queue is None or _queue.pid != os.getpid():
+                config = settings.VOTE_INGESTION
+                queue = VoteIngestionQueue(
+                    config['JOURNAL_DIR'],
+                    batch_size=config['BATCH_SIZE'],
+                    flush_interval=config['FLUSH_INTERVAL'],
+                    fsync=config['FSYNC'],
+                )
+                queue.start()
+                _queue = queue
+    return _queue
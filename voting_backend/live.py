@@ -0,0 +1,290 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponse, HttpResponseNotFound, StreamingHttpResponse
+from django.utils.cache import cc_delim_re, patch_vary_headers
+from rest_framework.renderers import BaseRenderer
+
+from . import rendering, result_cache
+from .models import VoteCampaign
+from .routers import read_from_replica
+
+logger = logging.getLogger(__name__)
+
+# WSGI environ key set by the ASGI handler
+ASYNC_KEY = 'voting_backend.async'
+# Headers of a long-poll answer which are its own, others are copied from the response middleware saw
+ANSWER_HEADERS = ('content-type', 'content-length', 'content-encoding', 'etag', 'vary')
+
+
+class EventStreamRenderer(BaseRenderer):
+    """
+    Negotiate text/event-stream, events themselves are streamed by the view.
+    Only error responses are rendered, as a single error event.
+    """
+    media_type = 'text/event-stream'
+    format = 'event-stream'
+    charset = 'utf-8'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        return 'event: error\ndata: {}\n\n'.format(json.dumps(data)).encode('utf-8')
+
+
+class TallyBroadcaster:
+    """
+    Share results of campaigns among every live connection of the process.
+    One producer thread loads results of all subscribed campaigns every interval seconds,
+    so connections get at most one update per interval and cost no query of their own.
+    """
+    def __init__(self, interval=1):
+        self.interval = interval
+        self.condition = threading.Condition()
+        # campaign_id -> number of subscribers
+        self.subscribers = {}
+        # campaign_id -> latest ResultEntry
+        self.entries = {}
+        # Callables invoked from producer thread whenever any result changed
+        self.listeners = set()
+        self.thread = None
+
+    def ensure_started(self):
+        if self.thread is None or not self.thread.is_alive():
+            self.thread = threading.Thread(target=self.run, name='tally-broadcaster', daemon=True)
+            self.thread.start()
+
+    def subscribe(self, campaign_id):
+        with self.condition:
+            self.subscribers[campaign_id] = self.subscribers.get(campaign_id, 0) + 1
+            self.ensure_started()
+            self.condition.notify_all()
+
+    def unsubscribe(self, campaign_id):
+        with self.condition:
+            self.subscribers[campaign_id] -= 1
+            if not self.subscribers[campaign_id]:
+                del self.subscribers[campaign_id]
+                self.entries.pop(campaign_id, None)
+
+    def add_listener(self, listener):
+        with self.condition:
+            self.listeners.add(listener)
+
+    def remove_listener(self, listener):
+        with self.condition:
+            self.listeners.discard(listener)
+
+    def get_entry(self, campaign_id):
+        with self.condition:
+            return self.entries.get(campaign_id)
+
+    def wait(self, campaign_id, etags=(), timeout=None):
+        """
+        Wait until results of a subscribed campaign have an ETag not in etags.
+        Return the latest entry, which is unchanged or None on timeout.
+        """
+        def is_changed():
+            entry = self.entries.get(campaign_id)
+            return entry is not None and entry.etag not in etags
+
+        with self.condition:
+            self.condition.wait_for(is_changed, timeout)
+            return self.entries.get(campaign_id)
+
+    @staticmethod
+    def load(campaign_ids):
+        with read_from_replica():
+            details = rendering.get_campaign_details(VoteCampaign.objects.filter(campaign_id__in=campaign_ids))
+        return {
+            campaign_id: result_cache.build_entry(None, data)
+            for campaign_id, data in details.items()
+        }
+
+    def poll_once(self):
+        """
+        Load results of subscribed campaigns and wake up connections whose results changed
+        """
+        with self.condition:
+            campaign_ids = list(self.subscribers)
+        if not campaign_ids:
+            return
+        entries = self.load(campaign_ids)
+        with self.condition:
+            changed = False
+            for campaign_id, entry in entries.items():
+                previous = self.entries.get(campaign_id)
+                if campaign_id in self.subscribers and (previous is None or previous.etag != entry.etag):
+                    self.entries[campaign_id] = entry
+                    changed = True
+            if changed:
+                self.condition.notify_all()
+                for listener in self.listeners:
+                    listener()
+
+    def run(self):
+        while True:
+            with self.condition:
+                self.condition.wait_for(lambda: self.subscribers)
+            try:
+                self.poll_once()
+            except Exception:
+                logger.exception('Failed to load live results')
+            finally:
+                close_old_connections()
+            time.sleep(self.interval)
+
+
+def format_event(entry):
+    return 'id: {}\nevent: result\ndata: {}\n\n'.format(entry.etag.strip('"'), entry.body.decode('utf-8'))
+
+
+def stream_events(campaign_id, last_event_id=''):
+    """
+    Yield server-sent events with results of a campaign whenever they change, and comments in between
+    to keep the connection alive. The stream ends after MAX_DURATION and the client reconnects with
+    Last-Event-ID, so it only gets results changed since.
+    """
+    options = settings.LIVE_RESULTS
+    deadline = time.monotonic() + options['MAX_DURATION']
+    etags = ['"{}"'.format(last_event_id)] if last_event_id else []
+    broadcaster.subscribe(campaign_id)
+    try:
+        yield 'retry: {}\n\n'.format(int(options['RETRY'] * 1000))
+        while True:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return
+            entry = broadcaster.wait(campaign_id, etags, min(options['HEARTBEAT'], remaining))
+            if entry is None or entry.etag in etags:
+                yield ': keep-alive\n\n'
+                continue
+            etags = [entry.etag]
+            yield format_event(entry)
+    finally:
+        broadcaster.unsubscribe(campaign_id)
+
+
+class LiveHub:
+    """
+    Wake up coroutines of one event loop whenever any live result changed,
+    with a single listener on the broadcaster however many streams the loop serves.
+    Must be created and awaited within the event loop.
+    """
+    def __init__(self, loop):
+        self.loop = loop
+        self.changed = asyncio.Event()
+        broadcaster.add_listener(self.notify)
+
+    def notify(self):
+        # Called from producer thread
+        self.loop.call_soon_threadsafe(self.wake)
+
+    def wake(self):
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    async def wait(self, timeout):
+        try:
+            await asyncio.wait_for(self.changed.wait(), timeout)
+        except asyncio.TimeoutError:
+            pass
+
+
+async def stream_events_async(campaign_id, last_event_id, hub):
+    """
+    Same events as stream_events, waiting on the event loop instead of holding a thread
+    """
+    options = settings.LIVE_RESULTS
+    deadline = time.monotonic() + options['MAX_DURATION']
+    etags = ['"{}"'.format(last_event_id)] if last_event_id else []
+    broadcaster.subscribe(campaign_id)
+    try:
+        yield 'retry: {}\n\n'.format(int(options['RETRY'] * 1000))
+        written_at = time.monotonic()
+        while True:
+            now = time.monotonic()
+            if now >= deadline:
+                return
+            entry = broadcaster.get_entry(campaign_id)
+            if entry is not None and entry.etag not in etags:
+                etags = [entry.etag]
+                written_at = now
+                yield format_event(entry)
+            elif now - written_at >= options['HEARTBEAT']:
+                written_at = now
+                yield ': keep-alive\n\n'
+            else:
+                await hub.wait(min(written_at + options['HEARTBEAT'], deadline) - now)
+    finally:
+        broadcaster.unsubscribe(campaign_id)
+
+
+async def poll_async(campaign_id, etags, timeout, hub):
+    """
+    Wait on the event loop until results of a campaign have an ETag not in etags.
+    Return the latest entry, which is unchanged or None on timeout.
+    """
+    deadline = time.monotonic() + timeout
+    broadcaster.subscribe(campaign_id)
+    try:
+        while True:
+            entry = broadcaster.get_entry(campaign_id)
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or (entry is not None and entry.etag not in etags):
+                return entry
+            await hub.wait(remaining)
+    finally:
+        broadcaster.unsubscribe(campaign_id)
+
+
+class PollResponse(HttpResponse):
+    """
+    Long-poll to be answered once results of a campaign change. Never sent: the ASGI handler waits
+    for the change on its event loop and sends get_answer instead, without running middleware again.
+    """
+    def __init__(self, request, campaign_id, etags):
+        super().__init__()
+        self.request = request
+        self.campaign_id = campaign_id
+        self.etags = etags
+
+    def get_answer(self, entry):
+        """
+        Return response with results of entry, or current results if none were loaded in time,
+        carrying headers and cookies set by middleware on this response
+        """
+        if entry is None:
+            entry = broadcaster.load([self.campaign_id]).get(self.campaign_id)
+        if entry is None:
+            # Campaign deleted meanwhile
+            answer = HttpResponseNotFound(json.dumps({'detail': 'NOT_FOUND'}), content_type='application/json')
+        else:
+            answer = result_cache.to_response(self.request, entry)
+        for name, value in self.items():
+            if name.lower() not in ANSWER_HEADERS:
+                answer[name] = value
+        if self.has_header('Vary'):
+            patch_vary_headers(answer, cc_delim_re.split(self['Vary']))
+        answer.cookies = self.cookies
+        return answer
+
+
+class LiveResponse(StreamingHttpResponse):
+    """
+    Event stream of campaign results. WSGI servers iterate stream_events,
+    the ASGI handler recognises the response and streams on its event loop instead.
+    """
+    def __init__(self, campaign_id, last_event_id=''):
+        super().__init__(stream_events(campaign_id, last_event_id), content_type='text/event-stream')
+        self.campaign_id = campaign_id
+        self.last_event_id = last_event_id
+        self['Cache-Control'] = 'no-cache'
+        # Let proxies pass events through as soon as they are written
+        self['X-Accel-Buffering'] = 'no'
+
+
+broadcaster = TallyBroadcaster(interval=settings.LIVE_RESULTS['INTERVAL'])
@@ -0,0 +1,51 @@
+from django.core.management.base import BaseCommand, CommandError, OutputWrapper
+from django.utils.dateparse import parse_datetime
+
+from voting_backend import export
+
+
+class Command(BaseCommand):
+    help = 'Stream vote records, or per-option results with --results, as CSV or NDJSON'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--campaign', type=int, nargs='*', dest='campaign_ids', help='Campaign ID(s) to export')
+        parser.add_argument('--start', help='Export records created at or after this time')
+        parser.add_argument('--end', help='Export records created before this time')
+        parser.add_argument('--results', action='store_true', help='Export per-option results instead of records')
+        parser.add_argument('--format', choices=export.FORMATS, default='csv', dest='output_format')
+        parser.add_argument('--output', help='File to write, default to stdout')
+        parser.add_argument('--chunk-size', type=int, default=2000, help='Rows fetched per round trip')
+
+    def parse_time(self, value):
+        if value is None:
+            return None
+        try:
+            parsed_time = parse_datetime(value)
+        except ValueError:
+            parsed_time = None
+        if parsed_time is None:
+            raise CommandError(f'Invalid time {value}')
+        return parsed_time
+
+    def handle(self, *args, **options):
+        if options['results']:
+            fields = export.RESULT_FIELDS
+            rows = export.iter_results(options['campaign_ids'], options['chunk_size'])
+        else:
+            fields = export.RECORD_FIELDS
+            rows = export.iter_records(
+                options['campaign_ids'],
+                self.parse_time(options['start']),
+                self.parse_time(options['end']),
+                options['chunk_size'],
+            )
+
+        output = self.stdout
+        if options['output']:
+            output = OutputWrapper(open(options['output'], 'w', newline='', encoding='utf-8'))
+        try:
+            for line in export.render_lines(fields, rows, options['output_format']):
+                output.write(line, ending='')
+        finally:
+            if options['output']:
+                output._out.close()
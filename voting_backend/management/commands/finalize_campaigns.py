@@ -0,0 +1,19 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from voting_backend import snapshots
+
+
+class Command(BaseCommand):
+    help = 'Freeze final results of closed campaigns into snapshots served by the campaign endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--campaign', type=int, nargs='*', dest='campaign_ids', help='Campaign ID(s) to process')
+        parser.add_argument('--refreeze', action='store_true', help='Replace existing snapshots as well')
+
+    def handle(self, *args, **options):
+        if not snapshots.is_enabled():
+            raise CommandError('Campaign snapshots are disabled, set CAMPAIGN_SNAPSHOTS_ENABLED')
+        campaign_ids = snapshots.finalize_campaigns(options['campaign_ids'], options['refreeze'])
+        for campaign_id in campaign_ids:
+            self.stdout.write(f'campaign {campaign_id}: frozen')
+        self.stdout.write(self.style.SUCCESS(f'{len(campaign_ids)} campaign(s) finalized'))
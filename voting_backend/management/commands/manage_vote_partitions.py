@@ -0,0 +1,37 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+
+from voting_backend import partitions
+
+
+class Command(BaseCommand):
+    help = 'Create vote record partitions of new campaigns and archive those of long closed campaigns'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--archive-after', type=int, dest='archive_after_days',
+            default=settings.VOTE_PARTITIONS['ARCHIVE_AFTER_DAYS'],
+            help='Archive partitions of campaigns closed for this many days, 0 to keep them'
+        )
+        parser.add_argument('--convert', action='store_true', help='Partition the vote record table first')
+        parser.add_argument('--revert', action='store_true', help='Turn the vote record table back into a plain table')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Vote record partitioning requires PostgreSQL')
+        if options['revert']:
+            partitions.unpartition_records(connection)
+            self.stdout.write(self.style.SUCCESS('Vote records are no longer partitioned'))
+            return
+        if options['convert']:
+            partitions.partition_records(connection)
+        if not partitions.is_partitioned(connection):
+            raise CommandError('Vote records are not partitioned, set VOTE_PARTITIONING and migrate or pass --convert')
+
+        for campaign_id in partitions.ensure_partitions(connection):
+            self.stdout.write(f'campaign {campaign_id}: created {partitions.get_partition_name(campaign_id)}')
+        if options['archive_after_days']:
+            for campaign_id in partitions.archive_partitions(connection, options['archive_after_days']):
+                self.stdout.write(f'campaign {campaign_id}: archived {partitions.get_partition_name(campaign_id)}')
+        self.stdout.write(self.style.SUCCESS('Vote record partitions are up to date'))
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from voting_backend import counters
+
+
+class Command(BaseCommand):
+    help = 'Rebuild per-option vote counters from VoteRecord, or only report drift with --check'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--campaign', type=int, nargs='*', dest='campaign_ids', help='Campaign ID(s) to process')
+        parser.add_argument('--check', action='store_true', help='Report drift without fixing it')
+
+    def handle(self, *args, **options):
+        campaign_ids = options['campaign_ids']
+        if options['check']:
+            drift = counters.find_drift(campaign_ids)
+        else:
+            drift = counters.rebuild(campaign_ids)
+
+        for campaign_id, option_id, stored, actual in drift:
+            self.stdout.write(f'campaign {campaign_id} option {option_id}: stored {stored}, actual {actual}')
+
+        if options['check'] and drift:
+            raise CommandError(f'{len(drift)} counter(s) drifted')
+        if options['check']:
+            self.stdout.write(self.style.SUCCESS('No drift found'))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'{len(drift)} counter(s) rebuilt'))
@@ -0,0 +1,31 @@
+from django.core.management.base import BaseCommand
+
+from voting_backend import duplicates
+from voting_backend.models import VoteCampaign
+
+
+class Command(BaseCommand):
+    help = 'Make every process rebuild its duplicate vote filters, and report their size for active campaigns'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--campaign', type=int, nargs='*', dest='campaign_ids', help='Campaign ID(s) to report')
+
+    def handle(self, *args, **options):
+        duplicates.request_rebuild()
+        campaigns = VoteCampaign.objects.filter(status='ACTIVE')
+        if options['campaign_ids']:
+            campaigns = VoteCampaign.objects.filter(campaign_id__in=options['campaign_ids'])
+
+        total = 0
+        campaign_ids = list(campaigns.order_by('campaign_id').values_list('campaign_id', flat=True))
+        for campaign_id in campaign_ids:
+            # Built the way a web process builds it, in this process only
+            bloom = duplicates.vote_filter.load(campaign_id)
+            total += bloom.nbytes
+            self.stdout.write(
+                f'campaign {campaign_id}: {bloom.count} voter(s), capacity {bloom.capacity}, '
+                f'{bloom.hashes} hash(es), {bloom.nbytes} bytes'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Filters rebuilt, {len(campaign_ids)} campaign(s) take {total} bytes in each process voting on them'
+        ))
@@ -0,0 +1,35 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from voting_backend import hashers
+from voting_backend.models import VoteCampaign, get_voter_id_algorithm
+
+
+class Command(BaseCommand):
+    help = (
+        'Rehash voter IDs stored as plain SHA-256 with the configured voter ID hasher, campaign by campaign, '
+        'resuming campaigns left halfway by a previous run'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--campaign', type=int, nargs='*', dest='campaign_ids', help='Campaign ID(s) to process')
+        parser.add_argument('--batch-size', type=int, default=1000, help='Records rehashed per transaction')
+
+    def handle(self, *args, **options):
+        algorithm = get_voter_id_algorithm()
+        if algorithm == hashers.REHASHABLE_ALGORITHM:
+            raise CommandError('Voter IDs are hashed with plain SHA-256, set VOTER_ID_ALGORITHM and VOTER_ID_KEY')
+        # Fail early on an unknown algorithm or a missing key
+        hashers.get_hasher(algorithm)
+
+        pending = VoteCampaign.objects.filter(voter_id_algorithm=hashers.REHASHABLE_ALGORITHM)
+        if options['campaign_ids']:
+            pending = pending.filter(campaign_id__in=options['campaign_ids'])
+        rehashable = set(hashers.get_rehashable_campaigns().values_list('campaign_id', flat=True))
+        for campaign_id in pending.order_by('campaign_id').values_list('campaign_id', flat=True):
+            if campaign_id not in rehashable:
+                self.stdout.write(f'campaign {campaign_id}: open for votes, run again once it closed')
+                continue
+            rehashed = hashers.rehash_campaign(campaign_id, algorithm, options['batch_size'])
+            if rehashed is not None:
+                self.stdout.write(f'campaign {campaign_id}: rehashed {rehashed} voter ID(s) with {algorithm}')
+        self.stdout.write(self.style.SUCCESS('Voter IDs rehashed'))
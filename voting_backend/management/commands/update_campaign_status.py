@@ -0,0 +1,43 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+from django.utils import timezone
+
+from voting_backend import snapshots, transitions
+
+
+class Command(BaseCommand):
+    help = 'Store status of campaigns which started or ended, and freeze results of final ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--campaign', type=int, nargs='*', dest='campaign_ids', help='Campaign ID(s) to process')
+        parser.add_argument('--watch', action='store_true', help='Keep running, waking up at every transition')
+        parser.add_argument(
+            '--interval', type=float, default=60,
+            help='Seconds between checks at most with --watch, bounding the delay of snapshots and edited campaigns'
+        )
+
+    def handle(self, *args, **options):
+        while True:
+            self.update(options['campaign_ids'])
+            if not options['watch']:
+                return
+            time.sleep(self.get_sleep_time(options['interval']))
+            close_old_connections()
+
+    def update(self, campaign_ids):
+        applied = transitions.apply_due(campaign_ids)
+        for campaign, old_status in applied:
+            self.stdout.write(f'campaign {campaign.campaign_id}: {old_status} -> {campaign.status}')
+        if snapshots.is_enabled():
+            for campaign_id in snapshots.finalize_campaigns(campaign_ids):
+                self.stdout.write(f'campaign {campaign_id}: frozen')
+        self.stdout.write(self.style.SUCCESS(f'{len(applied)} transition(s) applied'))
+
+    @staticmethod
+    def get_sleep_time(interval):
+        transition_time = transitions.get_next_transition_time()
+        if transition_time is None:
+            return interval
+        return max(0, min(interval, (transition_time - timezone.now()).total_seconds()))
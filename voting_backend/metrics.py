@@ -0,0 +1,419 @@
+import glob
+import ipaddress
+import json
+import math
+import os
+import tempfile
+import threading
+import time
+from bisect import bisect_left
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured, PermissionDenied
+from django.db import connections
+from django.http import Http404, HttpResponse
+from rest_framework.views import exception_handler as default_exception_handler
+
+from .campaign_cache import campaign_cache
+from .duplicates import vote_filter
+
+DURATION_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_BUCKETS = (0, 1, 2, 3, 5, 10, 20, 50, 100)
+
+# name -> (type, help, buckets)
+METRICS = {
+    'voting_http_requests_total': ('counter', 'Requests handled, by view, method and response status', None),
+    'voting_http_request_duration_seconds': ('histogram', 'Time spent handling requests', DURATION_BUCKETS),
+    'voting_db_queries_per_request': ('histogram', 'SQL queries executed per request', QUERY_BUCKETS),
+    'voting_db_duration_seconds_total': ('counter', 'Time spent executing SQL queries', None),
+    'voting_serializer_duration_seconds_total': ('counter', 'Time spent serializing response data', None),
+    'voting_exceptions_total': ('counter', 'Exceptions raised by views, by exception class', None),
+    'voting_campaign_cache_hits_total': ('counter', 'Campaign cache hits of the vote path', None),
+    'voting_campaign_cache_misses_total': ('counter', 'Campaign cache misses of the vote path', None),
+    'voting_campaign_cache_evictions_total': ('counter', 'Campaign cache entries evicted for size', None),
+    'voting_campaign_cache_size': ('gauge', 'Campaign cache entries, summed over processes', None),
+    'voting_db_replica_fallbacks_total': ('counter', 'Replica reads sent to the primary as no replica was in sync', None),
+    'voting_vote_filter_rejections_total': ('counter', 'Repeat votes rejected by the duplicate vote filter', None),
+    'voting_vote_filter_false_positives_total': ('counter', 'Duplicate vote filter matches not confirmed', None),
+    'voting_vote_filter_bytes': ('gauge', 'Memory of duplicate vote filters, summed over processes', None),
+    'voting_ingestion_repeats_total': ('counter', 'Queued votes dropped as another process recorded the voter', None),
+}
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+# Counters of stopped processes, merged into one file so a reused PID never overwrites them
+ARCHIVE_NAME = 'metrics-archived.json'
+# Other methods share one label value, so requests cannot create series at will
+METHODS = ('GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS')
+
+
+def is_enabled():
+    return settings.METRICS['ENABLED']
+
+
+def is_process_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except (ProcessLookupError, OverflowError):
+        return False
+    except PermissionError:
+        # Process exists but owned by another user
+        return True
+    return True
+
+
+def drop_gauges(snapshot):
+    """
+    Return snapshot without gauges, which only hold for a running process
+    """
+    return {
+        'counters': [counter for counter in snapshot['counters'] if METRICS[counter[0]][0] != 'gauge'],
+        'histograms': snapshot['histograms'],
+    }
+
+
+class Registry:
+    """
+    Counters and histograms of the current process.
+    With a directory configured, snapshots are written to a file per process at most every
+    FLUSH_INTERVAL seconds, so metrics of every worker can be collected from any of them.
+    Files of stopped processes are folded into ARCHIVE_NAME without their gauges.
+    """
+    def __init__(self, directory='', flush_interval=1):
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.lock = threading.Lock()
+        # (name, labels) -> value
+        self.counters = {}
+        # (name, labels) -> [count per bucket with +Inf last, sum]
+        self.histograms = {}
+        self.flushed_at = 0
+        # Process which flushed last, a file found before its first flush is from a stopped process with its PID
+        self.flushed_pid = None
+
+    def inc(self, name, labels=(), amount=1):
+        key = (name, labels)
+        with self.lock:
+            self.counters[key] = self.counters.get(key, 0) + amount
+
+    def observe(self, name, value, labels=()):
+        buckets = METRICS[name][2]
+        key = (name, labels)
+        with self.lock:
+            histogram = self.histograms.get(key)
+            if histogram is None:
+                histogram = self.histograms[key] = [[0] * (len(buckets) + 1), 0]
+            histogram[0][bisect_left(buckets, value)] += 1
+            histogram[1] += value
+
+    def snapshot(self):
+        stats = campaign_cache.stats()
+        filter_stats = vote_filter.stats()
+        with self.lock:
+            counters = [[name, list(labels), value] for (name, labels), value in self.counters.items()]
+            histograms = [
+                [name, list(labels), list(counts), total]
+                for (name, labels), (counts, total) in self.histograms.items()
+            ]
+        counters.extend([
+            ['voting_campaign_cache_hits_total', [], stats['hits']],
+            ['voting_campaign_cache_misses_total', [], stats['misses']],
+            ['voting_campaign_cache_evictions_total', [], stats['evictions']],
+            ['voting_campaign_cache_size', [], stats['size']],
+            ['voting_vote_filter_rejections_total', [], filter_stats['rejections']],
+            ['voting_vote_filter_false_positives_total', [], filter_stats['false_positives']],
+            ['voting_vote_filter_bytes', [], filter_stats['bytes']],
+        ])
+        return {'counters': counters, 'histograms': histograms}
+
+    def get_path(self, pid=None):
+        return os.path.join(self.directory, f'metrics-{pid or os.getpid()}.json')
+
+    def maybe_flush(self):
+        if not self.directory:
+            return
+        now = time.monotonic()
+        if now - self.flushed_at < self.flush_interval:
+            return
+        self.flushed_at = now
+        self.flush()
+
+    def flush(self):
+        """
+        Atomically replace snapshot file of current process
+        """
+        os.makedirs(self.directory, exist_ok=True)
+        if self.flushed_pid != os.getpid():
+            self.archive([self.get_path()])
+            self.flushed_pid = os.getpid()
+        self.write(self.get_path(), self.snapshot())
+
+    def write(self, path, snapshot):
+        fd, temp_path = tempfile.mkstemp(dir=self.directory, prefix='.metrics-')
+        with os.fdopen(fd, 'w') as file:
+            json.dump(snapshot, file)
+        os.replace(temp_path, path)
+
+    @staticmethod
+    def read(path):
+        try:
+            with open(path) as file:
+                return json.load(file)
+        except (OSError, ValueError):
+            # Removed or being replaced
+            return None
+
+    @contextmanager
+    def lock_directory(self):
+        try:
+            import fcntl
+        except ImportError:
+            raise ImproperlyConfigured('METRICS_DIR requires POSIX file locks')
+        with open(os.path.join(self.directory, '.metrics.lock'), 'w') as lock_file:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+            yield
+
+    def archive(self, paths):
+        """
+        Add counters and histograms of snapshot files of stopped processes to the archive and remove the files
+        """
+        archive_path = os.path.join(self.directory, ARCHIVE_NAME)
+        with self.lock_directory():
+            snapshots = [self.read(path) for path in paths if os.path.exists(path)]
+            snapshots = [drop_gauges(snapshot) for snapshot in snapshots if snapshot is not None]
+            if not snapshots:
+                return
+            archived = self.read(archive_path)
+            if archived is not None:
+                snapshots.append(archived)
+            counters, histograms = merge(snapshots)
+            self.write(archive_path, {
+                'counters': [[name, list(labels), value] for (name, labels), value in counters.items()],
+                'histograms': [
+                    [name, list(labels), counts, total]
+                    for (name, labels), (counts, total) in histograms.items()
+                ],
+            })
+            for path in paths:
+                if os.path.exists(path):
+                    os.remove(path)
+
+    def collect(self):
+        """
+        Return snapshots of every process, current process taken from memory.
+        Files of stopped processes are archived first, so their counters are kept and their gauges dropped.
+        """
+        snapshots = [self.snapshot()]
+        if not self.directory:
+            return snapshots
+        own_path = self.get_path()
+        stopped_paths = [
+            path for path in glob.glob(os.path.join(self.directory, 'metrics-*.json'))
+            if path != own_path and not path.endswith(ARCHIVE_NAME) and not is_process_alive(get_pid(path))
+        ]
+        if stopped_paths:
+            self.archive(stopped_paths)
+        for path in glob.glob(os.path.join(self.directory, 'metrics-*.json')):
+            if path == own_path:
+                continue
+            snapshot = self.read(path)
+            if snapshot is not None:
+                snapshots.append(snapshot)
+        return snapshots
+
+
+def get_pid(path):
+    return int(os.path.basename(path)[len('metrics-'):-len('.json')])
+
+
+def merge(snapshots):
+    """
+    Sum counters and histograms over snapshots, keyed by (name, labels)
+    """
+    counters = {}
+    histograms = {}
+    for snapshot in snapshots:
+        for name, labels, value in snapshot['counters']:
+            key = (name, tuple(map(tuple, labels)))
+            counters[key] = counters.get(key, 0) + value
+        for name, labels, counts, total in snapshot['histograms']:
+            key = (name, tuple(map(tuple, labels)))
+            merged = histograms.setdefault(key, [[0] * len(counts), 0])
+            merged[0] = [a + b for a, b in zip(merged[0], counts)]
+            merged[1] += total
+    return counters, histograms
+
+
+def format_value(value):
+    if value == math.inf:
+        return '+Inf'
+    if isinstance(value, float) and value.is_integer():
+        return str(int(value))
+    return repr(value)
+
+
+def format_labels(labels):
+    if not labels:
+        return ''
+    escaped = (
+        (name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in labels
+    )
+    return '{' + ','.join(f'{name}="{value}"' for name, value in escaped) + '}'
+
+
+def render(snapshots):
+    """
+    Render metrics in Prometheus text exposition format
+    """
+    counters, histograms = merge(snapshots)
+    lines = []
+    for name, (metric_type, description, buckets) in METRICS.items():
+        lines.append(f'# HELP {name} {description}')
+        lines.append(f'# TYPE {name} {metric_type}')
+        if metric_type == 'histogram':
+            for (metric_name, labels), (counts, total) in sorted(histograms.items()):
+                if metric_name != name:
+                    continue
+                cumulative = 0
+                for bound, count in zip(buckets + (math.inf,), counts):
+                    cumulative += count
+                    bucket_labels = labels + (('le', format_value(float(bound))),)
+                    lines.append(f'{name}_bucket{format_labels(bucket_labels)} {cumulative}')
+                lines.append(f'{name}_sum{format_labels(labels)} {format_value(total)}')
+                lines.append(f'{name}_count{format_labels(labels)} {cumulative}')
+        else:
+            for (metric_name, labels), value in sorted(counters.items()):
+                if metric_name == name:
+                    lines.append(f'{name}{format_labels(labels)} {format_value(value)}')
+    return '\n'.join(lines) + '\n'
+
+
+registry = Registry(
+    directory=settings.METRICS['DIR'],
+    flush_interval=settings.METRICS['FLUSH_INTERVAL'],
+)
+
+
+class RequestState:
+    """
+    Measurements of the request handled by current thread
+    """
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0
+        self.serializer_time = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        # Installed as execute wrapper of every database connection
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db_time += time.perf_counter() - start
+            self.queries += 1
+
+
+_local = threading.local()
+
+
+def get_state():
+    return getattr(_local, 'state', None)
+
+
+@contextmanager
+def measure_serializer():
+    """
+    Add time spent within the block to serializer time of current request
+    """
+    state = get_state()
+    if state is None:
+        yield
+        return
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        state.serializer_time += time.perf_counter() - start
+
+
+def get_view_name(request):
+    # URL name keeps label values few, unmatched paths share one label
+    match = getattr(request, 'resolver_match', None)
+    if match is None or not match.url_name:
+        return 'unmatched'
+    return match.url_name
+
+
+def exception_handler(exc, context):
+    """
+    REST framework exception handler counting exceptions raised by views
+    """
+    response = default_exception_handler(exc, context)
+    # Exceptions left unhandled are counted by MetricsMiddleware
+    if response is not None and is_enabled():
+        view_name = get_view_name(context['request'])
+        registry.inc('voting_exceptions_total', (('view', view_name), ('exception', type(exc).__name__)))
+    return response
+
+
+class MetricsMiddleware:
+    """
+    Record latency, SQL queries, DB time and serializer time of every request
+    """
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not is_enabled():
+            return self.get_response(request)
+
+        state = _local.state = RequestState()
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(state))
+                response = self.get_response(request)
+        finally:
+            _local.state = None
+        duration = time.perf_counter() - start
+
+        view_name = get_view_name(request)
+        if view_name == 'metrics':
+            return response
+        view = (('view', view_name),)
+        method = request.method if request.method in METHODS else 'other'
+        registry.inc('voting_http_requests_total', view + (('method', method), ('status', str(response.status_code))))
+        registry.observe('voting_http_request_duration_seconds', duration, view + (('method', method),))
+        registry.observe('voting_db_queries_per_request', state.queries, view)
+        registry.inc('voting_db_duration_seconds_total', view, state.db_time)
+        registry.inc('voting_serializer_duration_seconds_total', view, state.serializer_time)
+        registry.maybe_flush()
+        return response
+
+    def process_exception(self, request, exception):
+        # Exceptions not handled by REST framework, turned into 500 by Django
+        if is_enabled():
+            registry.inc('voting_exceptions_total', (('view', get_view_name(request)), ('exception', type(exception).__name__)))
+
+
+def is_allowed(request):
+    """
+    Check if client is in METRICS['ALLOWED_NETWORKS'] or a signed in admin
+    """
+    if getattr(request, 'user', None) is not None and request.user.is_staff:
+        return True
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return False
+    return any(address in ipaddress.ip_network(network, strict=False) for network in settings.METRICS['ALLOWED_NETWORKS'])
+
+
+def metrics_view(request):
+    if not is_enabled():
+        raise Http404()
+    if not is_allowed(request):
+        raise PermissionDenied()
+    return HttpResponse(render(registry.collect()), content_type=CONTENT_TYPE)
@@ -0,0 +1,36 @@
+# Generated by Django 2.1.1 on 2026-10-18 11:54
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def populate_counters(apps, schema_editor):
+    VoteRecord = apps.get_model('voting_backend', 'VoteRecord')
+    VoteCounter = apps.get_model('voting_backend', 'VoteCounter')
+    totals = VoteRecord.objects.values_list('campaign_id', 'option_id').annotate(
+        total=models.Count('id')
+    ).order_by()
+    VoteCounter.objects.bulk_create([
+        VoteCounter(campaign_id=campaign_id, option_id=option_id, count=total)
+        for campaign_id, option_id, total in totals
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting_backend', '0007_auto_20200201_0058'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoteCounter',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('count', models.PositiveIntegerField(default=0)),
+                ('campaign', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counter_set', to='voting_backend.VoteCampaign')),
+                ('option', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='counter', to='voting_backend.VoteOption')),
+            ],
+        ),
+        migrations.RunPython(populate_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 2.1.1 on 2026-10-18 11:55
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting_backend', '0008_votecounter'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='votecampaign',
+            name='counter_shards',
+            field=models.PositiveSmallIntegerField(default=4),
+        ),
+        migrations.AddField(
+            model_name='votecounter',
+            name='shard',
+            field=models.PositiveSmallIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='votecounter',
+            name='option',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='counter_set', to='voting_backend.VoteOption'),
+        ),
+        migrations.AlterUniqueTogether(
+            name='votecounter',
+            unique_together={('option', 'shard')},
+        ),
+    ]
@@ -0,0 +1,84 @@
+# Generated by Django 2.1.1 on 2026-10-18 12:05
+
+from django.db import migrations, models
+import django.db.models.deletion
+import voting_backend.fields
+
+
+def convert_user_id(apps, schema_editor, forward=True):
+    """
+    Convert user_id between hex text and raw bytes of the digest in place
+    """
+    table = schema_editor.quote_name('voting_backend_voterecord')
+    if schema_editor.connection.vendor == 'postgresql':
+        if forward:
+            using = "decode(user_id, 'hex')"
+            column_type = 'bytea'
+        else:
+            using = "encode(user_id, 'hex')"
+            column_type = 'text'
+        schema_editor.execute(
+            f'ALTER TABLE {table} ALTER COLUMN user_id TYPE {column_type} USING {using}'
+        )
+        return
+
+    # Other backends keep the column type loosely, rewrite values in batches paged by ID,
+    # so only one batch of records is held in memory
+    last_id = 0
+    while True:
+        with schema_editor.connection.cursor() as cursor:
+            cursor.execute(f'SELECT id, user_id FROM {table} WHERE id > %s ORDER BY id LIMIT 1000', [last_id])
+            rows = cursor.fetchall()
+            if not rows:
+                return
+            cursor.executemany(
+                f'UPDATE {table} SET user_id = %s WHERE id = %s',
+                [
+                    (bytes.fromhex(user_id) if forward else bytes(user_id).hex(), record_id)
+                    for record_id, user_id in rows
+                ]
+            )
+        last_id = rows[-1][0]
+
+
+def convert_user_id_backward(apps, schema_editor):
+    convert_user_id(apps, schema_editor, forward=False)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting_backend', '0009_counter_shards'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='votecampaign',
+            index=models.Index(fields=['-end_time', '-campaign_id'], name='campaign_end_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='votecampaign',
+            index=models.Index(fields=['start_time'], name='campaign_start_time_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='voterecord',
+            index=models.Index(fields=['campaign', 'option'], name='record_campaign_option_idx'),
+        ),
+        migrations.AlterField(
+            model_name='voterecord',
+            name='campaign',
+            field=models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='record_set', to='voting_backend.VoteCampaign'),
+        ),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(convert_user_id, convert_user_id_backward),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='voterecord',
+                    name='user_id',
+                    field=voting_backend.fields.HexDigestField(),
+                ),
+            ],
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 2.1.1 on 2026-10-18 14:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def partition_records(apps, schema_editor):
+    """
+    Partition vote records by campaign on PostgreSQL when VOTE_PARTITIONING is enabled
+    """
+    from voting_backend import partitions
+
+    if schema_editor.connection.vendor == 'postgresql' and settings.VOTE_PARTITIONS['ENABLED']:
+        partitions.partition_records(schema_editor.connection)
+
+
+def unpartition_records(apps, schema_editor):
+    from voting_backend import partitions
+
+    partitions.unpartition_records(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting_backend', '0010_indexes_and_compact_user_id'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='votecampaign',
+            name='records_archived',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.RunPython(partition_records, unpartition_records),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 2.1.1 on 2026-10-18 15:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting_backend', '0011_partition_vote_records'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='VoteCampaignSnapshot',
+            fields=[
+                ('campaign', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='snapshot', serialize=False, to='voting_backend.VoteCampaign')),
+                ('number_of_vote', models.PositiveIntegerField()),
+                ('body', models.TextField()),
+                ('create_time', models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
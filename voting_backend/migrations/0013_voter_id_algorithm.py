@@ -0,0 +1,25 @@
+# Generated by Django 2.1.1 on 2026-10-18 15:40
+
+from django.db import migrations, models
+import voting_backend.models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting_backend', '0012_campaign_snapshot'),
+    ]
+
+    operations = [
+        # Existing voter IDs are plain SHA-256, whatever algorithm new campaigns use
+        migrations.AddField(
+            model_name='votecampaign',
+            name='voter_id_algorithm',
+            field=models.CharField(default='sha256', editable=False, max_length=32),
+        ),
+        migrations.AlterField(
+            model_name='votecampaign',
+            name='voter_id_algorithm',
+            field=models.CharField(default=voting_backend.models.get_voter_id_algorithm, editable=False, max_length=32),
+        ),
+    ]
@@ -0,0 +1,31 @@
+# Generated by Django 2.1.1 on 2026-10-18 16:20
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def populate_status(apps, schema_editor):
+    VoteCampaign = apps.get_model('voting_backend', 'VoteCampaign')
+    current_time = timezone.now()
+    VoteCampaign.objects.filter(start_time__lte=current_time, end_time__gt=current_time).update(status='ACTIVE')
+    VoteCampaign.objects.filter(end_time__lte=current_time).update(status='CLOSED')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting_backend', '0013_voter_id_algorithm'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='votecampaign',
+            name='status',
+            field=models.CharField(choices=[('NOT_START', 'NOT_START'), ('ACTIVE', 'ACTIVE'), ('CLOSED', 'CLOSED')], default='NOT_START', editable=False, max_length=9),
+        ),
+        migrations.RunPython(populate_status, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='votecampaign',
+            index=models.Index(fields=['status', '-end_time', '-campaign_id'], name='campaign_status_idx'),
+        ),
+    ]
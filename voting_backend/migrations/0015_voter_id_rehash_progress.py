@@ -0,0 +1,23 @@
+# Generated by Django 2.1.1 on 2026-10-18 13:56
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('voting_backend', '0014_campaign_status'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='votecampaign',
+            name='voter_id_rehash_algorithm',
+            field=models.CharField(blank=True, editable=False, max_length=32),
+        ),
+        migrations.AddField(
+            model_name='votecampaign',
+            name='voter_id_rehashed_to',
+            field=models.IntegerField(editable=False, null=True),
+        ),
+    ]
@@ -1,7 +1,24 @@
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from django.db import models
 from django.utils import timezone
 
+from .fields import HexDigestField
+
+STATUS_CHOICES = (
+    ('NOT_START', 'NOT_START'),
+    ('ACTIVE', 'ACTIVE'),
+    ('CLOSED', 'CLOSED'),
+)
+
+
+def get_voter_id_algorithm():
+    """
+    Return algorithm hashing voter IDs of new campaigns
+    """
+    return settings.VOTER_ID_HASHING['ALGORITHM']
+
+
 
 class VoteCampaign(models.Model):
     """
@@ -11,24 +28,62 @@ class VoteCampaign(models.Model):
     question = models.TextField()
     start_time = models.DateTimeField()
     end_time = models.DateTimeField()
+    # Number of counter rows per option, spreading concurrent votes over several row locks
+    counter_shards = models.PositiveSmallIntegerField(default=4)
+    # Vote records detached into the archive schema by manage_vote_partitions, results stay in counters
+    records_archived = models.BooleanField(default=False, editable=False)
+    # Hasher of voter IDs of the campaign, changed by rehash_voter_ids only
+    voter_id_algorithm = models.CharField(max_length=32, default=get_voter_id_algorithm, editable=False)
+    # Algorithm and last vote record of a rehash by rehash_voter_ids in progress, resumed from there
+    voter_id_rehash_algorithm = models.CharField(max_length=32, blank=True, editable=False)
+    voter_id_rehashed_to = models.IntegerField(null=True, editable=False)
+    # Stored on save, or set by get_status() before bulk_create, and changed at start and end time
+    # by update_campaign_status
+    status = models.CharField(max_length=9, choices=STATUS_CHOICES, default='NOT_START', editable=False)
 
     def __str__(self):
         return f'{self.campaign_id}: {self.question}'
-    
-    @property
-    def status(self):
-        current_time = timezone.make_aware(timezone.now(), timezone.utc)
-        if current_time < timezone.make_aware(self.start_time, timezone.utc):
+
+    def get_status(self, current_time=None):
+        """
+        Return status of the campaign by its start and end time, which the stored status follows
+        """
+        if current_time is None:
+            current_time = timezone.now()
+        if current_time < self.start_time:
             return 'NOT_START'
-        if current_time >= timezone.make_aware(self.end_time, timezone.utc):
+        if current_time >= self.end_time:
             return 'CLOSED'
         return 'ACTIVE'
 
+    def get_next_transition_time(self, current_time=None):
+        """
+        Return time the status of the campaign changes next, or None once closed
+        """
+        if current_time is None:
+            current_time = timezone.now()
+        if current_time < self.start_time:
+            return self.start_time
+        if current_time < self.end_time:
+            return self.end_time
+        return None
+
     def save(self, *args, **kwargs):
         if self.end_time <= self.start_time:
             raise ValidationError(message='End time must be later than start time.')
+        self.status = self.get_status()
         super().save(*args, **kwargs)
 
+    class Meta:
+        indexes = [
+            # Campaign list ordering and keyset pagination
+            models.Index(fields=['-end_time', '-campaign_id'], name='campaign_end_time_idx'),
+            # Next start among campaigns not yet started
+            models.Index(fields=['start_time'], name='campaign_start_time_idx'),
+            # Campaign list filtered by status, in list order
+            models.Index(fields=['status', '-end_time', '-campaign_id'], name='campaign_status_idx'),
+        ]
+
 
 class VoteOption(models.Model):
     """
@@ -49,11 +104,47 @@ class VoteRecord(models.Model):
     """
     Model storing all previous voting records
     """
-    campaign = models.ForeignKey(VoteCampaign, on_delete=models.CASCADE, related_name='record_set')
+    # Lookup by campaign is covered by record_campaign_option_idx
+    campaign = models.ForeignKey(VoteCampaign, on_delete=models.CASCADE, related_name='record_set', db_index=False)
     option = models.ForeignKey(VoteOption, on_delete=models.CASCADE, related_name='record_set')
-    user_id = models.TextField()
+    # Digest of HKID by the voter ID hasher of the campaign
+    user_id = HexDigestField()
     create_time = models.DateTimeField(auto_now=True)
 
     class Meta:
         # Prevent muiltiple votes from same user in one campaign
         unique_together = ('user_id', 'campaign')
+        indexes = [
+            # Per-option counts within a campaign, as index only scan
+            models.Index(fields=['campaign', 'option'], name='record_campaign_option_idx'),
+        ]
+
+
+class VoteCounter(models.Model):
+    """
+    Model storing one shard of the running vote tally per option, maintained together with VoteRecord
+    """
+    campaign = models.ForeignKey(VoteCampaign, on_delete=models.CASCADE, related_name='counter_set')
+    option = models.ForeignKey(VoteOption, on_delete=models.CASCADE, related_name='counter_set')
+    shard = models.PositiveSmallIntegerField(default=0)
+    count = models.PositiveIntegerField(default=0)
+
+    def __str__(self):
+        return f'{self.option_id}[{self.shard}]: {self.count}'
+
+    class Meta:
+        unique_together = ('option', 'shard')
+
+
+class VoteCampaignSnapshot(models.Model):
+    """
+    Model storing final results of a closed campaign, served instead of summing its counters
+    """
+    campaign = models.OneToOneField(VoteCampaign, on_delete=models.CASCADE, primary_key=True, related_name='snapshot')
+    number_of_vote = models.PositiveIntegerField()
+    # Campaign detail rendered as JSON
+    body = models.TextField()
+    create_time = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f'{self.campaign_id}: {self.number_of_vote}'
@@ -0,0 +1,83 @@
+import base64
+from collections import OrderedDict
+
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+from .exceptions import InvalidFormException
+
+
+class CampaignKeysetPagination(BasePagination):
+    """
+    Keyset pagination on (-end_time, -campaign_id), only applied when limit or cursor is requested.
+    The cursor is the position of the last campaign returned, so a page costs the same however deep it is.
+    """
+    limit_query_param = 'limit'
+    cursor_query_param = 'cursor'
+    default_limit = 50
+    max_limit = 200
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.limit_query_param not in params and self.cursor_query_param not in params:
+            return None
+
+        self.request = request
+        self.limit = self.get_limit(params.get(self.limit_query_param))
+        cursor = params.get(self.cursor_query_param)
+        queryset = queryset.order_by('-end_time', '-campaign_id')
+        if cursor:
+            end_time, campaign_id = self.decode_cursor(cursor)
+            queryset = queryset.filter(
+                Q(end_time__lt=end_time) | Q(end_time=end_time, campaign_id__lt=campaign_id)
+            )
+        # Fetch one extra campaign to know if there is a next page
+        page = list(queryset[:self.limit + 1])
+        self.has_next = len(page) > self.limit
+        page = page[:self.limit]
+        self.last = page[-1] if page else None
+        return page
+
+    def get_limit(self, value):
+        if value is None:
+            return self.default_limit
+        try:
+            limit = int(value)
+        except ValueError:
+            raise InvalidFormException()
+        if limit <= 0:
+            raise InvalidFormException()
+        return min(limit, self.max_limit)
+
+    @staticmethod
+    def encode_cursor(campaign):
+        position = f'{campaign.end_time.isoformat()}|{campaign.campaign_id}'
+        return base64.urlsafe_b64encode(position.encode('utf-8')).decode('ascii')
+
+    @staticmethod
+    def decode_cursor(cursor):
+        try:
+            end_time, campaign_id = base64.urlsafe_b64decode(cursor.encode('ascii')).decode('utf-8').split('|')
+            end_time = parse_datetime(end_time)
+            campaign_id = int(campaign_id)
+        except (TypeError, ValueError, UnicodeError):
+            raise InvalidFormException()
+        if end_time is None:
+            raise InvalidFormException()
+        return end_time, campaign_id
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        url = self.request.build_absolute_uri()
+        url = replace_query_param(url, self.limit_query_param, self.limit)
+        return replace_query_param(url, self.cursor_query_param, self.encode_cursor(self.last))
+
+    def get_paginated_response(self, data):
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('results', data),
+        ]))
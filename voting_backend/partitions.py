@@ -0,0 +1,175 @@
+import datetime
+import logging
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import VoteCampaign, VoteRecord
+
+logger = logging.getLogger(__name__)
+
+RECORD_TABLE = VoteRecord._meta.db_table
+CAMPAIGN_TABLE = VoteCampaign._meta.db_table
+DEFAULT_PARTITION = f'{RECORD_TABLE}_default'
+
+
+def get_partition_name(campaign_id):
+    return f'{RECORD_TABLE}_c{campaign_id}'
+
+
+def is_partitioned(connection):
+    if connection.vendor != 'postgresql':
+        return False
+    with connection.cursor() as cursor:
+        cursor.execute('SELECT relkind FROM pg_class WHERE oid = to_regclass(%s)', [RECORD_TABLE])
+        row = cursor.fetchone()
+    return row is not None and row[0] == 'p'
+
+
+def get_partitions(connection):
+    """
+    Return names of partitions attached to the vote record table
+    """
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid '
+            'WHERE i.inhparent = to_regclass(%s)',
+            [RECORD_TABLE]
+        )
+        return {row[0] for row in cursor.fetchall()}
+
+
+def get_definitions(cursor, table):
+    """
+    Return constraints as (name, type, definition) and definitions of other indexes of a table
+    """
+    cursor.execute(
+        "SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = to_regclass(%s) AND contype IN ('p', 'u', 'f', 'c') ORDER BY contype DESC, conname",
+        [table]
+    )
+    constraints = cursor.fetchall()
+    cursor.execute(
+        'SELECT pg_get_indexdef(indexrelid) FROM pg_index WHERE indrelid = to_regclass(%s) '
+        'AND NOT EXISTS (SELECT 1 FROM pg_constraint WHERE conindid = indexrelid) ORDER BY indexrelid',
+        [table]
+    )
+    indexes = [row[0].replace(' ON ONLY ', ' ON ') for row in cursor.fetchall()]
+    return constraints, indexes
+
+
+def rebuild_table(connection, partitioned):
+    """
+    Copy vote records into a new table, partitioned by campaign or not, which replaces the current one
+    under the same name with the same sequence, constraints and indexes.
+    Partitioned tables include the campaign in their primary key, as PostgreSQL requires.
+    """
+    old_table = f'{RECORD_TABLE}_old'
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        constraints, indexes = get_definitions(cursor, RECORD_TABLE)
+        cursor.execute('SELECT pg_get_serial_sequence(%s, %s)', [RECORD_TABLE, 'id'])
+        sequence = cursor.fetchone()[0]
+        cursor.execute(f'ALTER TABLE {RECORD_TABLE} RENAME TO {old_table}')
+        cursor.execute(
+            f'CREATE TABLE {RECORD_TABLE} (LIKE {old_table} INCLUDING DEFAULTS)'
+            + (' PARTITION BY LIST (campaign_id)' if partitioned else '')
+        )
+        if partitioned:
+            cursor.execute(f'CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {RECORD_TABLE} DEFAULT')
+            cursor.execute(f'SELECT campaign_id FROM {CAMPAIGN_TABLE} WHERE NOT records_archived')
+            for campaign_id, in cursor.fetchall():
+                cursor.execute(
+                    f'CREATE TABLE {get_partition_name(campaign_id)} PARTITION OF {RECORD_TABLE} FOR VALUES IN (%s)',
+                    [campaign_id]
+                )
+        cursor.execute(f'INSERT INTO {RECORD_TABLE} SELECT * FROM {old_table}')
+        cursor.execute(f'ALTER SEQUENCE {sequence} OWNED BY {RECORD_TABLE}.id')
+        # Drops attached partitions as well, archived ones are separate tables by now
+        cursor.execute(f'DROP TABLE {old_table}')
+        for name, constraint_type, definition in constraints:
+            if constraint_type == 'p':
+                definition = 'PRIMARY KEY (id, campaign_id)' if partitioned else 'PRIMARY KEY (id)'
+            cursor.execute(f'ALTER TABLE {RECORD_TABLE} ADD CONSTRAINT {name} {definition}')
+        for definition in indexes:
+            cursor.execute(definition)
+
+
+def partition_records(connection):
+    """
+    Turn the vote record table into one partitioned by campaign, with a partition per campaign
+    and a default partition for votes of campaigns created since the last ensure_partitions
+    """
+    if not is_partitioned(connection):
+        rebuild_table(connection, partitioned=True)
+
+
+def unpartition_records(connection):
+    """
+    Turn the vote record table back into a plain table, leaving archived partitions aside
+    """
+    if is_partitioned(connection):
+        rebuild_table(connection, partitioned=False)
+
+
+def create_partition(connection, campaign_id):
+    """
+    Attach a partition for votes of the campaign, moving its votes out of the default partition
+    """
+    partition = get_partition_name(campaign_id)
+    with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+        # Votes of the campaign inserted between the move and the attach would stay in the default partition
+        # and fail the attach, so they wait for the commit and then go to the new partition
+        cursor.execute(f'LOCK TABLE {DEFAULT_PARTITION} IN ACCESS EXCLUSIVE MODE')
+        cursor.execute(f'CREATE TABLE {partition} (LIKE {RECORD_TABLE} INCLUDING DEFAULTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE campaign_id = %s RETURNING *) '
+            f'INSERT INTO {partition} SELECT * FROM moved',
+            [campaign_id]
+        )
+        # Indexes and constraints of the table are created on the partition as it is attached
+        cursor.execute(f'ALTER TABLE {RECORD_TABLE} ATTACH PARTITION {partition} FOR VALUES IN (%s)', [campaign_id])
+    return partition
+
+
+def ensure_partitions(connection):
+    """
+    Create missing partitions of campaigns not archived. Return the campaign IDs partitioned.
+    """
+    partitions = get_partitions(connection)
+    created = []
+    campaign_ids = VoteCampaign.objects.using(connection.alias).filter(
+        records_archived=False
+    ).order_by('campaign_id').values_list('campaign_id', flat=True)
+    for campaign_id in campaign_ids:
+        if get_partition_name(campaign_id) not in partitions:
+            create_partition(connection, campaign_id)
+            created.append(campaign_id)
+    return created
+
+
+def archive_partitions(connection, closed_days, schema=None):
+    """
+    Detach partitions of campaigns closed for more than closed_days days into another schema,
+    so their votes no longer weigh on the indexes of the table. Stored results of the campaigns stay.
+    Return the campaign IDs archived.
+    """
+    schema = schema or settings.VOTE_PARTITIONS['ARCHIVE_SCHEMA']
+    partitions = get_partitions(connection)
+    closed_before = timezone.now() - datetime.timedelta(days=closed_days)
+    campaign_ids = VoteCampaign.objects.using(connection.alias).filter(
+        records_archived=False,
+        end_time__lt=closed_before
+    ).order_by('campaign_id').values_list('campaign_id', flat=True)
+    archived = []
+    for campaign_id in campaign_ids:
+        partition = get_partition_name(campaign_id)
+        if partition not in partitions:
+            continue
+        with transaction.atomic(using=connection.alias), connection.cursor() as cursor:
+            cursor.execute(f'CREATE SCHEMA IF NOT EXISTS {schema}')
+            cursor.execute(f'ALTER TABLE {RECORD_TABLE} DETACH PARTITION {partition}')
+            cursor.execute(f'ALTER TABLE {partition} SET SCHEMA {schema}')
+            VoteCampaign.objects.using(connection.alias).filter(campaign_id=campaign_id).update(records_archived=True)
+        archived.append(campaign_id)
+    return archived
@@ -0,0 +1,102 @@
+import json
+
+from django.db.models import Sum
+from django.db.models.functions import Coalesce
+from rest_framework.compat import LONG_SEPARATORS, SHORT_SEPARATORS
+from rest_framework.renderers import JSONRenderer
+
+from .models import VoteOption
+
+# Fields of campaign details and options in the order of the serializers they stand in for
+CAMPAIGN_FIELDS = ('campaign_id', 'question', 'start_time', 'end_time', 'status')
+OPTION_FIELDS = ('option_code', 'option_detail', 'number_of_vote')
+
+# Encodes like JSONRenderer without indent, through the C encoder of the json module
+encoder = json.JSONEncoder(
+    ensure_ascii=JSONRenderer.ensure_ascii,
+    allow_nan=not JSONRenderer.strict,
+    separators=SHORT_SEPARATORS if JSONRenderer.compact else LONG_SEPARATORS
+)
+
+
+def render(data):
+    """
+    Return the same bytes as JSONRenderer for data made of dicts, lists, strings, numbers and None
+    """
+    return encoder.encode(data).replace('\u2028', '\\u2028').replace('\u2029', '\\u2029').encode()
+
+
+class CompactJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer for data built by this module, falling back to JSONRenderer when indent is requested
+    """
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None or self.get_indent(accepted_media_type, renderer_context or {}) is not None:
+            return super().render(data, accepted_media_type, renderer_context)
+        return render(data)
+
+
+def format_datetime(value):
+    """
+    Return naive datetime as DateTimeField of REST framework does with USE_TZ off
+    """
+    if not value:
+        return None
+    value = value.isoformat()
+    if value.endswith('+00:00'):
+        value = value[:-6] + 'Z'
+    return value
+
+
+def get_campaign_list(rows, fields):
+    """
+    Return list data of campaign rows fetched by values_list(*fields)
+    """
+    start_index = fields.index('start_time')
+    end_index = fields.index('end_time')
+    data = []
+    for row in rows:
+        item = dict(zip(fields, row))
+        item['start_time'] = format_datetime(row[start_index])
+        item['end_time'] = format_datetime(row[end_index])
+        data.append(item)
+    return data
+
+
+def get_option_rows(campaign_ids):
+    """
+    Return (campaign_id, *OPTION_FIELDS) rows of options of campaigns with their vote counts
+    """
+    return VoteOption.objects.filter(
+        campaign_id__in=campaign_ids
+    ).order_by(
+        'option_code'
+    ).annotate(
+        number_of_vote=Coalesce(Sum('counter_set__count'), 0)
+    ).values_list('campaign_id', *OPTION_FIELDS)
+
+
+def get_campaign_details(campaigns):
+    """
+    Return detail data of campaigns by campaign ID, with options of all of them fetched in one query
+    """
+    campaigns = list(campaigns)
+    if not campaigns:
+        return {}
+    return build_campaign_details(campaigns, get_option_rows([campaign.campaign_id for campaign in campaigns]))
+
+
+def build_campaign_details(campaigns, option_rows):
+    """
+    Return detail data of campaigns by campaign ID, with option rows of get_option_rows
+    """
+    details = {}
+    for campaign in campaigns:
+        item = {field: getattr(campaign, field) for field in CAMPAIGN_FIELDS}
+        item['start_time'] = format_datetime(campaign.start_time)
+        item['end_time'] = format_datetime(campaign.end_time)
+        item['options'] = []
+        details[campaign.campaign_id] = item
+    for campaign_id, *option in option_rows:
+        details[campaign_id]['options'].append(dict(zip(OPTION_FIELDS, option)))
+    return details
@@ -0,0 +1,176 @@
+import hashlib
+import time
+from collections import namedtuple
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.utils.cache import patch_vary_headers
+from django.utils.http import parse_etags
+
+from . import compression
+from .rendering import render
+from .singleflight import SingleFlight
+from .statement_timeout import read_timeouts
+
+LIST_KEY = 'result:list'
+DETAIL_KEY = 'result:campaign:{campaign_id}'
+VERSION_KEY = 'result:version:{key}'
+
+# body is JSON bytes rendered as by JSONRenderer, gzip_body is body gzipped or None if not worth it,
+# version is the version of results it was built from
+ResultEntry = namedtuple('ResultEntry', ['body', 'etag', 'version', 'built_at', 'gzip_body'])
+# Entries cached before gzip_body was added are served as they are
+ResultEntry.__new__.__defaults__ = (None,)
+
+
+def is_enabled():
+    return settings.RESULT_CACHE['ENABLED']
+
+
+def get_cache():
+    return caches[settings.RESULT_CACHE['CACHE_ALIAS']]
+
+
+def get_detail_key(campaign_id):
+    return DETAIL_KEY.format(campaign_id=campaign_id)
+
+
+def get_version(key):
+    """
+    Return current version of cached result, which changes every time underlying data changes.
+    A version lost by cache eviction restarts from current time so it never matches older entries.
+    """
+    cache = get_cache()
+    version_key = VERSION_KEY.format(key=key)
+    version = cache.get(version_key)
+    if version is None:
+        cache.add(version_key, int(time.time() * 1000), None)
+        version = cache.get(version_key)
+    return version
+
+
+def bump(campaign_id):
+    cache = get_cache()
+    for key in (LIST_KEY, get_detail_key(campaign_id)):
+        try:
+            cache.incr(VERSION_KEY.format(key=key))
+        except ValueError:
+            # Not cached yet, next read starts a new version
+            pass
+
+
+def mark_changed(campaign_id):
+    """
+    Mark results of a campaign changed once current transaction commits
+    """
+    if is_enabled():
+        transaction.on_commit(lambda: bump(campaign_id))
+
+
+def fetch(key):
+    """
+    Return (entry, version): entry is None if missing, version is the current version of the result
+    """
+    version_key = VERSION_KEY.format(key=key)
+    values = get_cache().get_many([key, version_key])
+    entry, version = values.get(key), values.get(version_key)
+    if version is None:
+        version = get_version(key)
+    return entry, version
+
+
+def is_servable(entry, version, grace=0):
+    """
+    Check if entry is up to date, or outdated for less than the staleness window plus grace seconds
+    """
+    if entry is None:
+        return False
+    if entry.version == version:
+        return True
+    return time.time() - entry.built_at < settings.RESULT_CACHE['STALE_SECONDS'] + grace
+
+
+def build_entry(version, data):
+    body = render(data)
+    etag = '"{}"'.format(hashlib.md5(body).hexdigest())
+    return ResultEntry(body, etag, version, time.time(), compression.compress(body))
+
+
+def store(key, version, data):
+    entry = build_entry(version, data)
+    get_cache().set(key, entry, settings.RESULT_CACHE['TIMEOUT'])
+    return entry
+
+
+def get_etags(request):
+    """
+    Return ETags of If-None-Match, weak ones as strong since an entry has one body however it is encoded
+    """
+    etags = parse_etags(request.META.get('HTTP_IF_NONE_MATCH', ''))
+    return [etag[2:] if etag.startswith('W/') else etag for etag in etags]
+
+
+def to_response(request, entry):
+    """
+    Return entry as JSON response, gzipped if client accepts it, or not modified if client has it already
+    """
+    compressed = entry.gzip_body is not None and compression.accepts_gzip(request)
+    if entry.etag in get_etags(request):
+        response = HttpResponseNotModified()
+    elif compressed:
+        response = HttpResponse(entry.gzip_body, content_type='application/json')
+        response['Content-Encoding'] = 'gzip'
+    else:
+        response = HttpResponse(entry.body, content_type='application/json')
+    # Gzipped body is not the one the ETag was computed on, so its ETag is weak as with GZipMiddleware
+    response['ETag'] = 'W/' + entry.etag if compressed else entry.etag
+    if entry.gzip_body is not None:
+        patch_vary_headers(response, ('Accept-Encoding',))
+    return response
+
+
+class ResultCacheMixin:
+    """
+    Serve GET from serialized JSON cached per result key.
+    Results may be up to RESULT_CACHE['STALE_SECONDS'] behind the latest votes.
+    Concurrent misses of one key are computed once per process, other requests wait for the result.
+    With RESULT_CACHE['STALE_WHILE_REVALIDATE'] an outdated entry keeps being served that much longer
+    while it is refreshed in background.
+    """
+    flight = SingleFlight()
+
+    def get_result_cache_key(self):
+        """
+        Return cache key of the requested result, or None if the request should not be cached
+        """
+        raise NotImplementedError
+
+    def get_result_data(self):
+        """
+        Return serialized result, raising API exception if there is none
+        """
+        raise NotImplementedError
+
+    def refresh(self, key, version):
+        return store(key, version, self.get_result_data())
+
+    def refresh_in_background(self, key, version):
+        # Connections of the background thread are not those the request runs its statement timeout on
+        with read_timeouts():
+            return self.refresh(key, version)
+
+    def get(self, request, *args, **kwargs):
+        key = self.get_result_cache_key()
+        if key is None or not is_enabled() or request.accepted_renderer.format != 'json':
+            return super().get(request, *args, **kwargs)
+
+        entry, version = fetch(key)
+        if is_servable(entry, version):
+            return to_response(request, entry)
+        if is_servable(entry, version, settings.RESULT_CACHE['STALE_WHILE_REVALIDATE']):
+            self.flight.start(key, self.refresh_in_background, key, version)
+            return to_response(request, entry)
+        entry = self.flight.do(key, self.refresh, key, version)
+        return to_response(request, entry)
@@ -0,0 +1,144 @@
+import logging
+import random
+import threading
+import time
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+from .metrics import registry
+
+logger = logging.getLogger(__name__)
+
+# Seconds the replica is behind the primary, 0 when it replayed everything it received,
+# NULL when it is not streaming from the primary and may miss any number of changes.
+# Status of the WAL receiver is only visible to members of pg_read_all_stats, others only see it running.
+LAG_SQL = '''
+SELECT CASE
+    WHEN NOT pg_is_in_recovery() THEN 0
+    WHEN NOT EXISTS (
+        SELECT 1 FROM pg_stat_wal_receiver WHERE COALESCE(status, 'streaming') = 'streaming'
+    ) THEN NULL
+    WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+    ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+END
+'''
+
+_local = threading.local()
+
+
+class ReplicaLagMonitor:
+    """
+    Replication lag of each replica, measured at most once per CHECK_INTERVAL seconds within the process.
+    A thread finding the measurement outdated measures again, others keep using the previous one meanwhile.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        # alias -> (monotonic time of measurement, lag in seconds or None if unreachable)
+        self.lags = {}
+
+    @staticmethod
+    def measure(alias):
+        connection = connections[alias]
+        try:
+            if connection.vendor != 'postgresql':
+                connection.ensure_connection()
+                return 0.0
+            with connection.cursor() as cursor:
+                cursor.execute(LAG_SQL)
+                lag = cursor.fetchone()[0]
+        except DatabaseError:
+            logger.warning('Replica %s is unreachable', alias, exc_info=True)
+            return None
+        if lag is None:
+            logger.warning('Replica %s is not streaming from the primary', alias)
+            return None
+        return float(lag)
+
+    def get_lag(self, alias):
+        measured = self.lags.get(alias)
+        if measured is not None and time.monotonic() - measured[0] < settings.DATABASE_REPLICAS['CHECK_INTERVAL']:
+            return measured[1]
+        if not self.lock.acquire(blocking=False):
+            return measured[1] if measured is not None else None
+        try:
+            lag = self.measure(alias)
+            self.lags[alias] = (time.monotonic(), lag)
+            return lag
+        finally:
+            self.lock.release()
+
+    def is_in_sync(self, alias):
+        lag = self.get_lag(alias)
+        return lag is not None and lag <= settings.DATABASE_REPLICAS['MAX_LAG']
+
+
+def get_replica():
+    """
+    Return alias of a random replica in sync, or of the primary when none is
+    """
+    aliases = [alias for alias in settings.DATABASE_REPLICAS['ALIASES'] if monitor.is_in_sync(alias)]
+    if not aliases:
+        if settings.DATABASE_REPLICAS['ALIASES']:
+            registry.inc('voting_db_replica_fallbacks_total')
+        return DEFAULT_DB_ALIAS
+    return random.choice(aliases)
+
+
+@contextmanager
+def read_from_replica():
+    """
+    Route reads within the block to one replica in sync, for results which may lag slightly behind votes
+    """
+    previous = getattr(_local, 'reads', None)
+    _local.reads = {'alias': None}
+    try:
+        yield
+    finally:
+        _local.reads = previous
+
+
+class ReplicaReadMixin:
+    """
+    Read results of a view from replica, also when computed in background for the result cache
+    """
+    def dispatch(self, request, *args, **kwargs):
+        with read_from_replica():
+            return super().dispatch(request, *args, **kwargs)
+
+    def get_result_data(self):
+        with read_from_replica():
+            return super().get_result_data()
+
+
+class ReplicaRouter:
+    """
+    Send reads within read_from_replica to a replica at most DATABASE_REPLICAS['MAX_LAG'] seconds
+    behind the primary, every other query to the primary. Replicas are never migrated,
+    they replicate the schema of the primary.
+    """
+    def db_for_read(self, model, **hints):
+        reads = getattr(_local, 'reads', None)
+        if reads is None:
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Related objects come from the database of the instance
+            return instance._state.db
+        if reads['alias'] is None:
+            # Stick to one database within the block, so a response is consistent
+            reads['alias'] = get_replica()
+        return reads['alias']
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in settings.DATABASE_REPLICAS['ALIASES']
+
+
+monitor = ReplicaLagMonitor()
@@ -1,9 +1,24 @@
 from rest_framework import serializers
 
+from .metrics import measure_serializer
 from .models import VoteCampaign, VoteOption, VoteRecord
 
 
-class VoteCampaignListSerializer(serializers.ModelSerializer):
+class TimedSerializerMixin:
+    """
+    Count time spent producing data in serializer time of current request
+    """
+    @property
+    def data(self):
+        with measure_serializer():
+            return super().data
+
+
+class TimedListSerializer(TimedSerializerMixin, serializers.ListSerializer):
+    pass
+
+
+class VoteCampaignListSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     status = serializers.CharField()
     number_of_vote = serializers.IntegerField()
 
@@ -17,6 +32,22 @@ class VoteCampaignListSerializer(serializers.ModelSerializer):
             'status',
             'number_of_vote'
         )
+        list_serializer_class = TimedListSerializer
+
+
+class VoteCampaignLiteSerializer(TimedSerializerMixin, serializers.ModelSerializer):
+    status = serializers.CharField()
+
+    class Meta:
+        model = VoteCampaign
+        fields = (
+            'campaign_id',
+            'question',
+            'start_time',
+            'end_time',
+            'status'
+        )
+        list_serializer_class = TimedListSerializer
 
 
 class VoteOptionSerializer(serializers.ModelSerializer):
@@ -41,7 +72,7 @@ class VoteCampaignDetailSerializer(VoteCampaignListSerializer):
         )
 
 
-class VoteRecordSerializer(serializers.ModelSerializer):
+class VoteRecordSerializer(TimedSerializerMixin, serializers.ModelSerializer):
     create_time = serializers.DateTimeField()
     class Meta:
         model = VoteRecord
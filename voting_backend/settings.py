@@ -10,7 +10,56 @@ env = environ.Env(
     SECRET_KEY=(str, ''),
     ALLOWED_HOST=(str, ''),
     CORS_REGEX=(str, ''),
-    DEBUG=(bool, False)
+    DEBUG=(bool, False),
+    VOTE_INGESTION_MODE=(str, 'sync'),
+    VOTE_INGESTION_BATCH_SIZE=(int, 500),
+    VOTE_INGESTION_FLUSH_INTERVAL=(float, 0.5),
+    VOTE_INGESTION_JOURNAL_DIR=(str, os.path.join(BASE_DIR, 'journal')),
+    VOTE_INGESTION_FSYNC=(bool, True),
+    CAMPAIGN_CACHE_TIMEOUT=(float, 60),
+    CAMPAIGN_CACHE_MAX_SIZE=(int, 1024),
+    RESULT_CACHE_ENABLED=(bool, False),
+    RESULT_CACHE_STALE_SECONDS=(float, 1),
+    RESULT_CACHE_TIMEOUT=(int, 300),
+    RESULT_CACHE_STALE_WHILE_REVALIDATE=(float, 0),
+    RESPONSE_COMPRESSION_ENABLED=(bool, True),
+    RESPONSE_COMPRESSION_MIN_LENGTH=(int, 1024),
+    VOTE_BATCH_MAX_SIZE=(int, 5000),
+    METRICS_ENABLED=(bool, True),
+    METRICS_DIR=(str, ''),
+    METRICS_FLUSH_INTERVAL=(float, 1),
+    METRICS_ALLOWED_NETWORKS=(list, ['127.0.0.1/32', '::1/128']),
+    LIVE_RESULTS_INTERVAL=(float, 1),
+    LIVE_RESULTS_HEARTBEAT=(float, 15),
+    LIVE_RESULTS_MAX_DURATION=(float, 300),
+    LIVE_RESULTS_POLL_TIMEOUT=(float, 30),
+    ASGI_THREADS=(int, 16),
+    DATABASE_CONN_MAX_AGE=(int, 60),
+    DATABASE_HEALTH_CHECKS=(bool, True),
+    DATABASE_POOL_MIN_SIZE=(int, 2),
+    DATABASE_POOL_MAX_SIZE=(int, 0),
+    DATABASE_POOL_TIMEOUT=(float, 10),
+    DATABASE_STATEMENT_TIMEOUT=(int, 5000),
+    DATABASE_REPLICA_URLS=(list, []),
+    DATABASE_REPLICA_MAX_LAG=(float, 5),
+    DATABASE_REPLICA_CHECK_INTERVAL=(float, 1),
+    VOTE_PARTITIONING=(bool, False),
+    VOTE_PARTITIONS_ARCHIVE_SCHEMA=(str, 'archive'),
+    VOTE_PARTITIONS_ARCHIVE_AFTER_DAYS=(int, 0),
+    CAMPAIGN_SNAPSHOTS_ENABLED=(bool, True),
+    CAMPAIGN_SNAPSHOTS_DELAY=(float, 60),
+    VOTER_ID_ALGORITHM=(str, 'sha256'),
+    VOTER_ID_KEY=(str, ''),
+    VOTE_FILTER_ENABLED=(bool, False),
+    VOTE_FILTER_ERROR_RATE=(float, 0.001),
+    VOTE_FILTER_MIN_CAPACITY=(int, 10000),
+    VOTE_FILTER_CHECK_INTERVAL=(float, 5),
+    VOTE_THROTTLE_ENABLED=(bool, False),
+    VOTE_THROTTLE_IP_RATE=(str, '120/min'),
+    VOTE_THROTTLE_VOTER_RATE=(str, '3/min'),
+    VOTE_THROTTLE_STORE=(str, 'local'),
+    VOTE_THROTTLE_SHARED_PATH=(str, os.path.join(BASE_DIR, 'throttle.buckets')),
+    NUM_PROXIES=(int, None)
 )
 
 # If .env file exist, read .env file
@@ -45,10 +94,13 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'voting_backend.metrics.MetricsMiddleware',
+    'voting_backend.compression.CompressionMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.common.CommonMiddleware',
+    'django.middleware.http.ConditionalGetMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
@@ -82,15 +134,191 @@ CORS_ORIGIN_WHITELIST = [
 # Rest Framework Setting
 
 REST_FRAMEWORK = {
-    'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend']
+    'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
+    'EXCEPTION_HANDLER': 'voting_backend.metrics.exception_handler',
+    # Proxies in front of the app, so throttles read client IP from X-Forwarded-For
+    'NUM_PROXIES': env('NUM_PROXIES'),
+}
+
+# Vote ingestion
+# 'sync' saves every vote within its request,
+# 'queue' journals the vote, responds right away and saves votes in batches in background
+
+VOTE_INGESTION = {
+    'MODE': env('VOTE_INGESTION_MODE'),
+    'BATCH_SIZE': env('VOTE_INGESTION_BATCH_SIZE'),
+    'FLUSH_INTERVAL': env('VOTE_INGESTION_FLUSH_INTERVAL'),
+    'JOURNAL_DIR': env('VOTE_INGESTION_JOURNAL_DIR'),
+    'FSYNC': env('VOTE_INGESTION_FSYNC'),
+}
+
+# Maximum number of votes accepted by one batch vote request
+
+VOTE_BATCH_MAX_SIZE = env('VOTE_BATCH_MAX_SIZE')
+
+# In-process cache of campaign and option codes used by the vote path
+
+CAMPAIGN_CACHE = {
+    'TIMEOUT': env('CAMPAIGN_CACHE_TIMEOUT'),
+    'MAX_SIZE': env('CAMPAIGN_CACHE_MAX_SIZE'),
+}
+
+# Cache
+# https://docs.djangoproject.com/en/2.1/topics/cache/
+
+CACHES = {
+    'default': env.cache(default='locmemcache://')
+}
+
+# Serialized campaign results, which may be up to STALE_SECONDS behind the latest votes,
+# or STALE_SECONDS + STALE_WHILE_REVALIDATE while a refresh runs in background
+
+RESULT_CACHE = {
+    'ENABLED': env('RESULT_CACHE_ENABLED'),
+    'STALE_SECONDS': env('RESULT_CACHE_STALE_SECONDS'),
+    'TIMEOUT': env('RESULT_CACHE_TIMEOUT'),
+    'STALE_WHILE_REVALIDATE': env('RESULT_CACHE_STALE_WHILE_REVALIDATE'),
+    'CACHE_ALIAS': 'default',
+}
+
+# Responses of at least MIN_LENGTH bytes are gzipped for clients accepting it, except streams.
+# Cached results keep their gzipped body, so they are compressed once per version of results
+
+RESPONSE_COMPRESSION = {
+    'ENABLED': env('RESPONSE_COMPRESSION_ENABLED'),
+    'MIN_LENGTH': env('RESPONSE_COMPRESSION_MIN_LENGTH'),
+}
+
+# Voter IDs of new campaigns are hashed by the hasher of ALGORITHM among HASHERS
+# Keyed hashers use KEY, which must stay the same as long as votes are stored
+
+VOTER_ID_HASHING = {
+    'HASHERS': [
+        'voting_backend.hashers.SHA256VoterIDHasher',
+        'voting_backend.hashers.BLAKE2bVoterIDHasher',
+        'voting_backend.hashers.HMACSHA256VoterIDHasher',
+    ],
+    'ALGORITHM': env('VOTER_ID_ALGORITHM'),
+    'KEY': env('VOTER_ID_KEY'),
+}
+
+# Final results of campaigns closed for DELAY seconds are frozen and served without summing counters
+# DELAY must cover votes still queued when a campaign closes
+
+CAMPAIGN_SNAPSHOTS = {
+    'ENABLED': env('CAMPAIGN_SNAPSHOTS_ENABLED'),
+    'DELAY': env('CAMPAIGN_SNAPSHOTS_DELAY'),
+}
+
+# Per-process Bloom filters of voters of each campaign, catching repeat votes before the insert
+# Filters are sized for ERROR_RATE false matches, each confirmed by a query
+# Processes sharing the cache of CACHE_ALIAS rebuild their filters within CHECK_INTERVAL seconds when asked
+
+VOTE_FILTER = {
+    'ENABLED': env('VOTE_FILTER_ENABLED'),
+    'ERROR_RATE': env('VOTE_FILTER_ERROR_RATE'),
+    'MIN_CAPACITY': env('VOTE_FILTER_MIN_CAPACITY'),
+    'MAX_CAMPAIGNS': 64,
+    'REPEAT_CACHE_SIZE': 10000,
+    'REPEAT_TIMEOUT': 60,
+    'CHECK_INTERVAL': env('VOTE_FILTER_CHECK_INTERVAL'),
+    'CACHE_ALIAS': 'default',
+}
+
+# Token buckets throttling the vote endpoint per client IP and per HKID, rates as '<burst>/<s|min|hour|day>'
+# 'local' buckets hold per process, 'shared' buckets in the file at SHARED_PATH hold across the workers of a host
+# Either store keeps SIZE buckets
+
+VOTE_THROTTLE = {
+    'ENABLED': env('VOTE_THROTTLE_ENABLED'),
+    'IP_RATE': env('VOTE_THROTTLE_IP_RATE'),
+    'VOTER_RATE': env('VOTE_THROTTLE_VOTER_RATE'),
+    'STORE': env('VOTE_THROTTLE_STORE'),
+    'SHARED_PATH': env('VOTE_THROTTLE_SHARED_PATH'),
+    'SIZE': 65536,
+}
+
+# Live campaign results, polled once per INTERVAL for every connection of a process
+# Event streams end after MAX_DURATION seconds and clients reconnect after RETRY seconds
+
+LIVE_RESULTS = {
+    'INTERVAL': env('LIVE_RESULTS_INTERVAL'),
+    'HEARTBEAT': env('LIVE_RESULTS_HEARTBEAT'),
+    'MAX_DURATION': env('LIVE_RESULTS_MAX_DURATION'),
+    'RETRY': 3,
+    'POLL_TIMEOUT': env('LIVE_RESULTS_POLL_TIMEOUT'),
+}
+
+# ASGI deployment, requests are handled by a pool of THREADS threads per process,
+# each of them holding at most one database connection
+
+ASGI = {
+    'THREADS': env('ASGI_THREADS'),
+}
+
+# Request metrics exposed at /metrics to clients in ALLOWED_NETWORKS and admin users
+# Set DIR to a directory shared by the workers of an instance to report metrics of all of them
+
+METRICS = {
+    'ENABLED': env('METRICS_ENABLED'),
+    'DIR': env('METRICS_DIR'),
+    'FLUSH_INTERVAL': env('METRICS_FLUSH_INTERVAL'),
+    'ALLOWED_NETWORKS': env('METRICS_ALLOWED_NETWORKS'),
 }
 
 # Database
 # https://docs.djangoproject.com/en/2.1/ref/settings/#databases
+# Connections are kept open for CONN_MAX_AGE seconds, and on PostgreSQL checked before their first use in a request.
+# With DATABASE_POOL_MAX_SIZE set, threads of a process share a pool of at most that many PostgreSQL connections
+# per database, and return their connection to the pool at the end of each request instead.
+# Read replicas in DATABASE_REPLICA_URLS are named replica_0, replica_1 and so on.
 
 DATABASES = {
     'default': env.db()
 }
+for index, url in enumerate(env('DATABASE_REPLICA_URLS')):
+    DATABASES['replica_{}'.format(index)] = dict(env.db_url_config(url), TEST={'MIRROR': 'default'})
+for database in DATABASES.values():
+    database.update({
+        'CONN_MAX_AGE': env('DATABASE_CONN_MAX_AGE'),
+        'CONN_HEALTH_CHECKS': env('DATABASE_HEALTH_CHECKS'),
+    })
+    if database['ENGINE'] in ('django.db.backends.postgresql', 'django.db.backends.postgresql_psycopg2'):
+        database['ENGINE'] = 'voting_backend.backends.postgresql'
+        if env('DATABASE_POOL_MAX_SIZE'):
+            database.update({
+                'CONN_MAX_AGE': 0,
+                'POOL': {
+                    'MIN_SIZE': min(env('DATABASE_POOL_MIN_SIZE'), env('DATABASE_POOL_MAX_SIZE')),
+                    'MAX_SIZE': env('DATABASE_POOL_MAX_SIZE'),
+                    'TIMEOUT': env('DATABASE_POOL_TIMEOUT'),
+                },
+            })
+
+# Campaign results and lists are read from a replica at most MAX_LAG seconds behind the primary,
+# measured every CHECK_INTERVAL seconds, or from the primary when no replica is; votes always go to the primary
+
+DATABASE_REPLICAS = {
+    'ALIASES': [alias for alias in DATABASES if alias != 'default'],
+    'MAX_LAG': env('DATABASE_REPLICA_MAX_LAG'),
+    'CHECK_INTERVAL': env('DATABASE_REPLICA_CHECK_INTERVAL'),
+}
+
+DATABASE_ROUTERS = ['voting_backend.routers.ReplicaRouter']
+
+# Vote records partitioned by campaign on PostgreSQL, applied by migrations when ENABLED
+# Partitions of campaigns closed for ARCHIVE_AFTER_DAYS days are moved to ARCHIVE_SCHEMA, 0 keeps them
+
+VOTE_PARTITIONS = {
+    'ENABLED': env('VOTE_PARTITIONING'),
+    'ARCHIVE_SCHEMA': env('VOTE_PARTITIONS_ARCHIVE_SCHEMA'),
+    'ARCHIVE_AFTER_DAYS': env('VOTE_PARTITIONS_ARCHIVE_AFTER_DAYS'),
+}
+
+# Queries of the campaign list and detail endpoints running longer than this many milliseconds
+# are cancelled on PostgreSQL, 0 disables
+
+DATABASE_STATEMENT_TIMEOUT = env('DATABASE_STATEMENT_TIMEOUT')
 
 
 # Password validation
@@ -0,0 +1,57 @@
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from . import counters, duplicates, ingestion, result_cache, snapshots
+from .campaign_cache import campaign_cache
+from .models import VoteCampaign, VoteOption, VoteRecord
+from .transitions import campaign_status_changed
+
+
+@receiver(post_save, sender=VoteRecord)
+def count_vote(sender, instance, created, **kwargs):
+    """
+    Add new record to its option counter, on the shard picked by the hashed user ID.
+    Deletion is not tracked to keep cascade delete fast, use rebuild_vote_counters afterwards.
+    """
+    if created:
+        shard = counters.shard_for(instance.user_id, instance.campaign.counter_shards)
+        counters.increment(instance.campaign_id, instance.option_id, shard)
+        result_cache.mark_changed(instance.campaign_id)
+        if snapshots.is_final(instance.campaign):
+            # Recorded after results were frozen, e.g. inserted manually
+            snapshots.discard([instance.campaign_id])
+
+
+@receiver(post_save, sender=VoteCampaign)
+@receiver(post_delete, sender=VoteCampaign)
+def invalidate_campaign(sender, instance, **kwargs):
+    campaign_cache.invalidate(instance.campaign_id)
+    result_cache.mark_changed(instance.campaign_id)
+    snapshots.discard([instance.campaign_id])
+
+
+@receiver(post_save, sender=VoteOption)
+@receiver(post_delete, sender=VoteOption)
+def invalidate_option(sender, instance, **kwargs):
+    campaign_cache.invalidate(instance.campaign_id)
+    result_cache.mark_changed(instance.campaign_id)
+    snapshots.discard([instance.campaign_id])
+
+
+@receiver(campaign_status_changed)
+def apply_transition_hooks(sender, campaign, old_status, new_status, **kwargs):
+    """
+    Results show the status, and caches of this process hold the old one.
+    An opening campaign is loaded ahead of its first votes, a closing one leaves the vote queue
+    and is frozen at once if the transition was applied after the snapshot delay.
+    """
+    campaign_cache.invalidate(campaign.campaign_id)
+    result_cache.mark_changed(campaign.campaign_id)
+    if new_status == 'ACTIVE':
+        campaign_cache.get(campaign.campaign_id)
+        if duplicates.is_enabled():
+            duplicates.vote_filter.get_filter(campaign.campaign_id)
+    elif new_status == 'CLOSED':
+        ingestion.forget_campaign(campaign.campaign_id)
+        if snapshots.is_final(campaign):
+            snapshots.finalize_campaigns([campaign.campaign_id])
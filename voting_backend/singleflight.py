@@ -0,0 +1,73 @@
+import logging
+import threading
+
+from django.db import connections
+
+logger = logging.getLogger(__name__)
+
+
+class Call:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+class SingleFlight:
+    """
+    Run a function at most once per key at a time within the process.
+    Callers arriving while the function runs wait for and share its result.
+    """
+    def __init__(self, wait_timeout=10):
+        self.wait_timeout = wait_timeout
+        self.lock = threading.Lock()
+        self.calls = {}
+
+    def is_running(self, key):
+        with self.lock:
+            return key in self.calls
+
+    def do(self, key, func, *args):
+        with self.lock:
+            call = self.calls.get(key)
+            is_leader = call is None
+            if is_leader:
+                call = self.calls[key] = Call()
+
+        if not is_leader:
+            if call.done.wait(self.wait_timeout):
+                if call.error is not None:
+                    raise call.error
+                return call.result
+            # Leader is taking too long, compute without it
+            return func(*args)
+
+        try:
+            call.result = func(*args)
+        except Exception as error:
+            call.error = error
+            raise
+        finally:
+            with self.lock:
+                del self.calls[key]
+            call.done.set()
+        return call.result
+
+    def start(self, key, func, *args):
+        """
+        Run func in background thread unless already running for the key
+        """
+        if self.is_running(key):
+            return False
+        thread = threading.Thread(target=self.run_in_background, args=(key, func) + args, daemon=True)
+        thread.start()
+        return True
+
+    def run_in_background(self, key, func, *args):
+        try:
+            self.do(key, func, *args)
+        except Exception:
+            logger.exception('Background call of %s failed', key)
+        finally:
+            # Thread owns its own database connections
+            connections.close_all()
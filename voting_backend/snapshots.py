@@ -0,0 +1,73 @@
+import datetime
+
+from django.conf import settings
+from django.utils import timezone
+
+from . import rendering
+from .models import VoteCampaign, VoteCampaignSnapshot
+
+
+def is_enabled():
+    return settings.CAMPAIGN_SNAPSHOTS['ENABLED']
+
+
+def get_closed_before():
+    return timezone.now() - datetime.timedelta(seconds=settings.CAMPAIGN_SNAPSHOTS['DELAY'])
+
+
+def is_final(campaign):
+    """
+    Check if results of a campaign can no longer change: it closed DELAY seconds ago,
+    so votes accepted before it closed have been written
+    """
+    return is_enabled() and campaign.end_time <= get_closed_before()
+
+
+def get_snapshot(campaign):
+    """
+    Return snapshot of a campaign, loaded along with it by select_related('snapshot')
+    """
+    if not is_enabled():
+        return None
+    try:
+        return campaign.snapshot
+    except VoteCampaignSnapshot.DoesNotExist:
+        return None
+
+
+def freeze(campaign, data):
+    """
+    Store serialized detail of a final campaign as its snapshot
+    """
+    snapshot, _ = VoteCampaignSnapshot.objects.update_or_create(campaign=campaign, defaults={
+        'number_of_vote': sum(option['number_of_vote'] for option in data['options']),
+        'body': rendering.render(data).decode('utf-8'),
+    })
+    return snapshot
+
+
+def discard(campaign_ids):
+    """
+    Drop snapshots of campaigns whose results changed after all, they are frozen again on next read
+    """
+    VoteCampaignSnapshot.objects.filter(campaign_id__in=campaign_ids).delete()
+
+
+def finalize_campaigns(campaign_ids=None, refreeze=False, batch_size=100):
+    """
+    Freeze results of final campaigns without snapshot, or of every final campaign with refreeze.
+    Return the campaign IDs frozen.
+    """
+    campaigns = VoteCampaign.objects.filter(end_time__lte=get_closed_before())
+    if campaign_ids:
+        campaigns = campaigns.filter(campaign_id__in=campaign_ids)
+    if not refreeze:
+        campaigns = campaigns.filter(snapshot__isnull=True)
+    campaigns = list(campaigns.order_by('campaign_id'))
+
+    for start in range(0, len(campaigns), batch_size):
+        batch = campaigns[start:start + batch_size]
+        details = rendering.get_campaign_details(batch)
+        for campaign in batch:
+            freeze(campaign, details[campaign.campaign_id])
+    return [campaign.campaign_id for campaign in campaigns]
@@ -0,0 +1,60 @@
+from contextlib import ExitStack, contextmanager
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+
+@contextmanager
+def statement_timeout(milliseconds, using=DEFAULT_DB_ALIAS):
+    """
+    Cancel any query on PostgreSQL running longer than milliseconds within the block.
+    The timeout is set right before the first query, so a block served without query costs nothing,
+    and reset afterwards as the connection outlives the block.
+    """
+    connection = connections[using]
+    if not milliseconds or connection.vendor != 'postgresql':
+        yield
+        return
+
+    applied = []
+
+    def apply_timeout(execute, sql, params, many, context):
+        if not applied:
+            # Raw cursor bypasses execute wrappers and query logging
+            context['cursor'].cursor.execute('SET statement_timeout = %s', [int(milliseconds)])
+            applied.append(True)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(apply_timeout):
+        try:
+            yield
+        finally:
+            if applied and connection.connection is not None:
+                try:
+                    with connection.connection.cursor() as cursor:
+                        cursor.execute('RESET statement_timeout')
+                except connection.Database.Error:
+                    # Rollback of a failed transaction reverts the timeout too, a broken connection is dropped
+                    if not connection.in_atomic_block:
+                        connection.close()
+
+
+@contextmanager
+def read_timeouts():
+    """
+    Apply statement timeout of DATABASE_STATEMENT_TIMEOUT milliseconds on every database,
+    as reads may go to a replica
+    """
+    with ExitStack() as stack:
+        for alias in connections:
+            stack.enter_context(statement_timeout(settings.DATABASE_STATEMENT_TIMEOUT, alias))
+        yield
+
+
+class StatementTimeoutMixin:
+    """
+    Run a view within read_timeouts
+    """
+    def dispatch(self, request, *args, **kwargs):
+        with read_timeouts():
+            return super().dispatch(request, *args, **kwargs)
@@ -0,0 +1,247 @@
+import asyncio
+import datetime
+import json
+import threading
+import time
+from unittest.mock import patch
+
+from django.core.signals import request_finished
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from voting_backend import live, models
+from voting_backend.asgi import ASGIHandler, get_environ
+from voting_backend.views import CampaignPollView
+
+LIVE_RESULTS = {
+    'INTERVAL': 1,
+    'HEARTBEAT': 0.05,
+    'MAX_DURATION': 5,
+    'RETRY': 3,
+    'POLL_TIMEOUT': 0.01,
+}
+
+
+class TestASGIHandler(TransactionTestCase):
+    """
+    Views run in threads of the handler, which only see committed data
+    """
+    def setUp(self):
+        # Requests of a test share one event loop, as they would in a server
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.addCleanup(self.close_loop)
+        self.handler = ASGIHandler(threads=2)
+        self.addCleanup(self.handler.executor.shutdown)
+        self.addCleanup(self.close_connections)
+        now = timezone.now()
+        self.campaign = models.VoteCampaign.objects.create(
+            question='How are you',
+            start_time=now - datetime.timedelta(days=1),
+            end_time=now + datetime.timedelta(days=1)
+        )
+        self.option = models.VoteOption.objects.create(
+            campaign=self.campaign,
+            option_code='a',
+            option_detail='great'
+        )
+
+    def close_loop(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def close_connections(self):
+        """
+        Close connections kept open by every pool thread, so the test database can be dropped
+        """
+        if self.handler.executor._shutdown:
+            return
+        barrier = threading.Barrier(2)
+
+        def close():
+            # Each thread waits for the other, so both threads run one task
+            barrier.wait(5)
+            connections.close_all()
+
+        for future in [self.handler.executor.submit(close) for _ in range(2)]:
+            future.result()
+
+    def request(self, method, path, body=b'', headers=(), until=None):
+        """
+        Send request to the handler and return messages sent back.
+        Client disconnects once until returns True for the messages sent so far.
+        """
+        async def run():
+            messages = asyncio.Queue()
+            # Body arrives in two messages
+            messages.put_nowait({'type': 'http.request', 'body': body[:5], 'more_body': True})
+            messages.put_nowait({'type': 'http.request', 'body': body[5:], 'more_body': False})
+            sent = []
+
+            async def send(message):
+                sent.append(message)
+                if until is not None and until(sent):
+                    messages.put_nowait({'type': 'http.disconnect'})
+
+            scope = {
+                'type': 'http',
+                'http_version': '1.1',
+                'method': method,
+                'scheme': 'http',
+                'path': path,
+                'root_path': '',
+                'query_string': b'',
+                'headers': [(b'host', b'localhost')] + list(headers),
+                'server': ('localhost', 8000),
+                'client': ('127.0.0.1', 50000),
+            }
+            await asyncio.wait_for(self.handler(scope, messages.get, send), 10)
+            return sent
+
+        return self.loop.run_until_complete(run())
+
+    @staticmethod
+    def get_body(messages):
+        return b''.join(message.get('body', b'') for message in messages[1:])
+
+    def test_can_translate_scope_to_environ(self):
+        environ = get_environ({
+            'method': 'GET',
+            'path': '/api/campaign/',
+            'root_path': '/api',
+            'query_string': b'status=ACTIVE',
+            'headers': [(b'content-type', b'text/plain'), (b'x-forwarded-for', b'1.1.1.1'), (b'x-forwarded-for', b'2.2.2.2')],
+        }, None)
+        self.assertEqual(environ['SCRIPT_NAME'], '/api')
+        self.assertEqual(environ['PATH_INFO'], '/campaign/')
+        self.assertEqual(environ['QUERY_STRING'], 'status=ACTIVE')
+        self.assertEqual(environ['CONTENT_TYPE'], 'text/plain')
+        self.assertEqual(environ['HTTP_X_FORWARDED_FOR'], '1.1.1.1,2.2.2.2')
+
+    @override_settings(ALLOWED_HOSTS=['localhost'])
+    def test_can_serve_campaign_detail(self):
+        messages = self.request('GET', reverse('campaign_detail', args=[self.campaign.campaign_id]))
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertIn((b'Content-Type', b'application/json'), messages[0]['headers'])
+        self.assertEqual(json.loads(self.get_body(messages).decode('utf-8'))['options'][0]['option_code'], 'a')
+        self.assertFalse(messages[-1].get('more_body', False))
+
+    @override_settings(ALLOWED_HOSTS=['localhost'])
+    def test_can_vote(self):
+        messages = self.request(
+            'POST',
+            reverse('vote', args=[self.campaign.campaign_id]),
+            body=b'hkid=Y7280422&option_code=a',
+            headers=[(b'content-type', b'application/x-www-form-urlencoded')]
+        )
+        self.assertEqual(messages[0]['status'], 201, self.get_body(messages))
+        self.assertEqual(models.VoteRecord.objects.filter(campaign=self.campaign).count(), 1)
+
+    @override_settings(ALLOWED_HOSTS=['localhost'], LIVE_RESULTS=LIVE_RESULTS)
+    def test_can_stream_live_results_on_event_loop(self):
+        broadcaster = live.TallyBroadcaster(interval=0)
+        broadcaster.ensure_started = lambda: None
+
+        def until(sent):
+            if len(sent) == 2:
+                # Stream started, results change
+                broadcaster.poll_once()
+            return any(b'event: result' in message.get('body', b'') for message in sent)
+
+        with patch.object(live, 'broadcaster', broadcaster):
+            messages = self.request(
+                'GET',
+                reverse('campaign_live', args=[self.campaign.campaign_id]),
+                headers=[(b'accept', b'text/event-stream')],
+                until=until
+            )
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertIn((b'Content-Type', b'text/event-stream'), messages[0]['headers'])
+        self.assertEqual(messages[1]['body'], b'retry: 3000\n\n')
+        self.assertIn(b'"option_code":"a"', self.get_body(messages))
+        self.assertEqual(broadcaster.subscribers, {})
+
+    @override_settings(ALLOWED_HOSTS=['localhost'], LIVE_RESULTS=LIVE_RESULTS)
+    def test_can_finish_request_once_stream_ended(self):
+        broadcaster = live.TallyBroadcaster(interval=0)
+        broadcaster.ensure_started = lambda: None
+        finished = []
+        finished_while_streaming = []
+
+        def on_finished(sender, **kwargs):
+            finished.append(sender)
+
+        def until(sent):
+            finished_while_streaming.append(bool(finished))
+            return len(sent) == 3
+
+        request_finished.connect(on_finished)
+        self.addCleanup(request_finished.disconnect, on_finished)
+        with patch.object(live, 'broadcaster', broadcaster):
+            self.request(
+                'GET',
+                reverse('campaign_live', args=[self.campaign.campaign_id]),
+                headers=[(b'accept', b'text/event-stream')],
+                until=until
+            )
+        self.assertEqual(finished_while_streaming, [False] * 3)
+        self.assertEqual(len(finished), 1)
+
+    @override_settings(ALLOWED_HOSTS=['localhost'], CORS_ORIGIN_ALLOW_ALL=True,
+                       LIVE_RESULTS=dict(LIVE_RESULTS, POLL_TIMEOUT=5))
+    def test_can_long_poll_on_event_loop(self):
+        broadcaster = live.TallyBroadcaster(interval=0)
+        broadcaster.ensure_started = lambda: None
+
+        def produce():
+            # Results change once the poll waits, loaded by another thread as the producer would
+            while not broadcaster.subscribers:
+                time.sleep(0.01)
+            try:
+                broadcaster.poll_once()
+            finally:
+                connections.close_all()
+
+        finished = []
+
+        def on_finished(sender, **kwargs):
+            finished.append(sender)
+
+        request_finished.connect(on_finished)
+        self.addCleanup(request_finished.disconnect, on_finished)
+        producer = threading.Thread(target=produce)
+        url = reverse('campaign_poll', args=[self.campaign.campaign_id])
+        with patch.object(live, 'broadcaster', broadcaster), \
+                patch.object(CampaignPollView, 'get', autospec=True, side_effect=CampaignPollView.get) as view:
+            producer.start()
+            messages = self.request('GET', url, headers=[(b'origin', b'http://example.com')])
+            producer.join()
+            headers = dict(messages[0]['headers'])
+            with override_settings(LIVE_RESULTS=LIVE_RESULTS):
+                not_modified = self.request('GET', url, headers=[(b'if-none-match', headers[b'ETag'])])
+        self.assertEqual(messages[0]['status'], 200)
+        self.assertEqual(json.loads(self.get_body(messages).decode('utf-8'))['options'][0]['option_code'], 'a')
+        # Headers of middleware are kept
+        self.assertEqual(headers[b'Access-Control-Allow-Origin'], b'*')
+        self.assertEqual(not_modified[0]['status'], 304)
+        self.assertEqual(broadcaster.subscribers, {})
+        # View and middleware ran once per poll
+        self.assertEqual(view.call_count, 2)
+        self.assertEqual(len(finished), 2)
+
+    def test_can_complete_lifespan(self):
+        async def run():
+            messages = asyncio.Queue()
+            messages.put_nowait({'type': 'lifespan.startup'})
+            messages.put_nowait({'type': 'lifespan.shutdown'})
+            sent = []
+
+            async def send(message):
+                sent.append(message['type'])
+
+            await self.handler({'type': 'lifespan'}, messages.get, send)
+            return sent
+
+        self.assertEqual(self.loop.run_until_complete(run()), ['lifespan.startup.complete', 'lifespan.shutdown.complete'])
@@ -0,0 +1,20 @@
+import itertools
+from unittest import TestCase
+
+from benchmarks.hkids import iter_hkids
+from voting_backend import forms
+
+
+class TestHKIDGenerator(TestCase):
+    def setUp(self):
+        self.field = forms.HKIDField()
+
+    def test_can_generate_valid_hkid(self):
+        hkids = list(itertools.islice(iter_hkids(), 2000)) + list(itertools.islice(iter_hkids(26999990), 20))
+        for hkid in hkids:
+            self.assertEqual(self.field.clean(hkid), hkid)
+        self.assertEqual(len(set(hkids)), len(hkids))
+
+    def test_can_start_from_position(self):
+        self.assertEqual(next(iter_hkids(1000000)), 'B0000006')
+        self.assertEqual(next(iter_hkids(26000000))[:2], 'AA')
@@ -0,0 +1,70 @@
+import datetime
+
+from django.test import TestCase
+
+from voting_backend import models
+from voting_backend.campaign_cache import CampaignCache, campaign_cache
+
+
+class TestCampaignCache(TestCase):
+    multi_db = True
+
+    def setUp(self):
+        self.cache = CampaignCache(timeout=60, max_size=2)
+        self.campaign = models.VoteCampaign.objects.create(
+            question='How are you',
+            start_time=datetime.datetime(2000, 1, 1, 0, 0, 0),
+            end_time=datetime.datetime(2000, 2, 1, 0, 0, 0)
+        )
+        self.option = models.VoteOption.objects.create(
+            campaign=self.campaign,
+            option_code='a',
+            option_detail='great'
+        )
+
+    def test_can_serve_warm_entry_without_query(self):
+        entry = self.cache.get(self.campaign.campaign_id)
+        self.assertEqual(entry.campaign, self.campaign)
+        self.assertEqual(entry.options, {'a': self.option.id})
+        with self.assertNumQueries(0):
+            self.cache.get(self.campaign.campaign_id)
+        self.assertEqual(self.cache.stats(), {'hits': 1, 'misses': 1, 'evictions': 0, 'size': 1})
+
+    def test_can_cache_missing_campaign(self):
+        self.assertIsNone(self.cache.get(self.campaign.campaign_id + 1).campaign)
+
+    def test_can_expire_entry(self):
+        self.cache.timeout = 0
+        self.cache.get(self.campaign.campaign_id)
+        self.cache.get(self.campaign.campaign_id)
+        self.assertEqual(self.cache.stats()['misses'], 2)
+
+    def test_can_evict_least_recently_used_entry(self):
+        for campaign_id in range(3):
+            self.cache.get(campaign_id)
+        self.assertEqual(self.cache.stats()['evictions'], 1)
+        self.assertEqual(list(self.cache.entries), [1, 2])
+
+    def test_can_invalidate_on_option_change(self):
+        campaign_cache.get(self.campaign.campaign_id)
+        models.VoteOption.objects.create(
+            campaign=self.campaign,
+            option_code='b',
+            option_detail='not great'
+        )
+        entry = campaign_cache.get(self.campaign.campaign_id)
+        self.assertEqual(set(entry.options), {'a', 'b'})
+
+    def test_can_invalidate_on_campaign_change(self):
+        campaign_id = self.campaign.campaign_id
+        campaign_cache.get(campaign_id)
+        self.campaign.end_time = datetime.datetime(2000, 1, 2, 0, 0, 0)
+        self.campaign.save()
+        self.assertEqual(campaign_cache.get(campaign_id).campaign.end_time, self.campaign.end_time)
+        self.campaign.delete()
+        self.assertIsNone(campaign_cache.get(campaign_id).campaign)
+
+    def test_can_clear_entries(self):
+        self.cache.get(self.campaign.campaign_id)
+        self.cache.clear()
+        self.assertEqual(self.cache.stats()['size'], 0)
@@ -0,0 +1,100 @@
+import datetime
+import gzip
+from unittest.mock import patch
+
+from django.http import StreamingHttpResponse
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+from django.utils.text import compress_string
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from voting_backend import models, result_cache
+from voting_backend.compression import CompressionMiddleware
+
+RESULT_CACHE = {
+    'ENABLED': True,
+    'STALE_SECONDS': 60,
+    'TIMEOUT': 300,
+    'STALE_WHILE_REVALIDATE': 0,
+    'CACHE_ALIAS': 'default',
+}
+
+RESPONSE_COMPRESSION = {
+    'ENABLED': True,
+    'MIN_LENGTH': 200,
+}
+
+
+@override_settings(RESPONSE_COMPRESSION=RESPONSE_COMPRESSION)
+class TestCompression(APITestCase):
+    multi_db = True
+
+    def setUp(self):
+        result_cache.get_cache().clear()
+        models.VoteCampaign.objects.bulk_create([
+            models.VoteCampaign(
+                question=f'How are you {index}',
+                start_time=datetime.datetime(2000, 1, 1, 0, 0, 0),
+                end_time=datetime.datetime(2000, 2, 1, 0, 0, 0),
+                status='CLOSED'
+            )
+            for index in range(10)
+        ])
+
+    def test_can_gzip_response_for_client_accepting_it(self):
+        response = self.client.get(reverse('campaign_list'))
+        compressed_response = self.client.get(reverse('campaign_list'), HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(compressed_response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(compressed_response.content), response.content)
+        self.assertEqual(compressed_response['ETag'], 'W/' + response['ETag'])
+        self.assertIn('Accept-Encoding', response['Vary'])
+
+    def test_can_return_not_modified_without_result_cache(self):
+        etag = self.client.get(reverse('campaign_list'), HTTP_ACCEPT_ENCODING='gzip')['ETag']
+        response = self.client.get(reverse('campaign_list'), HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        models.VoteCampaign.objects.update(question='How old are you')
+        response = self.client.get(reverse('campaign_list'), HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(RESULT_CACHE=RESULT_CACHE)
+    @patch('voting_backend.compression.compress_string', side_effect=compress_string)
+    def test_can_serve_cached_gzip_body(self, compress):
+        response = self.client.get(reverse('campaign_list'), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        with self.assertNumQueries(0):
+            for _ in range(3):
+                cached_response = self.client.get(reverse('campaign_list'), HTTP_ACCEPT_ENCODING='gzip')
+                self.assertEqual(cached_response.content, response.content)
+            not_modified_response = self.client.get(
+                reverse('campaign_list'),
+                HTTP_ACCEPT_ENCODING='gzip',
+                HTTP_IF_NONE_MATCH=response['ETag']
+            )
+        self.assertEqual(not_modified_response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(not_modified_response['ETag'], response['ETag'])
+        self.assertEqual(compress.call_count, 1)
+
+        # Same entry without gzip for client not accepting it
+        response = self.client.get(reverse('campaign_list'))
+        self.assertNotIn('Content-Encoding', response)
+        self.assertEqual(gzip.decompress(cached_response.content), response.content)
+
+    def test_can_serve_entry_cached_without_gzip_body(self):
+        entry = result_cache.ResultEntry(b'{}' * 200, '"etag"', 1, 0)
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip', HTTP_IF_NONE_MATCH='W/"other"')
+        response = result_cache.to_response(request, entry)
+        self.assertIsNone(entry.gzip_body)
+        self.assertEqual(response.content, entry.body)
+        self.assertEqual(response['ETag'], '"etag"')
+
+    def test_can_leave_stream_and_short_response_alone(self):
+        request = RequestFactory().get('/', HTTP_ACCEPT_ENCODING='gzip')
+        middleware = CompressionMiddleware(lambda request: StreamingHttpResponse(iter([b'data: 1\n\n'] * 100)))
+        self.assertNotIn('Content-Encoding', middleware(request))
+        campaign = models.VoteCampaign.objects.first()
+        response = self.client.get(reverse('campaign_detail', args=[campaign.campaign_id]), HTTP_ACCEPT_ENCODING='gzip')
+        self.assertLess(len(response.content), RESPONSE_COMPRESSION['MIN_LENGTH'])
+        self.assertNotIn('Content-Encoding', response)
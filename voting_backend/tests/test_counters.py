@@ -0,0 +1,83 @@
+import datetime
+import hashlib
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db.models import Sum
+from django.test import TestCase
+
+from voting_backend import counters, models
+
+
+class TestVoteCounter(TestCase):
+    multi_db = True
+
+    def setUp(self):
+        self.campaign = models.VoteCampaign.objects.create(
+            question='How are you',
+            start_time=datetime.datetime(2000, 1, 1, 0, 0, 0),
+            end_time=datetime.datetime(2000, 2, 1, 0, 0, 0)
+        )
+        self.first_option = models.VoteOption.objects.create(
+            campaign=self.campaign,
+            option_code='a',
+            option_detail='great'
+        )
+        self.second_option = models.VoteOption.objects.create(
+            campaign=self.campaign,
+            option_code='b',
+            option_detail='not great'
+        )
+        for hkid in ('A1234567', 'B1234567'):
+            models.VoteRecord.objects.create(
+                campaign=self.campaign,
+                option=self.first_option,
+                user_id=hashlib.sha256(hkid.encode('utf-8')).hexdigest()
+            )
+
+    def get_option_count(self, option):
+        return models.VoteCounter.objects.filter(option=option).aggregate(total=Sum('count'))['total']
+
+    def test_can_count_new_record(self):
+        self.assertEqual(self.get_option_count(self.first_option), 2)
+        self.assertFalse(models.VoteCounter.objects.filter(option=self.second_option).exists())
+
+    def test_can_pick_shard_within_campaign_shard_count(self):
+        shards = {counters.shard_for(str(ix), 4) for ix in range(100)}
+        self.assertEqual(shards, {0, 1, 2, 3})
+        self.assertEqual(counters.shard_for('A1234567', 1), 0)
+
+    def test_can_spread_votes_over_shards(self):
+        self.campaign.counter_shards = 1
+        self.campaign.save()
+        for ix in range(3):
+            models.VoteRecord.objects.create(
+                campaign=self.campaign,
+                option=self.second_option,
+                user_id=hashlib.sha256(str(ix).encode('utf-8')).hexdigest()
+            )
+        counter = models.VoteCounter.objects.get(option=self.second_option)
+        self.assertEqual((counter.shard, counter.count), (0, 3))
+
+    def test_can_find_no_drift(self):
+        self.assertEqual(counters.find_drift(), [])
+
+    def test_can_find_and_rebuild_drift(self):
+        models.VoteCounter.objects.filter(option=self.first_option).delete()
+        models.VoteCounter.objects.create(campaign=self.campaign, option=self.first_option, count=5)
+        models.VoteCounter.objects.create(campaign=self.campaign, option=self.second_option, count=1)
+        expected_drift = [
+            (self.campaign.campaign_id, self.first_option.id, 5, 2),
+            (self.campaign.campaign_id, self.second_option.id, 1, 0),
+        ]
+        self.assertEqual(counters.find_drift([self.campaign.campaign_id]), expected_drift)
+        self.assertEqual(counters.rebuild(), expected_drift)
+        self.assertEqual(counters.find_drift(), [])
+
+    def test_can_fail_check_command_on_drift(self):
+        models.VoteCounter.objects.filter(option=self.first_option).update(count=0)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_vote_counters', '--check', stdout=StringIO())
+        call_command('rebuild_vote_counters', stdout=StringIO())
+        self.assertEqual(self.get_option_count(self.first_option), 2)
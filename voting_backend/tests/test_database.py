@@ -0,0 +1,127 @@
+import json
+import time
+import unittest
+from unittest.mock import patch
+
+from django.db import OperationalError, connection, transaction
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from voting_backend import views
+from voting_backend.backends.postgresql import base
+from voting_backend.statement_timeout import statement_timeout
+
+requires_postgresql = unittest.skipUnless(connection.vendor == 'postgresql', 'PostgreSQL only')
+
+
+def get_statement_timeout():
+    with connection.cursor() as cursor:
+        cursor.execute('SHOW statement_timeout')
+        return cursor.fetchone()[0]
+
+
+@requires_postgresql
+class TestStatementTimeout(TestCase):
+    multi_db = True
+
+    def test_can_cancel_slow_query(self):
+        with statement_timeout(50):
+            with self.assertRaises(OperationalError), transaction.atomic():
+                with connection.cursor() as cursor:
+                    cursor.execute('SELECT pg_sleep(1)')
+        self.assertEqual(get_statement_timeout(), '0')
+
+    def test_can_reset_timeout_after_block(self):
+        with statement_timeout(2000):
+            self.assertEqual(get_statement_timeout(), '2s')
+        self.assertEqual(get_statement_timeout(), '0')
+
+
+@requires_postgresql
+@override_settings(DATABASE_STATEMENT_TIMEOUT=2000)
+class TestStatementTimeoutView(APITestCase):
+    multi_db = True
+
+    def test_can_serve_within_timeout(self):
+        response = self.client.get(reverse('campaign_list'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(get_statement_timeout(), '0')
+
+    def test_can_refresh_result_in_background_within_timeout(self):
+        view = views.CampaignOverviewListView()
+        with patch.object(view, 'get_result_data', get_statement_timeout):
+            entry = view.refresh_in_background('result:statement_timeout', 1)
+        self.assertEqual(json.loads(entry.body.decode('utf-8')), '2s')
+        self.assertEqual(get_statement_timeout(), '0')
+
+
+@requires_postgresql
+class TestDatabaseWrapper(TestCase):
+    """
+    Separate connections to the test database, queried outside the test transaction
+    """
+    multi_db = True
+
+    def get_connection(self, **settings):
+        wrapper = connection.copy()
+        wrapper.settings_dict.update(settings)
+        self.addCleanup(wrapper.close)
+        return wrapper
+
+    @staticmethod
+    def close_pools():
+        for connection_pool in base.pools.values():
+            connection_pool.closeall()
+        base.pools.clear()
+
+    def terminate(self, pid):
+        with connection.cursor() as cursor:
+            cursor.execute('SELECT pg_terminate_backend(%s)', [pid])
+            for _ in range(100):
+                cursor.execute('SELECT count(*) FROM pg_stat_activity WHERE pid = %s', [pid])
+                if not cursor.fetchone()[0]:
+                    return
+                time.sleep(0.01)
+
+    def test_can_replace_connection_dropped_by_server(self):
+        wrapper = self.get_connection(CONN_MAX_AGE=60, CONN_HEALTH_CHECKS=True)
+        wrapper.ensure_connection()
+        pid = wrapper.connection.get_backend_pid()
+        self.terminate(pid)
+
+        # Next request
+        wrapper.close_if_unusable_or_obsolete()
+        with wrapper.cursor() as cursor:
+            cursor.execute('SELECT 1')
+        self.assertNotEqual(wrapper.connection.get_backend_pid(), pid)
+
+    def test_can_reuse_pooled_connection(self):
+        # Pools close after their connections are returned
+        self.addCleanup(self.close_pools)
+        pool = {'MIN_SIZE': 1, 'MAX_SIZE': 1, 'TIMEOUT': 0.05}
+        wrapper = self.get_connection(CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=True, POOL=pool)
+        wrapper.ensure_connection()
+        pid = wrapper.connection.get_backend_pid()
+
+        # Pool has no free connection until the first one is returned
+        other_wrapper = self.get_connection(CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=True, POOL=pool)
+        with self.assertRaises(OperationalError):
+            other_wrapper.ensure_connection()
+        wrapper.close()
+        other_wrapper.ensure_connection()
+        self.assertEqual(other_wrapper.connection.get_backend_pid(), pid)
+
+    def test_can_replace_pooled_connection_dropped_by_server(self):
+        # Pools close after their connections are returned
+        self.addCleanup(self.close_pools)
+        pool = {'MIN_SIZE': 1, 'MAX_SIZE': 1, 'TIMEOUT': 0.05}
+        wrapper = self.get_connection(CONN_MAX_AGE=0, CONN_HEALTH_CHECKS=True, POOL=pool)
+        wrapper.ensure_connection()
+        pid = wrapper.connection.get_backend_pid()
+        wrapper.close()
+        self.terminate(pid)
+
+        wrapper.ensure_connection()
+        self.assertNotEqual(wrapper.connection.get_backend_pid(), pid)
@@ -0,0 +1,177 @@
+import datetime
+import hashlib
+import os
+from io import StringIO
+from unittest import TestCase
+from unittest.mock import patch
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from voting_backend import duplicates, ingestion, models
+from voting_backend.campaign_cache import campaign_cache
+from voting_backend.metrics import registry
+
+VOTE_FILTER = {
+    'ENABLED': True,
+    'ERROR_RATE': 0.001,
+    'MIN_CAPACITY': 1000,
+    'MAX_CAMPAIGNS': 64,
+    'REPEAT_CACHE_SIZE': 100,
+    'REPEAT_TIMEOUT': 60,
+    'CHECK_INTERVAL': 5,
+    'CACHE_ALIAS': 'default',
+}
+
+
+def get_user_id(hkid):
+    return hashlib.sha256(hkid.encode('utf-8')).hexdigest()
+
+
+class TestBloomFilter(TestCase):
+    def test_can_find_added_voters(self):
+        bloom = duplicates.BloomFilter(1000, 0.01)
+        user_ids = [os.urandom(32).hex() for _ in range(1000)]
+        for user_id in user_ids:
+            bloom.add(user_id)
+        self.assertTrue(all(user_id in bloom for user_id in user_ids))
+        self.assertFalse(bloom.is_full)
+        # About 1.2 bytes per voter at 1% false matches
+        self.assertEqual(bloom.nbytes, 1199)
+
+    def test_can_keep_false_matches_near_error_rate(self):
+        bloom = duplicates.BloomFilter(10000, 0.01)
+        for _ in range(10000):
+            bloom.add(os.urandom(32).hex())
+        false_matches = sum(os.urandom(16).hex() in bloom for _ in range(10000))
+        self.assertLess(false_matches, 300)
+
+
+@override_settings(VOTE_FILTER=VOTE_FILTER)
+class TestDuplicateVoteFilter(APITestCase):
+    multi_db = True
+
+    def setUp(self):
+        campaign_cache.clear()
+        duplicates.get_cache().delete(duplicates.GENERATION_KEY)
+        patcher = patch.object(duplicates, 'vote_filter', duplicates.DuplicateVoteFilter(
+            error_rate=0.001, min_capacity=1000, repeat_cache_size=100
+        ))
+        self.vote_filter = patcher.start()
+        self.addCleanup(patcher.stop)
+        now = datetime.datetime.now()
+        self.campaign = models.VoteCampaign.objects.create(
+            question='How are you',
+            start_time=now - datetime.timedelta(days=1),
+            end_time=now + datetime.timedelta(days=1)
+        )
+        self.option = models.VoteOption.objects.create(campaign=self.campaign, option_code='a', option_detail='great')
+        models.VoteRecord.objects.create(campaign=self.campaign, option=self.option, user_id=get_user_id('A1234567'))
+
+    def vote(self, hkid):
+        return self.client.post(reverse('vote', args=[self.campaign.campaign_id]), {'hkid': hkid, 'option_code': 'a'})
+
+    def test_can_reject_repeat_vote_without_insert(self):
+        self.assertEqual(self.vote('Y7280422').status_code, status.HTTP_201_CREATED)
+        # Match confirmed by a lookup, no insert attempted
+        with self.assertNumQueries(1):
+            response = self.vote('Y7280422')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(str(response.data['detail']), 'ALREADY_VOTE')
+        # Confirmed repeats are rejected without query
+        with self.assertNumQueries(0):
+            response = self.vote('Y7280422')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.vote_filter.stats()['rejections'], 2)
+
+    def test_can_warm_filter_from_stored_votes(self):
+        self.assertTrue(self.vote_filter.is_repeat(self.campaign.campaign_id, get_user_id('A1234567')))
+        self.assertFalse(self.vote_filter.is_repeat(self.campaign.campaign_id, get_user_id('Y7280422')))
+        stats = self.vote_filter.stats()
+        self.assertEqual(stats['campaigns'][self.campaign.campaign_id]['voters'], 1)
+        self.assertEqual(stats['bytes'], stats['campaigns'][self.campaign.campaign_id]['bytes'])
+
+    def test_can_accept_voter_matched_by_mistake(self):
+        self.vote_filter.add(self.campaign.campaign_id, get_user_id('Y7280422'))
+        self.assertEqual(self.vote('Y7280422').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.vote_filter.stats()['false_positives'], 1)
+
+    def test_can_fall_back_to_unique_constraint(self):
+        # Filter warmed before another process stored the vote
+        self.vote_filter.get_filter(self.campaign.campaign_id)
+        models.VoteRecord.objects.create(campaign=self.campaign, option=self.option, user_id=get_user_id('Y7280422'))
+        self.assertEqual(self.vote('Y7280422').status_code, status.HTTP_400_BAD_REQUEST)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.vote('Y7280422').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_can_record_vote_when_filter_fails(self):
+        with patch.object(self.vote_filter, 'add', side_effect=Exception), \
+                self.assertLogs('voting_backend.views', 'ERROR'):
+            self.assertEqual(self.vote('Y7280422').status_code, status.HTTP_201_CREATED)
+        self.assertTrue(models.VoteRecord.objects.filter(user_id=get_user_id('Y7280422')).exists())
+        self.assertEqual(self.vote('Y7280422').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_can_grow_full_filter(self):
+        bloom = self.vote_filter.get_filter(self.campaign.campaign_id)
+        for _ in range(bloom.capacity):
+            self.vote_filter.add(self.campaign.campaign_id, os.urandom(32).hex())
+        self.assertNotIn(self.campaign.campaign_id, self.vote_filter.filters)
+
+    def test_can_rebuild_filters_of_every_process(self):
+        self.vote_filter.get_filter(self.campaign.campaign_id)
+        out = StringIO()
+        call_command('rebuild_vote_filters', stdout=out)
+        self.assertIn(f'campaign {self.campaign.campaign_id}: 1 voter(s), capacity 1000', out.getvalue())
+
+        # Next check of the generation drops the filters
+        self.vote_filter.checked_at = None
+        self.vote_filter.check_generation()
+        self.assertEqual(self.vote_filter.filters, {})
+
+    def test_can_report_filter_size_in_metrics(self):
+        self.vote_filter.get_filter(self.campaign.campaign_id)
+        with patch('voting_backend.metrics.vote_filter', self.vote_filter):
+            counters = {name: value for name, _, value in registry.snapshot()['counters']}
+        self.assertEqual(counters['voting_vote_filter_bytes'], self.vote_filter.stats()['bytes'])
+
+
+@override_settings(VOTE_FILTER=VOTE_FILTER)
+class TestFilterOfWrittenVotes(APITransactionTestCase):
+    """
+    Voters written in batches join the filter once their transaction commits
+    """
+    def setUp(self):
+        campaign_cache.clear()
+        patcher = patch.object(duplicates, 'vote_filter', duplicates.DuplicateVoteFilter(min_capacity=1000))
+        self.vote_filter = patcher.start()
+        self.addCleanup(patcher.stop)
+        now = datetime.datetime.now()
+        self.campaign = models.VoteCampaign.objects.create(
+            question='How are you',
+            start_time=now - datetime.timedelta(days=1),
+            end_time=now + datetime.timedelta(days=1)
+        )
+        self.option = models.VoteOption.objects.create(campaign=self.campaign, option_code='a', option_detail='great')
+        # Filter warmed before the votes are written
+        self.vote_filter.get_filter(self.campaign.campaign_id)
+
+    def test_can_add_voters_of_batch(self):
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+        response = self.client.post(
+            reverse('vote_batch', args=[self.campaign.campaign_id]),
+            {'votes': [{'hkid': 'Y7280422', 'option_code': 'a'}]},
+            format='json'
+        )
+        self.assertEqual(response.data['results'], ['ACCEPTED'])
+        self.assertIn(get_user_id('Y7280422'), self.vote_filter.filters[self.campaign.campaign_id])
+
+    def test_can_add_voters_of_queue(self):
+        entries = [{'campaign_id': self.campaign.campaign_id, 'option_id': self.option.id,
+                    'user_id': get_user_id('Y7280422'), 'shard': 0}]
+        ingestion.write_votes(entries)
+        self.assertIn(get_user_id('Y7280422'), self.vote_filter.filters[self.campaign.campaign_id])
+        self.assertTrue(self.vote_filter.is_repeat(self.campaign.campaign_id, get_user_id('Y7280422')))
@@ -0,0 +1,80 @@
+import datetime
+import hashlib
+import json
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from voting_backend import models
+
+
+class TestVoteExport(APITestCase):
+    multi_db = True
+
+    def setUp(self):
+        self.campaign = models.VoteCampaign.objects.create(
+            question='How are you',
+            start_time=datetime.datetime(2000, 1, 1, 0, 0, 0),
+            end_time=datetime.datetime(2000, 2, 1, 0, 0, 0)
+        )
+        self.option = models.VoteOption.objects.create(
+            campaign=self.campaign,
+            option_code='a',
+            option_detail='great'
+        )
+        self.records = [
+            models.VoteRecord.objects.create(
+                campaign=self.campaign,
+                option=self.option,
+                user_id=hashlib.sha256(hkid.encode('utf-8')).hexdigest()
+            )
+            for hkid in ('A1234567', 'B1234567')
+        ]
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+
+    def get_streamed_lines(self, response):
+        return b''.join(response.streaming_content).decode('utf-8').splitlines()
+
+    def test_can_prevent_export_by_non_admin(self):
+        response = self.client.get(reverse('record_export'))
+        self.assertIn(response.status_code, (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
+
+    def test_can_stream_records_as_csv(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(reverse('record_export'), {'campaign': self.campaign.campaign_id})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        lines = self.get_streamed_lines(response)
+        self.assertEqual(lines[0], 'record_id,campaign_id,option_code,user_id,create_time')
+        self.assertEqual([line.split(',')[3] for line in lines[1:]], [record.user_id for record in self.records])
+
+    def test_can_stream_results_as_ndjson(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(reverse('result_export'), {'output': 'ndjson'})
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertEqual([json.loads(line) for line in self.get_streamed_lines(response)], [{
+            'campaign_id': self.campaign.campaign_id,
+            'option_code': 'a',
+            'option_detail': 'great',
+            'number_of_vote': 2,
+        }])
+
+    def test_can_filter_records_by_time_range(self):
+        self.client.force_authenticate(self.admin)
+        response = self.client.get(reverse('record_export'), {'end': '2000-01-01T00:00:00'})
+        self.assertEqual(len(self.get_streamed_lines(response)), 1)
+
+    def test_can_reject_invalid_filter(self):
+        self.client.force_authenticate(self.admin)
+        for params in ({'output': 'xml'}, {'start': 'yesterday'}, {'campaign': 'a'}):
+            response = self.client.get(reverse('record_export'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_can_export_records_by_command(self):
+        output = StringIO()
+        call_command('export_votes', '--campaign', str(self.campaign.campaign_id), '--format', 'ndjson', stdout=output)
+        rows = [json.loads(line) for line in output.getvalue().splitlines()]
+        self.assertEqual([row['record_id'] for row in rows], [record.id for record in self.records])
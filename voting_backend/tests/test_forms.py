@@ -1,3 +1,6 @@
+import random
+import re
+import string
 from unittest import TestCase
 
 from django.core.exceptions import ValidationError
@@ -25,6 +28,75 @@ class TestHKIDField(TestCase):
         cleaned_value = self.field.clean('y7280422')
         self.assertEqual(cleaned_value, 'Y7280422')
 
+    def test_can_clean_many_hkid(self):
+        cleaned_values = self.field.clean_many(['y7280422', 'Y728042A', '!@#$%', None])
+        self.assertEqual(cleaned_values, [
+            ('Y7280422', None),
+            (None, 'INCORRECT_CHECKSUM'),
+            (None, 'INCORRECT_PATTERN'),
+            (None, 'INCORRECT_PATTERN'),
+        ])
+
+
+def check_hkid_by_definition(value):
+    """
+    Check an HKID one character at a time as the HKID check digit is defined, as reference for the tables
+    """
+    if not re.match('^[A-Z]{1,2}[0-9]{6}[A0-9]$', value):
+        return forms.INCORRECT_PATTERN
+    # 58 weighted 9, then every character before the check digit weighted from 8 down
+    digit_sum = 58 * 9 + sum((8 - index) * int(char, 36) for index, char in enumerate(value[:-1]))
+    if '0A987654321'[digit_sum % 11] != value[-1]:
+        return forms.INCORRECT_CHECKSUM
+    return None
+
+
+class TestHKIDValidator(TestCase):
+    """
+    Randomized equivalence of the table-driven validator with the definition of the HKID check digit
+    """
+    def setUp(self):
+        self.random = random.Random(2018)
+
+    def get_shaped_hkid(self):
+        prefix = ''.join(self.random.choice(string.ascii_uppercase) for _ in range(self.random.randint(1, 2)))
+        digits = ''.join(self.random.choice(string.digits) for _ in range(6))
+        return prefix + digits + self.random.choice('A0123456789')
+
+    def get_random_string(self):
+        alphabet = string.ascii_uppercase + string.digits + 'a !'
+        return ''.join(self.random.choice(alphabet) for _ in range(self.random.randint(0, 11)))
+
+    def assert_equivalent(self, values):
+        expected = [check_hkid_by_definition(value) for value in values]
+        self.assertEqual([forms.check_hkid(value) for value in values], expected)
+        self.assertEqual(forms.check_hkids(values), expected)
+
+    def test_can_check_like_definition_on_shaped_hkid(self):
+        values = [self.get_shaped_hkid() for _ in range(20000)]
+        self.assert_equivalent(values)
+        # Every check digit is drawn, so most shaped HKIDs fail the checksum and some pass it
+        errors = set(forms.check_hkids(values))
+        self.assertEqual(errors, {None, forms.INCORRECT_CHECKSUM})
+
+    def test_can_check_like_definition_on_random_string(self):
+        self.assert_equivalent([self.get_random_string() for _ in range(20000)])
+
+    def test_can_check_known_hkid(self):
+        self.assertEqual(forms.check_hkids(['Y7280422', 'AB9876543', 'G123456A', 'Y7280423']), [
+            None,
+            None,
+            None,
+            forms.INCORRECT_CHECKSUM,
+        ])
+
+    def test_can_accept_check_digit_zero_on_remainder_zero(self):
+        # Weighted sum of Y000013 is a multiple of 11
+        self.assertEqual(forms.get_digit_sum('Y000013') % 11, 0)
+        self.assertIsNone(forms.check_hkid('Y0000130'))
+        for check_digit in 'A123456789':
+            self.assertEqual(forms.check_hkid('Y000013' + check_digit), forms.INCORRECT_CHECKSUM)
+
 
 class TestVoteRecordForm(TestCase):
     form = forms.VoteRecordForm
@@ -0,0 +1,148 @@
+import datetime
+import hashlib
+import hmac
+from io import StringIO
+
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from voting_backend import hashers, models
+from voting_backend.campaign_cache import campaign_cache
+
+HASHERS = [
+    'voting_backend.hashers.SHA256VoterIDHasher',
+    'voting_backend.hashers.BLAKE2bVoterIDHasher',
+    'voting_backend.hashers.HMACSHA256VoterIDHasher',
+]
+VOTER_ID_HASHING = {'HASHERS': HASHERS, 'ALGORITHM': 'blake2b', 'KEY': 'voter-id-key'}
+
+
+def sha256(hkid):
+    return hashlib.sha256(hkid.encode('utf-8')).hexdigest()
+
+
+@override_settings(VOTER_ID_HASHING=VOTER_ID_HASHING)
+class TestVoterIDHasher(TestCase):
+    def test_can_hash_with_each_algorithm(self):
+        digest = hashlib.sha256(b'Y7280422').digest()
+        self.assertEqual(hashers.hash_voter_id('Y7280422', 'sha256'), sha256('Y7280422'))
+        self.assertEqual(
+            hashers.hash_voter_id('Y7280422', 'blake2b'),
+            hashlib.blake2b(digest, key=b'voter-id-key', digest_size=16).hexdigest()
+        )
+        self.assertEqual(
+            hashers.hash_voter_id('Y7280422', 'hmac_sha256'),
+            hmac.new(b'voter-id-key', digest, hashlib.sha256).hexdigest()
+        )
+
+    def test_can_rehash_plain_sha256(self):
+        for algorithm in ('blake2b', 'hmac_sha256'):
+            hasher = hashers.get_hasher(algorithm)
+            self.assertEqual(hasher.rehash(sha256('Y7280422')), hasher.hash('Y7280422'))
+
+    def test_can_key_hash(self):
+        digest = hashers.hash_voter_id('Y7280422', 'blake2b')
+        with self.settings(VOTER_ID_HASHING=dict(VOTER_ID_HASHING, KEY='other-key')):
+            self.assertNotEqual(hashers.hash_voter_id('Y7280422', 'blake2b'), digest)
+
+    def test_can_refuse_keyed_hash_without_key(self):
+        with self.settings(VOTER_ID_HASHING=dict(VOTER_ID_HASHING, KEY='')):
+            with self.assertRaises(ImproperlyConfigured):
+                hashers.get_hasher('blake2b')
+        with self.assertRaises(ImproperlyConfigured):
+            hashers.get_hasher('md5')
+
+
+@override_settings(VOTER_ID_HASHING=VOTER_ID_HASHING)
+class TestVoterIDRehash(APITestCase):
+    multi_db = True
+
+    def setUp(self):
+        campaign_cache.clear()
+        now = datetime.datetime.now()
+        self.closed_campaign = self.create_campaign(now - datetime.timedelta(days=2), now - datetime.timedelta(days=1))
+        self.active_campaign = self.create_campaign(now - datetime.timedelta(days=1), now + datetime.timedelta(days=1))
+
+    @staticmethod
+    def create_campaign(start_time, end_time):
+        campaign = models.VoteCampaign.objects.create(
+            question='How are you',
+            start_time=start_time,
+            end_time=end_time,
+            voter_id_algorithm='sha256'
+        )
+        option = models.VoteOption.objects.create(campaign=campaign, option_code='a', option_detail='great')
+        for hkid in ('A1234567', 'B1234567'):
+            models.VoteRecord.objects.create(campaign=campaign, option=option, user_id=sha256(hkid))
+        return campaign
+
+    def vote(self, campaign, hkid):
+        return self.client.post(reverse('vote', args=[campaign.campaign_id]), {'hkid': hkid, 'option_code': 'a'})
+
+    def test_can_hash_votes_of_new_campaign_with_default_algorithm(self):
+        now = datetime.datetime.now()
+        campaign = models.VoteCampaign.objects.create(
+            question='How old are you',
+            start_time=now - datetime.timedelta(days=1),
+            end_time=now + datetime.timedelta(days=1)
+        )
+        models.VoteOption.objects.create(campaign=campaign, option_code='a', option_detail='great')
+        self.assertEqual(campaign.voter_id_algorithm, 'blake2b')
+
+        response = self.vote(campaign, 'Y7280422')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        record = models.VoteRecord.objects.get(campaign=campaign)
+        self.assertEqual(record.user_id, hashers.hash_voter_id('Y7280422', 'blake2b'))
+        self.assertEqual(len(bytes.fromhex(record.user_id)), 16)
+        self.assertEqual(self.vote(campaign, 'Y7280422').status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_can_rehash_closed_campaign(self):
+        out = StringIO()
+        call_command('rehash_voter_ids', batch_size=1, stdout=out)
+        self.assertIn(f'campaign {self.closed_campaign.campaign_id}: rehashed 2 voter ID(s)', out.getvalue())
+        self.assertIn(f'campaign {self.active_campaign.campaign_id}: open for votes', out.getvalue())
+
+        self.closed_campaign.refresh_from_db()
+        self.assertEqual(self.closed_campaign.voter_id_algorithm, 'blake2b')
+        self.assertEqual(
+            set(models.VoteRecord.objects.filter(campaign=self.closed_campaign).values_list('user_id', flat=True)),
+            {hashers.hash_voter_id(hkid, 'blake2b') for hkid in ('A1234567', 'B1234567')}
+        )
+        # Voters of the active campaign are still found by their plain SHA-256
+        self.active_campaign.refresh_from_db()
+        self.assertEqual(self.active_campaign.voter_id_algorithm, 'sha256')
+        self.assertEqual(self.vote(self.active_campaign, 'A1234567').status_code, status.HTTP_400_BAD_REQUEST)
+
+        # Rehashed campaigns are skipped
+        self.assertIsNone(hashers.rehash_campaign(self.closed_campaign.campaign_id, 'blake2b'))
+
+    def test_can_resume_interrupted_rehash(self):
+        first, second = models.VoteRecord.objects.filter(campaign=self.closed_campaign).order_by('id')
+        # State left by a run interrupted after its first batch
+        models.VoteRecord.objects.filter(id=first.id).update(user_id=hashers.get_hasher('blake2b').rehash(first.user_id))
+        models.VoteCampaign.objects.filter(campaign_id=self.closed_campaign.campaign_id).update(
+            voter_id_rehash_algorithm='blake2b',
+            voter_id_rehashed_to=first.id
+        )
+        with self.assertRaises(ImproperlyConfigured):
+            hashers.rehash_campaign(self.closed_campaign.campaign_id, 'hmac_sha256')
+
+        self.assertEqual(hashers.rehash_campaign(self.closed_campaign.campaign_id, 'blake2b', batch_size=1), 1)
+        self.closed_campaign.refresh_from_db()
+        self.assertEqual(self.closed_campaign.voter_id_algorithm, 'blake2b')
+        self.assertEqual(self.closed_campaign.voter_id_rehash_algorithm, '')
+        self.assertIsNone(self.closed_campaign.voter_id_rehashed_to)
+        self.assertEqual(
+            set(models.VoteRecord.objects.filter(campaign=self.closed_campaign).values_list('user_id', flat=True)),
+            {hashers.hash_voter_id(hkid, 'blake2b') for hkid in ('A1234567', 'B1234567')}
+        )
+
+    def test_can_refuse_rehash_into_plain_sha256(self):
+        with self.settings(VOTER_ID_HASHING=dict(VOTER_ID_HASHING, ALGORITHM='sha256')):
+            with self.assertRaises(CommandError):
+                call_command('rehash_voter_ids', stdout=StringIO())
@@ -0,0 +1,208 @@
+import datetime
+import hashlib
+import json
+import os
+import shutil
+import tempfile
+from unittest.mock import patch
+
+from django.db.models import Sum
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from voting_backend import ingestion, models
+from voting_backend.metrics import registry
+
+
+def hash_hkid(hkid):
+    return hashlib.sha256(hkid.encode('utf-8')).hexdigest()
+
+
+class IngestionTestMixin:
+    def setUp(self):
+        self.journal_dir = tempfile.mkdtemp()
+        self.queue = ingestion.VoteIngestionQueue(self.journal_dir, batch_size=2, fsync=False)
+        self.campaign = models.VoteCampaign.objects.create(
+            question='How are you',
+            start_time=datetime.datetime(2000, 1, 1, 0, 0, 0),
+            end_time=datetime.datetime(2000, 2, 1, 0, 0, 0)
+        )
+        self.option = models.VoteOption.objects.create(
+            campaign=self.campaign,
+            option_code='a',
+            option_detail='great'
+        )
+        models.VoteRecord.objects.create(
+            campaign=self.campaign,
+            option=self.option,
+            user_id=hash_hkid('Y7280422')
+        )
+
+    def tearDown(self):
+        self.queue.journal.close()
+        shutil.rmtree(self.journal_dir)
+
+
+class TestVoteIngestionQueue(IngestionTestMixin, TestCase):
+    multi_db = True
+
+    def submit(self, hkid, queue=None):
+        return (queue or self.queue).submit(models.VoteRecord(
+            campaign=self.campaign,
+            option=self.option,
+            user_id=hash_hkid(hkid)
+        ))
+
+    def get_vote_count(self):
+        return models.VoteCounter.objects.filter(option=self.option).aggregate(total=Sum('count'))['total']
+
+    def test_can_journal_accepted_vote(self):
+        self.assertTrue(self.submit('Q7853943'))
+        with open(self.queue.journal_path) as journal:
+            entries = [json.loads(line) for line in journal]
+        self.assertEqual([entry['user_id'] for entry in entries], [hash_hkid('Q7853943')])
+        self.assertFalse(models.VoteRecord.objects.filter(user_id=hash_hkid('Q7853943')).exists())
+
+    def test_can_reject_repeated_vote(self):
+        self.assertFalse(self.submit('Y7280422'))
+        self.assertTrue(self.submit('Q7853943'))
+        self.assertFalse(self.submit('Q7853943'))
+
+    def test_can_keep_recent_voters_bounded(self):
+        self.queue.max_recent_voters = 1
+        self.submit('Q7853943')
+        self.submit('A1234567')
+        self.assertEqual(list(self.queue.recent_voters), [(self.campaign.campaign_id, hash_hkid('A1234567'))])
+        ingestion.forget_campaign(self.campaign.campaign_id)
+        with patch.object(ingestion, '_queue', self.queue):
+            ingestion.forget_campaign(self.campaign.campaign_id)
+        self.assertFalse(self.queue.recent_voters)
+
+    def get_other_queue(self):
+        """
+        Queue of another process sharing the journal directory
+        """
+        queue = ingestion.VoteIngestionQueue(self.journal_dir, batch_size=2, fsync=False)
+        self.addCleanup(queue.journal.close)
+        return queue
+
+    def test_can_reject_voter_written_by_other_process(self):
+        self.assertTrue(self.submit('Q7853943'))
+        self.queue.flush()
+        self.assertFalse(self.submit('Q7853943', self.get_other_queue()))
+
+    def test_can_report_voter_queued_by_two_processes(self):
+        other_queue = self.get_other_queue()
+        self.assertTrue(self.submit('Q7853943'))
+        # Not written yet, so the other process cannot tell
+        self.assertTrue(self.submit('Q7853943', other_queue))
+        self.queue.flush()
+        key = ('voting_ingestion_repeats_total', ())
+        repeats = registry.counters.get(key, 0)
+        with self.assertLogs('voting_backend.ingestion', 'WARNING') as logs:
+            other_queue.flush()
+        self.assertIn('Dropped 1 accepted vote(s)', logs.output[0])
+        self.assertEqual(registry.counters[key], repeats + 1)
+        self.assertEqual(models.VoteRecord.objects.filter(campaign=self.campaign).count(), 2)
+
+    def test_can_flush_queue_with_counters(self):
+        for hkid in ('Q7853943', 'A1234567', 'B1234567'):
+            self.submit(hkid)
+        self.queue.flush()
+        self.assertEqual(models.VoteRecord.objects.filter(campaign=self.campaign).count(), 4)
+        self.assertEqual(self.get_vote_count(), 4)
+        self.assertEqual(os.listdir(self.journal_dir), [os.path.basename(self.queue.journal_path)])
+
+    def test_can_replay_journal_of_dead_process(self):
+        entries = [
+            {'campaign_id': self.campaign.campaign_id, 'option_id': self.option.id,
+             'user_id': hash_hkid(hkid), 'shard': 0}
+            for hkid in ('Y7280422', 'Q7853943')
+        ]
+        path = os.path.join(self.journal_dir, 'journal-999999999.log')
+        with open(path, 'w') as journal:
+            journal.write(''.join(json.dumps(entry) + '\n' for entry in entries))
+            # Entry cut by crash was never acknowledged
+            journal.write('{"campaign_id"')
+        self.queue.recover()
+        self.assertFalse(os.path.exists(path))
+        self.assertEqual(models.VoteRecord.objects.filter(campaign=self.campaign).count(), 2)
+        self.assertEqual(self.get_vote_count(), 2)
+
+    def write_journal(self, name, hkids):
+        with open(os.path.join(self.journal_dir, name), 'w') as journal:
+            for hkid in hkids:
+                journal.write(json.dumps({'campaign_id': self.campaign.campaign_id, 'option_id': self.option.id,
+                                          'user_id': hash_hkid(hkid), 'shard': 0}) + '\n')
+
+    def test_can_replay_journal_of_previous_process_with_same_pid(self):
+        pid = os.getpid()
+        self.write_journal(f'journal-{pid}-deadbeef.log', ['Q7853943'])
+        self.write_journal(f'flushing-{pid}-deadbeef-1.log', ['A1234567'])
+        # Named before journals had an instance token
+        self.write_journal(f'journal-{pid}.log', ['B1234567'])
+        self.write_journal(f'journal-{pid}-deadbeef.log.{pid}-cafebabe.replay', ['C1234567'])
+        self.submit('D1234567')
+        self.queue.recover()
+        self.queue.flush()
+        self.assertEqual(models.VoteRecord.objects.filter(campaign=self.campaign).count(), 6)
+        self.assertEqual(os.listdir(self.journal_dir), [os.path.basename(self.queue.journal_path)])
+
+    def test_can_quarantine_failing_segment(self):
+        poisoned_user_id = hash_hkid('A1234567')
+        write = self.queue.write
+
+        def write_unless_poisoned(entries, **kwargs):
+            if any(entry['user_id'] == poisoned_user_id for entry in entries):
+                raise ValueError('Poisoned entry')
+            return write(entries, **kwargs)
+
+        self.submit('A1234567')
+        with patch.object(self.queue, 'write', side_effect=write_unless_poisoned), \
+                self.assertLogs('voting_backend.ingestion', 'ERROR') as logs:
+            with self.assertRaises(ValueError):
+                self.queue.flush()
+            (segment,) = self.queue.failed_segments
+            for attempt in range(self.queue.max_segment_attempts):
+                # Votes accepted since are written meanwhile
+                self.submit(f'Q{7853943 + attempt}')
+                self.queue.flush()
+        self.assertEqual(self.queue.failed_segments, {})
+        self.assertIn('moved to', logs.output[-1])
+        self.assertTrue(os.path.exists(segment + ingestion.QUARANTINE_SUFFIX))
+        self.assertEqual(
+            models.VoteRecord.objects.filter(campaign=self.campaign).count(),
+            1 + self.queue.max_segment_attempts
+        )
+
+
+class TestQueuedVoteRecordView(IngestionTestMixin, APITestCase):
+    multi_db = True
+
+    def setUp(self):
+        super().setUp()
+        patcher = patch('voting_backend.ingestion.get_queue', return_value=self.queue)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @patch('django.utils.timezone.now', return_value=datetime.datetime(2000, 1, 1, 0, 0, 0))
+    def test_can_accept_vote_in_queue_mode(self, mock_datetime):
+        with override_settings(VOTE_INGESTION={'MODE': 'queue'}):
+            response = self.client.post(
+                reverse('vote', args=[self.campaign.campaign_id]),
+                data={'hkid': 'Q7853943', 'option_code': 'a'}
+            )
+        self.assertEqual(response.status_code, status.HTTP_202_ACCEPTED)
+        self.assertEqual(len(self.queue.pending), 1)
+
+    @patch('django.utils.timezone.now', return_value=datetime.datetime(2000, 1, 1, 0, 0, 0))
+    def test_can_prevent_vote_if_already_voted_in_queue_mode(self, mock_datetime):
+        with override_settings(VOTE_INGESTION={'MODE': 'queue'}):
+            response = self.client.post(
+                reverse('vote', args=[self.campaign.campaign_id]),
+                data={'hkid': 'Y7280422', 'option_code': 'a'}
+            )
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(str(response.data['detail']), 'ALREADY_VOTE')
@@ -0,0 +1,141 @@
+import datetime
+import hashlib
+import json
+from unittest.mock import patch
+
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from voting_backend import live, models
+
+LIVE_RESULTS = {
+    'INTERVAL': 1,
+    'HEARTBEAT': 0.01,
+    'MAX_DURATION': 60,
+    'RETRY': 3,
+    'POLL_TIMEOUT': 0.01,
+}
+
+
+class LiveTestMixin:
+    def setUp(self):
+        self.broadcaster = live.TallyBroadcaster(interval=0)
+        # Results are loaded by calling poll_once, within the test transaction
+        self.broadcaster.ensure_started = lambda: None
+        patcher = patch.object(live, 'broadcaster', self.broadcaster)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.campaign = models.VoteCampaign.objects.create(
+            question='How are you',
+            start_time=datetime.datetime(2000, 1, 1, 0, 0, 0),
+            end_time=datetime.datetime(2000, 2, 1, 0, 0, 0)
+        )
+        self.option = models.VoteOption.objects.create(
+            campaign=self.campaign,
+            option_code='a',
+            option_detail='great'
+        )
+
+    def add_vote(self, hkid):
+        models.VoteRecord.objects.create(
+            campaign=self.campaign,
+            option=self.option,
+            user_id=hashlib.sha256(hkid.encode('utf-8')).hexdigest()
+        )
+
+    @staticmethod
+    def close_response(response):
+        """
+        Close a stream before its end, keeping the database connection of the test transaction
+        """
+        with patch.object(connection, 'close_if_unusable_or_obsolete'):
+            response.close()
+
+
+class TestTallyBroadcaster(LiveTestMixin, TestCase):
+    multi_db = True
+
+    def test_can_share_results_among_subscribers(self):
+        campaign_id = self.campaign.campaign_id
+        self.broadcaster.subscribe(campaign_id)
+        self.broadcaster.subscribe(campaign_id)
+        with self.assertNumQueries(2):
+            self.broadcaster.poll_once()
+        entry = self.broadcaster.wait(campaign_id, timeout=0)
+        self.assertEqual(json.loads(entry.body.decode('utf-8'))['options'][0]['number_of_vote'], 0)
+        self.assertEqual(self.broadcaster.wait(campaign_id, [entry.etag], timeout=0), entry)
+
+        self.add_vote('Y7280422')
+        self.broadcaster.poll_once()
+        new_entry = self.broadcaster.wait(campaign_id, [entry.etag], timeout=0)
+        self.assertNotEqual(new_entry.etag, entry.etag)
+        self.assertEqual(json.loads(new_entry.body.decode('utf-8'))['options'][0]['number_of_vote'], 1)
+
+    def test_can_stop_loading_without_subscriber(self):
+        campaign_id = self.campaign.campaign_id
+        self.broadcaster.subscribe(campaign_id)
+        self.broadcaster.poll_once()
+        self.broadcaster.unsubscribe(campaign_id)
+        self.assertEqual(self.broadcaster.entries, {})
+        with self.assertNumQueries(0):
+            self.broadcaster.poll_once()
+
+
+@override_settings(LIVE_RESULTS=LIVE_RESULTS)
+class TestCampaignLiveView(LiveTestMixin, APITestCase):
+    multi_db = True
+
+    def test_can_stream_result_events(self):
+        response = self.client.get(reverse('campaign_live', args=[self.campaign.campaign_id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response['Content-Type'], 'text/event-stream')
+        events = iter(response.streaming_content)
+        self.assertEqual(next(events), b'retry: 3000\n\n')
+        self.assertEqual(next(events), b': keep-alive\n\n')
+
+        self.broadcaster.poll_once()
+        event = next(events).decode('utf-8')
+        entry = self.broadcaster.entries[self.campaign.campaign_id]
+        self.assertEqual(event, 'id: {}\nevent: result\ndata: {}\n\n'.format(
+            entry.etag.strip('"'), entry.body.decode('utf-8')
+        ))
+        self.close_response(response)
+        self.assertEqual(self.broadcaster.subscribers, {})
+
+    def test_can_resume_from_last_event_id(self):
+        self.broadcaster.subscribe(self.campaign.campaign_id)
+        self.broadcaster.poll_once()
+        etag = self.broadcaster.entries[self.campaign.campaign_id].etag
+        response = self.client.get(
+            reverse('campaign_live', args=[self.campaign.campaign_id]),
+            HTTP_LAST_EVENT_ID=etag.strip('"')
+        )
+        events = iter(response.streaming_content)
+        next(events)
+        self.assertEqual(next(events), b': keep-alive\n\n')
+        self.close_response(response)
+
+    def test_can_identify_campaign_not_exist(self):
+        response = self.client.get(reverse('campaign_live', args=[self.campaign.campaign_id + 1]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+@override_settings(LIVE_RESULTS=LIVE_RESULTS)
+class TestCampaignPollView(LiveTestMixin, APITestCase):
+    multi_db = True
+
+    def test_can_answer_at_once_without_asgi_handler(self):
+        url = reverse('campaign_poll', args=[self.campaign.campaign_id])
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.content, self.client.get(reverse('campaign_detail', args=[self.campaign.campaign_id])).content)
+
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_can_identify_campaign_not_exist(self):
+        response = self.client.get(reverse('campaign_poll', args=[self.campaign.campaign_id + 1]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
@@ -0,0 +1,146 @@
+import datetime
+import json
+import os
+import shutil
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from django.conf import settings
+from django.urls import reverse
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from voting_backend import metrics, models
+
+
+class TestRegistry(TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.registry = metrics.Registry(self.directory, flush_interval=0)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_can_render_counter_and_histogram(self):
+        self.registry.inc('voting_exceptions_total', (('view', 'vote'), ('exception', 'AlreadyVoteException')))
+        self.registry.observe('voting_db_queries_per_request', 2, (('view', 'vote'),))
+        self.registry.observe('voting_db_queries_per_request', 4, (('view', 'vote'),))
+        output = metrics.render([self.registry.snapshot()])
+        self.assertIn('# TYPE voting_db_queries_per_request histogram', output)
+        self.assertIn('voting_exceptions_total{view="vote",exception="AlreadyVoteException"} 1', output)
+        self.assertIn('voting_db_queries_per_request_bucket{view="vote",le="2"} 1', output)
+        self.assertIn('voting_db_queries_per_request_bucket{view="vote",le="5"} 2', output)
+        self.assertIn('voting_db_queries_per_request_bucket{view="vote",le="+Inf"} 2', output)
+        self.assertIn('voting_db_queries_per_request_sum{view="vote"} 6', output)
+        self.assertIn('voting_db_queries_per_request_count{view="vote"} 2', output)
+
+    def test_can_collect_metrics_of_other_processes(self):
+        other = metrics.Registry(self.directory)
+        other.inc('voting_http_requests_total', (('view', 'vote'),), 3)
+        other.observe('voting_http_request_duration_seconds', 0.02, (('view', 'vote'),))
+        snapshot = other.snapshot()
+        with open(os.path.join(self.directory, 'metrics-1.json'), 'w') as file:
+            json.dump(snapshot, file)
+
+        self.registry.inc('voting_http_requests_total', (('view', 'vote'),), 2)
+        self.registry.maybe_flush()
+        self.assertTrue(os.path.exists(self.registry.get_path()))
+        counters, histograms = metrics.merge(self.registry.collect())
+        self.assertEqual(counters[('voting_http_requests_total', (('view', 'vote'),))], 5)
+        self.assertEqual(sum(histograms[('voting_http_request_duration_seconds', (('view', 'vote'),))][0]), 1)
+
+    def write_snapshot(self, pid, requests, cache_size):
+        with open(self.registry.get_path(pid), 'w') as file:
+            json.dump({
+                'counters': [
+                    ['voting_http_requests_total', [['view', 'vote']], requests],
+                    ['voting_campaign_cache_size', [], cache_size],
+                ],
+                'histograms': [],
+            }, file)
+
+    @patch('voting_backend.metrics.is_process_alive', side_effect=lambda pid: pid != 999999999)
+    def test_can_archive_metrics_of_stopped_processes(self, is_process_alive):
+        self.write_snapshot(999999999, 3, 10)
+        self.write_snapshot(1, 2, 5)
+        for _ in range(2):
+            counters, _ = metrics.merge(self.registry.collect())
+            self.assertEqual(counters[('voting_http_requests_total', (('view', 'vote'),))], 5)
+            # Gauge of the stopped process is dropped
+            self.assertEqual(counters[('voting_campaign_cache_size', ())], 5 + metrics.campaign_cache.stats()['size'])
+        self.assertFalse(os.path.exists(self.registry.get_path(999999999)))
+        self.assertTrue(os.path.exists(os.path.join(self.directory, metrics.ARCHIVE_NAME)))
+
+    def test_can_keep_counters_of_stopped_process_with_same_pid(self):
+        self.write_snapshot(os.getpid(), 3, 10)
+        self.registry.inc('voting_http_requests_total', (('view', 'vote'),), 2)
+        self.registry.flush()
+        counters, _ = metrics.merge(self.registry.collect())
+        self.assertEqual(counters[('voting_http_requests_total', (('view', 'vote'),))], 5)
+
+
+class TestMetricsMiddleware(APITestCase):
+    multi_db = True
+
+    def setUp(self):
+        self.registry = metrics.Registry()
+        patcher = patch.object(metrics, 'registry', self.registry)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        now = timezone.now()
+        self.campaign = models.VoteCampaign.objects.create(
+            question='How are you',
+            start_time=now - datetime.timedelta(days=1),
+            end_time=now + datetime.timedelta(days=1)
+        )
+        models.VoteOption.objects.create(
+            campaign=self.campaign,
+            option_code='a',
+            option_detail='great'
+        )
+
+    def get_counters(self):
+        return metrics.merge([self.registry.snapshot()])
+
+    def test_can_record_request_metrics(self):
+        self.client.get(reverse('campaign_list'))
+        counters, histograms = self.get_counters()
+        view = (('view', 'campaign_list'),)
+        self.assertEqual(counters[('voting_http_requests_total', view + (('method', 'GET'), ('status', '200')))], 1)
+        counts, total = histograms[('voting_db_queries_per_request', view)]
+        self.assertEqual((sum(counts), total), (1, 1))
+        self.assertGreater(counters[('voting_serializer_duration_seconds_total', view)], 0)
+        self.assertIn(('voting_http_request_duration_seconds', view + (('method', 'GET'),)), histograms)
+
+    def test_can_count_exceptions(self):
+        url = reverse('vote', args=[self.campaign.campaign_id])
+        self.client.post(url, {'hkid': 'Y7280422', 'option_code': 'a'})
+        response = self.client.post(url, {'hkid': 'Y7280422', 'option_code': 'a'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        counters, _ = self.get_counters()
+        key = ('voting_exceptions_total', (('view', 'vote'), ('exception', 'AlreadyVoteException')))
+        self.assertEqual(counters[key], 1)
+
+    def test_can_expose_metrics(self):
+        self.client.get(reverse('campaign_list'))
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        output = response.content.decode('utf-8')
+        self.assertIn('voting_http_requests_total{view="campaign_list",method="GET",status="200"} 1', output)
+        self.assertNotIn('view="metrics"', output)
+
+    def test_can_prevent_metrics_outside_allowed_networks(self):
+        response = self.client.get('/metrics', REMOTE_ADDR='203.0.113.1')
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+        with self.settings(METRICS=dict(settings.METRICS, ALLOWED_NETWORKS=['203.0.113.0/24'])):
+            response = self.client.get('/metrics', REMOTE_ADDR='203.0.113.1')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_can_label_unknown_method_as_other(self):
+        self.client.generic('PROPFIND', reverse('campaign_list'))
+        counters, _ = self.get_counters()
+        methods = {dict(labels)['method'] for name, labels in counters if name == 'voting_http_requests_total'}
+        self.assertEqual(methods, {'other'})
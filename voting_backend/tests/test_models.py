@@ -1,4 +1,5 @@
 import datetime
+import hashlib
 from unittest.mock import patch
 
 from django.core.exceptions import ValidationError
@@ -25,16 +26,22 @@ class TestVoteCampaignModel(TestCase):
     
     @patch('django.utils.timezone.now', return_value=datetime.datetime(2000, 2, 1, 0, 0, 0))
     def test_can_identify_closed_status(self, mock_datetime):
-        self.assertEqual(self.campaign.status, 'CLOSED')
+        self.assertEqual(self.campaign.get_status(), 'CLOSED')
     
     @patch('django.utils.timezone.now', return_value=datetime.datetime(2000, 1, 1, 0, 0, 0))
     def test_can_identify_active_status(self, mock_datetime):
-        self.assertEqual(self.campaign.status, 'ACTIVE')
+        self.assertEqual(self.campaign.get_status(), 'ACTIVE')
 
     @patch('django.utils.timezone.now', return_value=datetime.datetime(1999, 1, 1, 0, 0, 0))
     def test_can_identify_not_start_status(self, mock_datetime):
-        self.assertEqual(self.campaign.status, 'NOT_START')
+        self.assertEqual(self.campaign.get_status(), 'NOT_START')
     
+    def test_can_store_status_on_save(self):
+        self.assertEqual(self.model.objects.get(campaign_id=1).status, 'CLOSED')
+        self.campaign.end_time = datetime.datetime.now() + datetime.timedelta(days=1)
+        self.campaign.save()
+        self.assertEqual(self.model.objects.get(campaign_id=1).status, 'ACTIVE')
+
     def test_can_prevent_saving_record_with_improper_start_end_date(self):
         with self.assertRaises(ValidationError):
             self.campaign = self.model.objects.create(
@@ -67,7 +74,7 @@ class TestVoteOptionModel(TestCase):
 class TestVoteRecordModel(TestCase):
     multi_db = True
     model = models.VoteRecord
-    user_id = 'A123456'
+    user_id = hashlib.sha256('A123456'.encode('utf-8')).hexdigest()
 
     def setUp(self):
         self.campaign = models.VoteCampaign.objects.create(
@@ -98,3 +105,9 @@ class TestVoteRecordModel(TestCase):
                 option=self.second_option,
                 campaign=self.campaign
             )
+
+    def test_can_store_user_id_as_digest_bytes(self):
+        record = self.model.objects.get(pk=self.record.pk)
+        self.assertEqual(record.user_id, self.user_id)
+        self.assertTrue(self.model.objects.filter(user_id=self.user_id.upper()).exists())
+        self.assertEqual(len(self.model._meta.get_field('user_id').get_prep_value(self.user_id)), 32)
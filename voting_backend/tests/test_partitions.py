@@ -0,0 +1,121 @@
+import datetime
+import hashlib
+import unittest
+from io import StringIO
+
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.db.models import Sum
+from django.test import TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from voting_backend import counters, models, partitions
+
+ARCHIVE_SCHEMA = 'archive_test'
+
+
+@unittest.skipUnless(connection.vendor == 'postgresql', 'PostgreSQL only')
+@override_settings(VOTE_PARTITIONS={'ENABLED': True, 'ARCHIVE_SCHEMA': ARCHIVE_SCHEMA, 'ARCHIVE_AFTER_DAYS': 0})
+class TestVotePartitions(TransactionTestCase):
+    """
+    Partitioning is DDL, committed outside a test transaction and reverted after each test
+    """
+    multi_db = True
+
+    def setUp(self):
+        self.addCleanup(self.revert)
+        now = datetime.datetime.now()
+        self.campaign = self.create_campaign(now - datetime.timedelta(days=1), now + datetime.timedelta(days=1))
+        self.closed_campaign = self.create_campaign(now - datetime.timedelta(days=40), now - datetime.timedelta(days=30))
+
+    @staticmethod
+    def revert():
+        partitions.unpartition_records(connection)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DROP SCHEMA IF EXISTS {ARCHIVE_SCHEMA} CASCADE')
+
+    @staticmethod
+    def create_campaign(start_time, end_time):
+        campaign = models.VoteCampaign.objects.create(question='How are you', start_time=start_time, end_time=end_time)
+        option = models.VoteOption.objects.create(campaign=campaign, option_code='a', option_detail='great')
+        for hkid in ('A1234567', 'B1234567'):
+            user_id = hashlib.sha256(hkid.encode('utf-8')).hexdigest()
+            models.VoteRecord.objects.create(campaign=campaign, option=option, user_id=user_id)
+        return campaign
+
+    @staticmethod
+    def count_rows(table):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM {table}')
+            return cursor.fetchone()[0]
+
+    def test_can_partition_records(self):
+        partitions.partition_records(connection)
+        self.assertTrue(partitions.is_partitioned(connection))
+        self.assertEqual(partitions.get_partitions(connection), {
+            partitions.DEFAULT_PARTITION,
+            partitions.get_partition_name(self.campaign.campaign_id),
+            partitions.get_partition_name(self.closed_campaign.campaign_id),
+        })
+        self.assertEqual(self.count_rows(partitions.get_partition_name(self.campaign.campaign_id)), 2)
+        self.assertEqual(counters.find_drift(), [])
+
+        partitions.unpartition_records(connection)
+        self.assertFalse(partitions.is_partitioned(connection))
+        self.assertEqual(models.VoteRecord.objects.count(), 4)
+
+    def test_can_prune_partitions_of_other_campaigns(self):
+        partitions.partition_records(connection)
+        plan = models.VoteRecord.objects.filter(campaign=self.campaign, user_id='0' * 64).explain()
+        self.assertIn(partitions.get_partition_name(self.campaign.campaign_id), plan)
+        self.assertNotIn(partitions.get_partition_name(self.closed_campaign.campaign_id), plan)
+        self.assertNotIn(partitions.DEFAULT_PARTITION, plan)
+
+    def test_can_create_partition_of_new_campaign(self):
+        partitions.partition_records(connection)
+        now = datetime.datetime.now()
+        campaign = self.create_campaign(now, now + datetime.timedelta(days=1))
+        self.assertEqual(self.count_rows(partitions.DEFAULT_PARTITION), 2)
+
+        out = StringIO()
+        call_command('manage_vote_partitions', stdout=out)
+        self.assertIn(partitions.get_partition_name(campaign.campaign_id), out.getvalue())
+        self.assertEqual(self.count_rows(partitions.DEFAULT_PARTITION), 0)
+        self.assertEqual(self.count_rows(partitions.get_partition_name(campaign.campaign_id)), 2)
+
+    def test_can_lock_default_partition_while_moving_votes(self):
+        partitions.partition_records(connection)
+        now = datetime.datetime.now()
+        campaign = self.create_campaign(now, now + datetime.timedelta(days=1))
+        with CaptureQueriesContext(connection) as queries:
+            partitions.create_partition(connection, campaign.campaign_id)
+        statements = [query['sql'] for query in queries.captured_queries]
+        lock = statements.index(f'LOCK TABLE {partitions.DEFAULT_PARTITION} IN ACCESS EXCLUSIVE MODE')
+        moved = next(index for index, sql in enumerate(statements) if sql.startswith('WITH moved AS'))
+        self.assertLess(lock, moved)
+
+    def test_can_archive_partitions_of_closed_campaigns(self):
+        partitions.partition_records(connection)
+        call_command('manage_vote_partitions', archive_after_days=7, stdout=StringIO())
+
+        self.closed_campaign.refresh_from_db()
+        self.assertTrue(self.closed_campaign.records_archived)
+        self.assertEqual(models.VoteRecord.objects.filter(campaign=self.closed_campaign).count(), 0)
+        partition = partitions.get_partition_name(self.closed_campaign.campaign_id)
+        self.assertEqual(self.count_rows(f'{ARCHIVE_SCHEMA}.{partition}'), 2)
+        # Results of the archived campaign are kept
+        self.assertEqual(counters.find_drift(), [])
+        counted = models.VoteCounter.objects.filter(campaign=self.closed_campaign).aggregate(total=Sum('count'))
+        self.assertEqual(counted['total'], 2)
+
+    def test_can_fail_command_when_not_partitioned(self):
+        with self.assertRaises(CommandError):
+            call_command('manage_vote_partitions', stdout=StringIO())
+
+    def test_can_flush_partitioned_records(self):
+        partitions.partition_records(connection)
+        with connection.cursor() as cursor:
+            self.assertIn(models.VoteRecord._meta.db_table, connection.introspection.table_names(cursor))
+        call_command('flush', interactive=False, verbosity=0)
+        self.assertFalse(models.VoteRecord.objects.exists())
@@ -0,0 +1,105 @@
+import datetime
+import hashlib
+from collections import OrderedDict
+
+from django.db.models import Prefetch, Sum
+from django.db.models.functions import Coalesce
+from django.urls import reverse
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+
+from voting_backend import models, rendering, snapshots
+from voting_backend.serializers import (VoteCampaignDetailSerializer,
+                                        VoteCampaignListSerializer,
+                                        VoteCampaignLiteSerializer)
+from voting_backend.views import CampaignOverviewListView
+
+
+class TestRendering(APITestCase):
+    multi_db = True
+
+    def setUp(self):
+        now = datetime.datetime.now().replace(microsecond=123456)
+        self.campaign = models.VoteCampaign.objects.create(
+            question='How are you \u2028 \u2029 \U0001f600 "ok" \\ </script>',
+            start_time=now - datetime.timedelta(days=1),
+            end_time=now + datetime.timedelta(days=1)
+        )
+        models.VoteCampaign.objects.create(
+            question='你好嗎',
+            start_time=datetime.datetime(2000, 1, 1, 0, 0, 0),
+            end_time=now + datetime.timedelta(days=2, microseconds=1)
+        )
+        option = models.VoteOption.objects.create(campaign=self.campaign, option_code='b', option_detail='fine')
+        models.VoteOption.objects.create(campaign=self.campaign, option_code='a', option_detail='great\u2029')
+        models.VoteRecord.objects.create(
+            campaign=self.campaign,
+            option=option,
+            user_id=hashlib.sha256('A1234567'.encode('utf-8')).hexdigest()
+        )
+
+    def get_campaigns(self):
+        return models.VoteCampaign.objects.order_by('-end_time', '-campaign_id')
+
+    def get_option_prefetch(self):
+        return Prefetch('option_set', queryset=models.VoteOption.objects.order_by(
+            'option_code'
+        ).annotate(
+            number_of_vote=Coalesce(Sum('counter_set__count'), 0)
+        ))
+
+    def test_can_render_as_json_renderer(self):
+        data = {'question': '\u2028\u2029\U0001f600"\\', 'values': [1, None, True, 1.5], 'empty': {}}
+        self.assertEqual(rendering.render(data), JSONRenderer().render(data))
+
+    def test_can_render_list_as_serializer(self):
+        campaigns = self.get_campaigns().annotate(number_of_vote=CampaignOverviewListView.get_number_of_vote())
+        response = self.client.get(reverse('campaign_list'))
+        self.assertEqual(
+            response.content,
+            JSONRenderer().render(VoteCampaignListSerializer(campaigns, many=True).data)
+        )
+
+    def test_can_render_lite_list_as_serializer(self):
+        response = self.client.get(reverse('campaign_list'), {'vote_count': 'false'})
+        self.assertEqual(
+            response.content,
+            JSONRenderer().render(VoteCampaignLiteSerializer(self.get_campaigns(), many=True).data)
+        )
+
+    def test_can_render_page_as_serializer(self):
+        campaigns = self.get_campaigns().annotate(number_of_vote=CampaignOverviewListView.get_number_of_vote())
+        response = self.client.get(reverse('campaign_list'), {'limit': 1})
+        next_page = self.client.get(response.data['next'])
+        self.assertEqual(response.content, JSONRenderer().render(OrderedDict([
+            ('next', response.data['next']),
+            ('results', VoteCampaignListSerializer(campaigns[:1], many=True).data),
+        ])))
+        self.assertEqual(next_page.content, JSONRenderer().render(OrderedDict([
+            ('next', None),
+            ('results', VoteCampaignListSerializer(campaigns[1:], many=True).data),
+        ])))
+
+    def test_can_render_detail_as_serializer(self):
+        for campaign in self.get_campaigns().prefetch_related(self.get_option_prefetch()):
+            response = self.client.get(reverse('campaign_detail', args=[campaign.campaign_id]))
+            self.assertEqual(response.content, JSONRenderer().render(VoteCampaignDetailSerializer(campaign).data))
+
+    def test_can_render_indent_as_json_renderer(self):
+        campaign = self.get_campaigns().prefetch_related(self.get_option_prefetch()).get(pk=self.campaign.pk)
+        response = self.client.get(
+            reverse('campaign_detail', args=[campaign.campaign_id]),
+            HTTP_ACCEPT='application/json; indent=2'
+        )
+        self.assertEqual(
+            response.content,
+            JSONRenderer().render(VoteCampaignDetailSerializer(campaign).data, 'application/json; indent=2')
+        )
+
+    def test_can_freeze_snapshot_as_serializer(self):
+        campaign = self.get_campaigns().prefetch_related(self.get_option_prefetch()).get(pk=self.campaign.pk)
+        snapshot = snapshots.freeze(campaign, rendering.get_campaign_details([campaign])[campaign.campaign_id])
+        self.assertEqual(
+            snapshot.body,
+            JSONRenderer().render(VoteCampaignDetailSerializer(campaign).data).decode('utf-8')
+        )
@@ -0,0 +1,137 @@
+import datetime
+import hashlib
+import json
+import threading
+import time
+from unittest import TestCase
+from unittest.mock import patch
+
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from voting_backend import models, result_cache
+from voting_backend.singleflight import SingleFlight
+
+RESULT_CACHE = {
+    'ENABLED': True,
+    'STALE_SECONDS': 60,
+    'TIMEOUT': 300,
+    'STALE_WHILE_REVALIDATE': 0,
+    'CACHE_ALIAS': 'default',
+}
+
+
+@override_settings(RESULT_CACHE=RESULT_CACHE)
+class TestResultCache(APITestCase):
+    multi_db = True
+
+    def setUp(self):
+        result_cache.get_cache().clear()
+        self.campaign = models.VoteCampaign.objects.create(
+            question='How are you',
+            start_time=datetime.datetime(2000, 1, 1, 0, 0, 0),
+            end_time=datetime.datetime(2000, 2, 1, 0, 0, 0)
+        )
+        self.option = models.VoteOption.objects.create(
+            campaign=self.campaign,
+            option_code='a',
+            option_detail='great'
+        )
+        self.detail_url = reverse('campaign_detail', args=[self.campaign.campaign_id])
+
+    def add_vote(self, hkid):
+        models.VoteRecord.objects.create(
+            campaign=self.campaign,
+            option=self.option,
+            user_id=hashlib.sha256(hkid.encode('utf-8')).hexdigest()
+        )
+        # Votes bump the version on commit, which never happens inside TestCase
+        result_cache.bump(self.campaign.campaign_id)
+
+    def get_detail_vote_count(self):
+        response = self.client.get(self.detail_url)
+        return json.loads(response.content.decode('utf-8'))['options'][0]['number_of_vote']
+
+    def test_can_serve_cached_result_without_query(self):
+        first_response = self.client.get(self.detail_url)
+        with self.assertNumQueries(0):
+            second_response = self.client.get(self.detail_url)
+        self.assertEqual(second_response.status_code, status.HTTP_200_OK)
+        self.assertEqual(second_response.content, first_response.content)
+        self.assertEqual(second_response['ETag'], first_response['ETag'])
+
+    def test_can_return_not_modified_for_matching_etag(self):
+        etag = self.client.get(reverse('campaign_list'))['ETag']
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('campaign_list'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_can_serve_stale_result_within_staleness_window(self):
+        self.assertEqual(self.get_detail_vote_count(), 0)
+        self.add_vote('A1234567')
+        self.assertEqual(self.get_detail_vote_count(), 0)
+
+    def test_can_refresh_result_after_staleness_window(self):
+        self.assertEqual(self.get_detail_vote_count(), 0)
+        self.add_vote('A1234567')
+        with self.settings(RESULT_CACHE=dict(RESULT_CACHE, STALE_SECONDS=0)):
+            self.assertEqual(self.get_detail_vote_count(), 1)
+
+    def test_can_skip_cache_for_missing_campaign(self):
+        response = self.client.get(reverse('campaign_detail', args=[self.campaign.campaign_id + 1]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertIsNone(result_cache.get_cache().get(result_cache.get_detail_key(self.campaign.campaign_id + 1)))
+
+    @patch.object(result_cache.ResultCacheMixin.flight, 'start')
+    def test_can_serve_stale_result_while_revalidating(self, mock_start):
+        self.assertEqual(self.get_detail_vote_count(), 0)
+        self.add_vote('A1234567')
+        with self.settings(RESULT_CACHE=dict(RESULT_CACHE, STALE_SECONDS=0, STALE_WHILE_REVALIDATE=60)):
+            self.assertEqual(self.get_detail_vote_count(), 0)
+        self.assertEqual(mock_start.call_count, 1)
+
+
+class TestSingleFlight(TestCase):
+    def setUp(self):
+        self.flight = SingleFlight()
+        self.release = threading.Event()
+        self.calls = []
+
+    def compute(self, value):
+        self.calls.append(value)
+        self.release.wait(5)
+        return value
+
+    def test_can_share_result_of_concurrent_calls(self):
+        results = []
+        barrier = threading.Barrier(5)
+
+        def call():
+            barrier.wait()
+            results.append(self.flight.do('key', self.compute, 'result'))
+
+        threads = [threading.Thread(target=call) for _ in range(5)]
+        for thread in threads:
+            thread.start()
+        # Give every thread time to join the running call
+        time.sleep(0.2)
+        self.release.set()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(results, ['result'] * 5)
+        self.assertEqual(self.calls, ['result'])
+        self.assertFalse(self.flight.is_running('key'))
+
+    def test_can_run_again_after_call_finished(self):
+        self.release.set()
+        self.assertEqual(self.flight.do('key', self.compute, 1), 1)
+        self.assertEqual(self.flight.do('key', self.compute, 2), 2)
+        self.assertEqual(self.calls, [1, 2])
+
+    def test_can_raise_error_of_call(self):
+        with self.assertRaises(ValueError):
+            self.flight.do('key', int, 'not a number')
+        self.assertFalse(self.flight.is_running('key'))
@@ -0,0 +1,118 @@
+import datetime
+import unittest
+from unittest.mock import patch
+
+from django.db import DEFAULT_DB_ALIAS, connection, connections, router
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITransactionTestCase
+
+from voting_backend import routers
+from voting_backend.metrics import registry
+from voting_backend.models import VoteCampaign, VoteOption, VoteRecord
+
+REPLICA = 'replica_test'
+DATABASE_REPLICAS = {
+    'ALIASES': [REPLICA],
+    'MAX_LAG': 5,
+    'CHECK_INTERVAL': 60,
+}
+
+
+@override_settings(DATABASE_REPLICAS=DATABASE_REPLICAS)
+class TestReplicaRouter(APITransactionTestCase):
+    """
+    Replica is a second connection to the test database, which sees data once committed
+    """
+    multi_db = True
+
+    def setUp(self):
+        connections.databases[REPLICA] = dict(connections.databases[DEFAULT_DB_ALIAS])
+        self.addCleanup(self.remove_replica)
+        patcher = patch.object(routers, 'monitor', routers.ReplicaLagMonitor())
+        self.monitor = patcher.start()
+        self.addCleanup(patcher.stop)
+        now = datetime.datetime.now()
+        self.campaign = VoteCampaign.objects.create(
+            question='How are you',
+            start_time=now - datetime.timedelta(days=1),
+            end_time=now + datetime.timedelta(days=1)
+        )
+        VoteOption.objects.create(campaign=self.campaign, option_code='a', option_detail='great')
+
+    @staticmethod
+    def remove_replica():
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.databases[REPLICA]
+
+    def get(self, url):
+        """
+        Return response and queries sent to primary and replica
+        """
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary_queries:
+            with CaptureQueriesContext(connections[REPLICA]) as replica_queries:
+                response = self.client.get(url)
+        return response, primary_queries, replica_queries
+
+    def test_can_read_results_from_replica(self):
+        # Lag is measured ahead of the requests
+        self.assertTrue(self.monitor.is_in_sync(REPLICA))
+        response, primary_queries, replica_queries = self.get(
+            reverse('campaign_detail', args=[self.campaign.campaign_id])
+        )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['options'][0]['option_code'], 'a')
+        self.assertEqual(len(primary_queries), 0)
+        self.assertEqual(len(replica_queries), 2)
+
+        response, primary_queries, replica_queries = self.get(reverse('campaign_list'))
+        self.assertEqual(len(response.data), 1)
+        self.assertEqual(len(primary_queries), 0)
+        self.assertEqual(len(replica_queries), 1)
+
+    def test_can_fall_back_to_primary_when_replica_lags(self):
+        fallbacks = registry.counters.get(('voting_db_replica_fallbacks_total', ()), 0)
+        with patch.object(self.monitor, 'measure', return_value=10.0):
+            response, primary_queries, replica_queries = self.get(
+                reverse('campaign_detail', args=[self.campaign.campaign_id])
+            )
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(len(primary_queries), 2)
+        self.assertEqual(len(replica_queries), 0)
+        self.assertEqual(registry.counters[('voting_db_replica_fallbacks_total', ())], fallbacks + 1)
+
+    def test_can_fall_back_to_primary_when_replica_unreachable(self):
+        with patch.object(self.monitor, 'measure', return_value=None):
+            self.assertEqual(routers.get_replica(), DEFAULT_DB_ALIAS)
+
+    def test_can_measure_lag(self):
+        self.assertEqual(self.monitor.measure(REPLICA), 0.0)
+
+    @unittest.skipUnless(connection.vendor == 'postgresql', 'PostgreSQL only')
+    def test_can_fall_back_to_primary_when_replica_not_streaming(self):
+        with patch.object(routers, 'LAG_SQL', 'SELECT NULL'), self.assertLogs('voting_backend.routers', 'WARNING'):
+            self.assertFalse(self.monitor.is_in_sync(REPLICA))
+
+    def test_can_measure_lag_once_per_interval(self):
+        with patch.object(self.monitor, 'measure', return_value=0.0) as measure:
+            self.assertTrue(self.monitor.is_in_sync(REPLICA))
+            self.assertTrue(self.monitor.is_in_sync(REPLICA))
+        self.assertEqual(measure.call_count, 1)
+
+    def test_can_write_votes_to_primary(self):
+        with routers.read_from_replica():
+            self.assertEqual(router.db_for_read(VoteCampaign), REPLICA)
+            self.assertEqual(router.db_for_write(VoteRecord), DEFAULT_DB_ALIAS)
+        self.assertEqual(router.db_for_read(VoteCampaign), DEFAULT_DB_ALIAS)
+        self.assertFalse(router.allow_migrate(REPLICA, 'voting_backend'))
+
+        with CaptureQueriesContext(connections[REPLICA]) as replica_queries:
+            response = self.client.post(
+                reverse('vote', args=[self.campaign.campaign_id]),
+                {'hkid': 'Y7280422', 'option_code': 'a'}
+            )
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(replica_queries), 0)
@@ -0,0 +1,112 @@
+import datetime
+import hashlib
+import json
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from voting_backend import counters, models
+
+
+class TestCampaignSnapshot(APITestCase):
+    multi_db = True
+
+    def setUp(self):
+        now = datetime.datetime.now()
+        self.campaign = models.VoteCampaign.objects.create(
+            question='How are you',
+            start_time=datetime.datetime(2000, 1, 1, 0, 0, 0),
+            end_time=datetime.datetime(2000, 2, 1, 0, 0, 0)
+        )
+        self.active_campaign = models.VoteCampaign.objects.create(
+            question='How old are you',
+            start_time=now - datetime.timedelta(days=1),
+            end_time=now + datetime.timedelta(days=1)
+        )
+        self.option = models.VoteOption.objects.create(campaign=self.campaign, option_code='a', option_detail='great')
+        models.VoteOption.objects.create(campaign=self.campaign, option_code='b', option_detail='not great')
+        self.add_vote('A1234567')
+        self.add_vote('B1234567')
+        self.detail_url = reverse('campaign_detail', args=[self.campaign.campaign_id])
+
+    def add_vote(self, hkid):
+        models.VoteRecord.objects.create(
+            campaign=self.campaign,
+            option=self.option,
+            user_id=hashlib.sha256(hkid.encode('utf-8')).hexdigest()
+        )
+
+    def get_list_vote_count(self):
+        response = self.client.get(reverse('campaign_list'))
+        return {campaign['campaign_id']: campaign['number_of_vote'] for campaign in response.data}
+
+    def test_can_freeze_closed_campaign_on_first_read(self):
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        snapshot = models.VoteCampaignSnapshot.objects.get(campaign=self.campaign)
+        self.assertEqual(snapshot.number_of_vote, 2)
+        self.assertEqual(snapshot.body.encode('utf-8'), response.content)
+
+        # Served from the campaign row joined with its snapshot, without counters
+        with self.assertNumQueries(1):
+            frozen_response = self.client.get(self.detail_url)
+        self.assertEqual(frozen_response.content, response.content)
+        self.assertEqual(json.loads(frozen_response.content.decode('utf-8'))['status'], 'CLOSED')
+
+    def test_can_serve_active_campaign_without_snapshot(self):
+        response = self.client.get(reverse('campaign_detail', args=[self.active_campaign.campaign_id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(models.VoteCampaignSnapshot.objects.filter(campaign=self.active_campaign).exists())
+
+    def test_can_list_vote_count_from_snapshot(self):
+        call_command('finalize_campaigns', stdout=StringIO())
+        # Counters of a frozen campaign are not read any more
+        models.VoteCounter.objects.filter(campaign=self.campaign).update(count=0)
+        vote_counts = self.get_list_vote_count()
+        self.assertEqual(vote_counts[self.campaign.campaign_id], 2)
+        self.assertEqual(vote_counts[self.active_campaign.campaign_id], 0)
+
+    def test_can_discard_snapshot_when_results_change(self):
+        self.client.get(self.detail_url)
+        self.add_vote('C1234567')
+        self.assertFalse(models.VoteCampaignSnapshot.objects.exists())
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.data['options'][0]['number_of_vote'], 3)
+
+        models.VoteRecord.objects.filter(user_id=hashlib.sha256(b'C1234567').hexdigest()).delete()
+        counters.rebuild()
+        self.assertFalse(models.VoteCampaignSnapshot.objects.exists())
+        self.assertEqual(self.get_list_vote_count()[self.campaign.campaign_id], 2)
+
+    def test_can_finalize_closed_campaigns_by_command(self):
+        out = StringIO()
+        call_command('finalize_campaigns', stdout=out)
+        self.assertIn(f'campaign {self.campaign.campaign_id}: frozen', out.getvalue())
+        self.assertEqual(
+            list(models.VoteCampaignSnapshot.objects.values_list('campaign_id', flat=True)),
+            [self.campaign.campaign_id]
+        )
+
+        out = StringIO()
+        call_command('finalize_campaigns', stdout=out)
+        self.assertIn('0 campaign(s) finalized', out.getvalue())
+        call_command('finalize_campaigns', refreeze=True, stdout=out)
+        self.assertIn('1 campaign(s) finalized', out.getvalue())
+
+    @override_settings(CAMPAIGN_SNAPSHOTS={'ENABLED': True, 'DELAY': 60})
+    def test_can_wait_for_queued_votes_before_freezing(self):
+        now = datetime.datetime.now()
+        self.campaign.end_time = now - datetime.timedelta(seconds=10)
+        self.campaign.save()
+        self.client.get(self.detail_url)
+        self.assertFalse(models.VoteCampaignSnapshot.objects.exists())
+
+    @override_settings(CAMPAIGN_SNAPSHOTS={'ENABLED': False, 'DELAY': 60})
+    def test_can_disable_snapshots(self):
+        response = self.client.get(self.detail_url)
+        self.assertEqual(response.data['options'][0]['number_of_vote'], 2)
+        self.assertFalse(models.VoteCampaignSnapshot.objects.exists())
@@ -0,0 +1,107 @@
+import datetime
+import hashlib
+import os
+import tempfile
+from unittest import TestCase
+from unittest.mock import patch
+
+from django.test import override_settings
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from voting_backend import models, throttling
+from voting_backend.campaign_cache import campaign_cache
+
+VOTE_THROTTLE = {
+    'ENABLED': True,
+    'IP_RATE': '3/min',
+    'VOTER_RATE': '2/min',
+    'STORE': 'local',
+    'SHARED_PATH': '',
+    'SIZE': 1024,
+}
+
+
+class TestBucketStore(TestCase):
+    def test_can_parse_rate(self):
+        self.assertEqual(throttling.parse_rate('120/min'), (120, 2))
+        self.assertEqual(throttling.parse_rate('3/s'), (3, 3))
+
+    @patch('time.time')
+    def test_can_refill_local_bucket(self, current_time):
+        store = throttling.LocalBucketStore(max_size=2)
+        current_time.return_value = 1000
+        self.assertEqual([store.take('ip:1.1.1.1', 2, 1 / 32) for _ in range(3)], [0, 0, 32])
+        current_time.return_value = 1016
+        self.assertEqual(store.take('ip:1.1.1.1', 2, 1 / 32), 16)
+        current_time.return_value = 1032
+        self.assertEqual(store.take('ip:1.1.1.1', 2, 1 / 32), 0)
+
+        # Least recently used bucket is dropped and starts full again
+        store.take('ip:2.2.2.2', 2, 1 / 32)
+        store.take('ip:3.3.3.3', 2, 1 / 32)
+        self.assertEqual(len(store.buckets), 2)
+        self.assertEqual(store.take('ip:1.1.1.1', 2, 1 / 32), 0)
+
+    def test_can_key_fingerprint_with_secret(self):
+        key = 'voter:1:A1234567'
+        unkeyed = int.from_bytes(hashlib.blake2b(key.encode('utf-8'), digest_size=8).digest(), 'little')
+        with override_settings(VOTER_ID_HASHING={'KEY': 'first'}):
+            fingerprint = throttling.get_fingerprint(key)
+        with override_settings(VOTER_ID_HASHING={'KEY': 'second'}):
+            self.assertNotEqual(throttling.get_fingerprint(key), fingerprint)
+        self.assertNotEqual(fingerprint, unkeyed)
+
+    def test_can_share_buckets_between_processes(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'throttle.buckets')
+            first_store = throttling.SharedBucketStore(path, size=16)
+            second_store = throttling.SharedBucketStore(path, size=16)
+            self.assertEqual(first_store.take('ip:1.1.1.1', 2, 1 / 60), 0)
+            self.assertEqual(second_store.take('ip:1.1.1.1', 2, 1 / 60), 0)
+            self.assertGreater(first_store.take('ip:1.1.1.1', 2, 1 / 60), 0)
+            self.assertEqual(second_store.take('ip:2.2.2.2', 2, 1 / 60), 0)
+
+
+@override_settings(VOTE_THROTTLE=VOTE_THROTTLE)
+class TestVoteThrottle(APITestCase):
+    multi_db = True
+
+    def setUp(self):
+        campaign_cache.clear()
+        throttling.get_store.cache_clear()
+        now = datetime.datetime.now()
+        self.campaign = models.VoteCampaign.objects.create(
+            question='How are you',
+            start_time=now - datetime.timedelta(days=1),
+            end_time=now + datetime.timedelta(days=1)
+        )
+        models.VoteOption.objects.create(campaign=self.campaign, option_code='a', option_detail='great')
+
+    def vote(self, hkid, client='1.1.1.1'):
+        return self.client.post(
+            reverse('vote', args=[self.campaign.campaign_id]),
+            {'hkid': hkid, 'option_code': 'a'},
+            REMOTE_ADDR=client
+        )
+
+    def test_can_throttle_repeats_of_voter(self):
+        self.assertEqual(self.vote('Y7280422').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.vote(' y7280422', '2.2.2.2').status_code, status.HTTP_400_BAD_REQUEST)
+        with self.assertNumQueries(0):
+            response = self.vote('Y7280422', '3.3.3.3')
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(str(response.data['detail']), 'TOO_MANY_REQUESTS')
+        self.assertEqual(response['Retry-After'], '30')
+
+    def test_can_throttle_client_ip(self):
+        for hkid in ('A1234567', 'B1234567', 'C1234567'):
+            self.assertEqual(self.vote(hkid).status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(self.vote('D1234567').status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self.vote('Y7280422', '2.2.2.2').status_code, status.HTTP_201_CREATED)
+
+    def test_can_turn_off_throttle(self):
+        with self.settings(VOTE_THROTTLE=dict(VOTE_THROTTLE, ENABLED=False)):
+            for _ in range(4):
+                self.assertEqual(self.vote('A1234567').status_code, status.HTTP_400_BAD_REQUEST)
@@ -0,0 +1,88 @@
+import datetime
+import time
+from io import StringIO
+from unittest.mock import patch
+
+from django.core.management import call_command
+from django.urls import reverse
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+from voting_backend import models, transitions
+from voting_backend.campaign_cache import campaign_cache
+
+
+class TestCampaignTransitions(APITestCase):
+    multi_db = True
+
+    def setUp(self):
+        campaign_cache.clear()
+        self.now = datetime.datetime.now()
+        self.campaign = models.VoteCampaign.objects.create(
+            question='How are you',
+            start_time=self.now + datetime.timedelta(hours=1),
+            end_time=self.now + datetime.timedelta(hours=2)
+        )
+        models.VoteOption.objects.create(campaign=self.campaign, option_code='a', option_detail='great')
+        self.transitions = []
+        transitions.campaign_status_changed.connect(self.receive)
+        self.addCleanup(transitions.campaign_status_changed.disconnect, self.receive)
+
+    def receive(self, sender, campaign, old_status, new_status, **kwargs):
+        self.transitions.append((campaign.campaign_id, old_status, new_status))
+
+    def at(self, **delta):
+        return patch('django.utils.timezone.now', return_value=self.now + datetime.timedelta(**delta))
+
+    def vote(self, hkid):
+        return self.client.post(reverse('vote', args=[self.campaign.campaign_id]), {'hkid': hkid, 'option_code': 'a'})
+
+    def test_can_apply_transitions_once(self):
+        self.assertEqual(transitions.apply_due(), [])
+        with self.at(minutes=90):
+            applied = transitions.apply_due()
+            self.assertEqual([(campaign.campaign_id, old_status) for campaign, old_status in applied],
+                             [(self.campaign.campaign_id, 'NOT_START')])
+            self.assertEqual(transitions.apply_due(), [])
+        with self.at(hours=3):
+            transitions.apply_due()
+        self.assertEqual(self.transitions, [
+            (self.campaign.campaign_id, 'NOT_START', 'ACTIVE'),
+            (self.campaign.campaign_id, 'ACTIVE', 'CLOSED'),
+        ])
+        self.campaign.refresh_from_db()
+        self.assertEqual(self.campaign.status, 'CLOSED')
+
+    def test_can_find_next_transition(self):
+        self.assertEqual(transitions.get_next_transition_time(self.now), self.campaign.start_time)
+        self.assertEqual(
+            transitions.get_next_transition_time(self.now + datetime.timedelta(minutes=90)),
+            self.campaign.end_time
+        )
+        self.assertIsNone(transitions.get_next_transition_time(self.now + datetime.timedelta(hours=3)))
+
+    def test_can_expire_cached_campaign_at_transition(self):
+        campaign_cache.get(self.campaign.campaign_id)
+        with self.at(minutes=59, seconds=50):
+            campaign_cache.invalidate()
+            campaign_cache.get(self.campaign.campaign_id)
+        self.assertLessEqual(campaign_cache.entries[self.campaign.campaign_id][0] - time.monotonic(), 10)
+
+    def test_can_apply_due_transition_on_vote(self):
+        self.assertEqual(self.vote('Y7280422').status_code, status.HTTP_400_BAD_REQUEST)
+        with self.at(minutes=90):
+            # Cached campaign expired at its start time
+            campaign_cache.invalidate()
+            self.assertEqual(self.vote('Y7280422').status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.transitions, [(self.campaign.campaign_id, 'NOT_START', 'ACTIVE')])
+        self.assertEqual(models.VoteCampaign.objects.filter(status='ACTIVE').count(), 1)
+
+    @patch('voting_backend.snapshots.get_closed_before')
+    def test_can_update_status_by_command(self, get_closed_before):
+        get_closed_before.return_value = self.now + datetime.timedelta(hours=2)
+        out = StringIO()
+        with self.at(hours=3):
+            call_command('update_campaign_status', campaign_ids=[self.campaign.campaign_id], stdout=out)
+        self.assertIn(f'campaign {self.campaign.campaign_id}: NOT_START -> CLOSED', out.getvalue())
+        # Frozen by the transition hook, as the campaign closed more than the snapshot delay ago
+        self.assertIn('"status":"CLOSED"', models.VoteCampaignSnapshot.objects.get().body)
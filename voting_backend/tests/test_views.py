@@ -2,11 +2,14 @@ import datetime
 import hashlib
 from unittest.mock import patch
 
+from django.contrib.auth.models import User
+from django.db.models import Sum
 from django.urls import reverse
 from rest_framework import status
 from rest_framework.test import APITestCase
 
-from voting_backend import models
+from voting_backend import models, transitions
+from voting_backend.campaign_cache import campaign_cache
 
 
 class TestCampaignOverviewListView(APITestCase):
@@ -55,6 +58,8 @@ class TestCampaignDetailRetrieveView(APITestCase):
     multi_db = True
 
     def setUp(self):
+        # Campaigns are created by bulk_create, which sends no post_save to invalidate cached ones
+        campaign_cache.clear()
         self.campaign = models.VoteCampaign.objects.create(
             question='How are you',
             start_time=datetime.datetime(2000, 1, 1, 0, 0, 0),
@@ -113,6 +118,8 @@ class TestVoteRecordView(APITestCase):
     multi_db = True
 
     def setUp(self):
+        # Campaigns are created by bulk_create, which sends no post_save to invalidate cached ones
+        campaign_cache.clear()
         self.campaigns = models.VoteCampaign.objects.bulk_create([
             models.VoteCampaign(
                 question='How old are you',
@@ -229,3 +236,126 @@ class TestVoteRecordView(APITestCase):
         )
         self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
         self.assertEqual(str(response.data['detail']), 'INVALID_INPUT')
+
+
+class TestVoteBatchView(APITestCase):
+    multi_db = True
+
+    def setUp(self):
+        self.campaign = models.VoteCampaign.objects.create(
+            question='How old are you',
+            start_time=datetime.datetime(2000, 1, 1, 0, 0, 0),
+            end_time=datetime.datetime(2000, 2, 1, 0, 0, 0)
+        )
+        self.option = models.VoteOption.objects.create(
+            campaign=self.campaign,
+            option_code='a',
+            option_detail='great'
+        )
+        self.record = models.VoteRecord.objects.create(
+            campaign=self.campaign,
+            option=self.option,
+            user_id=hashlib.sha256('Y7280422'.encode('utf-8')).hexdigest()
+        )
+        self.client.force_authenticate(User.objects.create_superuser('admin', 'admin@example.com', 'password'))
+
+    def post_votes(self, votes):
+        return self.client.post(
+            reverse('vote_batch', args=[self.campaign.campaign_id]),
+            data={'votes': votes},
+            format='json'
+        )
+
+    @patch('django.utils.timezone.now', return_value=datetime.datetime(2000, 1, 1, 0, 0, 0))
+    def test_can_return_result_per_vote(self, mock_datetime):
+        response = self.post_votes([
+            {'hkid': 'Q7853943', 'option_code': 'a'},
+            {'hkid': 'y7280422', 'option_code': 'a'},
+            {'hkid': 'Q7853943', 'option_code': 'a'},
+            {'hkid': 'Y728042A', 'option_code': 'a'},
+            {'hkid': 'A1234567', 'option_code': 'z'},
+            {'option_code': 'a'},
+            {'hkid': 'B1234567', 'option_code': ['a']},
+            {'hkid': 'C1234567', 'option_code': {'a': 1}},
+        ])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'], [
+            'ACCEPTED', 'ALREADY_VOTE', 'ALREADY_VOTE', 'INVALID_INPUT', 'INVALID_INPUT', 'INVALID_INPUT',
+            'INVALID_INPUT', 'INVALID_INPUT'
+        ])
+        self.assertEqual(models.VoteRecord.objects.filter(campaign=self.campaign).count(), 2)
+        self.assertEqual(models.VoteCounter.objects.filter(option=self.option).aggregate(
+            total=Sum('count'))['total'], 2)
+
+    def test_can_prevent_batch_by_anonymous_client(self):
+        self.client.force_authenticate(None)
+        response = self.post_votes([{'hkid': 'Q7853943', 'option_code': 'a'}])
+        self.assertIn(response.status_code, (status.HTTP_401_UNAUTHORIZED, status.HTTP_403_FORBIDDEN))
+        self.assertEqual(models.VoteRecord.objects.filter(campaign=self.campaign).count(), 1)
+
+    @patch('django.utils.timezone.now', return_value=datetime.datetime(2000, 2, 1, 0, 0, 0))
+    def test_can_prevent_batch_if_vote_already_closed(self, mock_datetime):
+        response = self.post_votes([{'hkid': 'Q7853943', 'option_code': 'a'}])
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual(str(response.data['detail']), 'INVALID_INPUT')
+
+    @patch('django.utils.timezone.now', return_value=datetime.datetime(2000, 1, 1, 0, 0, 0))
+    def test_can_prevent_batch_if_not_list_of_votes(self, mock_datetime):
+        for votes in ([], 'Q7853943', ['Q7853943']):
+            response = self.post_votes(votes)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertEqual(str(response.data['detail']), 'INVALID_INPUT')
+
+
+class TestCampaignOverviewListFilterView(APITestCase):
+    multi_db = True
+
+    def setUp(self):
+        self.campaigns = [
+            models.VoteCampaign.objects.create(
+                question=f'Question {ix}',
+                start_time=datetime.datetime(2000, 1, 1, 0, 0, 0),
+                end_time=datetime.datetime(2000, 1, 2 + ix // 2, 0, 0, 0)
+            )
+            for ix in range(5)
+        ]
+        self.campaigns[0].start_time = datetime.datetime(1999, 1, 1, 0, 0, 0)
+        self.campaigns[0].end_time = datetime.datetime(1999, 2, 1, 0, 0, 0)
+        self.campaigns[0].save()
+        # Ordered by end time then campaign id, both descending
+        self.expected_order = [campaign.campaign_id for campaign in reversed(self.campaigns)]
+
+    def test_can_return_unpaginated_list_by_default(self):
+        response = self.client.get(reverse('campaign_list'))
+        self.assertEqual([campaign['campaign_id'] for campaign in response.data], self.expected_order)
+
+    def test_can_paginate_by_cursor(self):
+        campaign_ids = []
+        url = reverse('campaign_list') + '?limit=2'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertLessEqual(len(response.data['results']), 2)
+            campaign_ids += [campaign['campaign_id'] for campaign in response.data['results']]
+            url = response.data['next']
+        self.assertEqual(campaign_ids, self.expected_order)
+
+    def test_can_reject_invalid_cursor(self):
+        response = self.client.get(reverse('campaign_list'), {'cursor': 'invalid'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    @patch('django.utils.timezone.now', return_value=datetime.datetime(2000, 1, 2, 0, 0, 0))
+    def test_can_filter_by_status(self, mock_datetime):
+        transitions.apply_due()
+        response = self.client.get(reverse('campaign_list'), {'status': 'CLOSED'})
+        self.assertEqual(
+            [campaign['campaign_id'] for campaign in response.data],
+            [self.campaigns[1].campaign_id, self.campaigns[0].campaign_id]
+        )
+        self.assertTrue(all(campaign['status'] == 'CLOSED' for campaign in response.data))
+        response = self.client.get(reverse('campaign_list'), {'status': ['ACTIVE', 'NOT_START']})
+        self.assertEqual(len(response.data), 3)
+
+    def test_can_omit_vote_count(self):
+        response = self.client.get(reverse('campaign_list'), {'vote_count': 'false'})
+        self.assertNotIn('number_of_vote', response.data[0])
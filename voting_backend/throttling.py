@@ -0,0 +1,193 @@
+import functools
+import hashlib
+import mmap
+import os
+import struct
+import threading
+import time
+from collections import OrderedDict
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+from rest_framework.throttling import BaseThrottle
+
+PERIODS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def is_enabled():
+    return settings.VOTE_THROTTLE['ENABLED']
+
+
+def parse_rate(rate):
+    """
+    Return (capacity, tokens per second) of a bucket for a rate like '10/min':
+    a burst of 10 requests, refilled at 10 per minute
+    """
+    number, period = rate.split('/')
+    number = int(number)
+    return number, number / PERIODS[period[0]]
+
+
+@functools.lru_cache()
+def get_fingerprint_key():
+    """
+    Return secret key of fingerprints, VOTER_ID_KEY or else SECRET_KEY
+    """
+    key = (settings.VOTER_ID_HASHING['KEY'] or settings.SECRET_KEY).encode('utf-8')
+    if len(key) > hashlib.blake2b.MAX_KEY_SIZE:
+        key = hashlib.blake2b(key).digest()
+    return key
+
+
+def get_fingerprint(key):
+    """
+    Return 64 bit keyed digest of a bucket key, so HKIDs in keys are never held in memory,
+    nor found by hashing every possible HKID from a fingerprint in the shared bucket file
+    """
+    digest = hashlib.blake2b(key.encode('utf-8'), key=get_fingerprint_key(), digest_size=8).digest()
+    return int.from_bytes(digest, 'little')
+
+
+def refill(tokens, updated_at, capacity, rate, now):
+    """
+    Return (tokens left, seconds to wait) after taking a token from a bucket, wait is 0 if one was taken
+    """
+    tokens = min(capacity, tokens + (now - updated_at) * rate)
+    if tokens >= 1:
+        return tokens - 1, 0
+    return tokens, (1 - tokens) / rate
+
+
+class LocalBucketStore:
+    """
+    Token buckets of the current process, least recently used dropped beyond max_size
+    """
+    def __init__(self, max_size=65536):
+        self.max_size = max_size
+        self.lock = threading.Lock()
+        # fingerprint -> (tokens, updated at)
+        self.buckets = OrderedDict()
+
+    def take(self, key, capacity, rate):
+        fingerprint = get_fingerprint(key)
+        now = time.time()
+        with self.lock:
+            tokens, updated_at = self.buckets.pop(fingerprint, (capacity, now))
+            tokens, wait = refill(tokens, updated_at, capacity, rate, now)
+            self.buckets[fingerprint] = (tokens, now)
+            if len(self.buckets) > self.max_size:
+                self.buckets.popitem(last=False)
+        return wait
+
+
+class SharedBucketStore:
+    """
+    Token buckets in a memory mapped file shared by the worker processes of a host.
+    Each key maps to one of size slots, locked on its own while taken; a key landing
+    in a slot held by another key starts with a full bucket.
+    """
+    slot = struct.Struct('<Qdd')
+
+    def __init__(self, path, size=65536):
+        try:
+            import fcntl
+        except ImportError:
+            raise ImproperlyConfigured('Shared throttle store requires POSIX file locks, use the local store')
+        self.fcntl = fcntl
+        self.size = size
+        self.lock = threading.Lock()
+        length = size * self.slot.size
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        if os.fstat(self.fd).st_size < length:
+            os.ftruncate(self.fd, length)
+        self.buffer = mmap.mmap(self.fd, length)
+
+    def take(self, key, capacity, rate):
+        fingerprint = get_fingerprint(key)
+        offset = fingerprint % self.size * self.slot.size
+        # Record locks exclude other processes only, the lock excludes threads of this one
+        with self.lock:
+            self.fcntl.lockf(self.fd, self.fcntl.LOCK_EX, self.slot.size, offset)
+            try:
+                now = time.time()
+                stored_fingerprint, tokens, updated_at = self.slot.unpack_from(self.buffer, offset)
+                if stored_fingerprint != fingerprint:
+                    tokens, updated_at = capacity, now
+                tokens, wait = refill(tokens, updated_at, capacity, rate, now)
+                self.slot.pack_into(self.buffer, offset, fingerprint, tokens, now)
+            finally:
+                self.fcntl.lockf(self.fd, self.fcntl.LOCK_UN, self.slot.size, offset)
+        return wait
+
+
+@functools.lru_cache()
+def get_store():
+    config = settings.VOTE_THROTTLE
+    if config['STORE'] == 'local':
+        return LocalBucketStore(config['SIZE'])
+    if config['STORE'] == 'shared':
+        return SharedBucketStore(config['SHARED_PATH'], config['SIZE'])
+    raise ImproperlyConfigured(f"Unknown throttle store {config['STORE']}, use local or shared")
+
+
+@receiver(setting_changed)
+def reset_store(setting, **kwargs):
+    if setting == 'VOTE_THROTTLE':
+        get_store.cache_clear()
+    elif setting in ('VOTER_ID_HASHING', 'SECRET_KEY'):
+        get_fingerprint_key.cache_clear()
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Throttle requests by token buckets of VOTE_THROTTLE['STORE'], at a constant cost per check
+    """
+    scope = None
+    rate_setting = None
+
+    def get_key(self, request, view):
+        """
+        Return identity of the bucket charged for the request, or None to let it through
+        """
+        raise NotImplementedError
+
+    def allow_request(self, request, view):
+        self.wait_time = None
+        if not is_enabled():
+            return True
+        key = self.get_key(request, view)
+        if key is None:
+            return True
+        capacity, rate = parse_rate(settings.VOTE_THROTTLE[self.rate_setting])
+        self.wait_time = get_store().take(f'{self.scope}:{key}', capacity, rate)
+        return not self.wait_time
+
+    def wait(self):
+        return self.wait_time
+
+
+class VoteIPThrottle(TokenBucketThrottle):
+    """
+    Throttle votes per client IP, behind REST_FRAMEWORK['NUM_PROXIES'] proxies
+    """
+    scope = 'ip'
+    rate_setting = 'IP_RATE'
+
+    def get_key(self, request, view):
+        return self.get_ident(request)
+
+
+class VoterThrottle(TokenBucketThrottle):
+    """
+    Throttle votes per HKID and campaign, valid or not
+    """
+    scope = 'voter'
+    rate_setting = 'VOTER_RATE'
+
+    def get_key(self, request, view):
+        hkid = request.POST.get('hkid')
+        if not hkid:
+            return None
+        return '{}:{}'.format(view.kwargs.get('campaign_id'), hkid.strip().upper())
@@ -0,0 +1,65 @@
+from django.db.models import Min, Q
+from django.dispatch import Signal
+from django.utils import timezone
+
+from .models import STATUS_CHOICES, VoteCampaign
+
+# Sent once per transition, by the process which stored the new status
+campaign_status_changed = Signal(providing_args=['campaign', 'old_status', 'new_status'])
+
+
+def get_period_q(status, current_time):
+    """
+    SQL condition of campaigns which should have status at current_time by their start and end time
+    """
+    if status == 'NOT_START':
+        return Q(start_time__gt=current_time)
+    if status == 'CLOSED':
+        return Q(end_time__lte=current_time)
+    return Q(start_time__lte=current_time, end_time__gt=current_time)
+
+
+def apply(campaign, status):
+    """
+    Store new status of a campaign and fire campaign_status_changed, unless another process did first.
+    Return True if the transition was applied here.
+    """
+    old_status = campaign.status
+    if not VoteCampaign.objects.filter(campaign_id=campaign.campaign_id, status=old_status).update(status=status):
+        return False
+    campaign.status = status
+    campaign_status_changed.send(sender=VoteCampaign, campaign=campaign, old_status=old_status, new_status=status)
+    return True
+
+
+def apply_due(campaign_ids=None, current_time=None):
+    """
+    Apply transitions of campaigns whose start or end time passed since their status was stored.
+    Return list of (campaign, old_status) applied here.
+    """
+    if current_time is None:
+        current_time = timezone.now()
+    applied = []
+    for status, _ in STATUS_CHOICES:
+        campaigns = VoteCampaign.objects.filter(get_period_q(status, current_time)).exclude(status=status)
+        if campaign_ids:
+            campaigns = campaigns.filter(campaign_id__in=campaign_ids)
+        for campaign in campaigns.order_by('campaign_id'):
+            old_status = campaign.status
+            if apply(campaign, status):
+                applied.append((campaign, old_status))
+    return applied
+
+
+def get_next_transition_time(current_time=None):
+    """
+    Return time of the next transition of any campaign, or None if all of them are closed
+    """
+    if current_time is None:
+        current_time = timezone.now()
+    times = VoteCampaign.objects.aggregate(
+        start_time=Min('start_time', filter=Q(start_time__gt=current_time)),
+        end_time=Min('end_time', filter=Q(end_time__gt=current_time)),
+    )
+    times = [value for value in times.values() if value is not None]
+    return min(times) if times else None
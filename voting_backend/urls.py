@@ -1,12 +1,20 @@
 from django.contrib import admin
 from django.urls import path
 
-from .views import (CampaignDetailRetrieveView, CampaignOverviewListView,
-                    VoteRecordView)
+from .metrics import metrics_view
+from .views import (CampaignDetailRetrieveView, CampaignLiveView,
+                    CampaignOverviewListView, CampaignPollView, VoteBatchView,
+                    VoteExportView, VoteRecordView)
 
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('campaign/', CampaignOverviewListView.as_view(), name='campaign_list'), # GET
     path('campaign/<int:campaign_id>/', CampaignDetailRetrieveView.as_view(), name='campaign_detail'), # GET
-    path('vote/<int:campaign_id>/', VoteRecordView.as_view(), name='vote') # POST
+    path('campaign/<int:campaign_id>/live/', CampaignLiveView.as_view(), name='campaign_live'), # GET
+    path('campaign/<int:campaign_id>/poll/', CampaignPollView.as_view(), name='campaign_poll'), # GET
+    path('vote/<int:campaign_id>/', VoteRecordView.as_view(), name='vote'), # POST
+    path('vote/<int:campaign_id>/batch/', VoteBatchView.as_view(), name='vote_batch'), # POST
+    path('export/records/', VoteExportView.as_view(), {'kind': 'records'}, name='record_export'), # GET
+    path('export/results/', VoteExportView.as_view(), {'kind': 'results'}, name='result_export'), # GET
+    path('metrics', metrics_view, name='metrics') # GET
 ]
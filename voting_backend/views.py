@@ -1,47 +1,142 @@
-import hashlib
+import json
+import logging
 
-from django.core.exceptions import ObjectDoesNotExist
-from django.db import IntegrityError
-from django.db.models import Count, Prefetch, prefetch_related_objects
-from django.http import Http404
-from django.utils import timezone
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Coalesce
+from django.http import Http404, HttpResponse, StreamingHttpResponse
+from django.utils.dateparse import parse_datetime
 from rest_framework import status
 from rest_framework.generics import (GenericAPIView, ListAPIView,
                                     RetrieveAPIView)
+from rest_framework.permissions import IsAdminUser
+from rest_framework.renderers import BrowsableAPIRenderer, JSONRenderer
 from rest_framework.response import Response
 
+from . import (duplicates, export, hashers, ingestion, live, rendering,
+              result_cache, snapshots, throttling)
+from .campaign_cache import campaign_cache
+from .counters import shard_for
 from .exceptions import (AlreadyVoteException, InternalServerError,
-                        InvalidFormException, NotFoundException)
-from .forms import VoteRecordForm
-from .models import VoteCampaign, VoteOption, VoteRecord
+                        InvalidFormException, NotFoundException,
+                        TooManyRequestsException)
+from .filters import CampaignFilter
+from .forms import HKIDField, VoteRecordForm
+from .metrics import measure_serializer
+from .models import VoteCampaign, VoteCounter, VoteRecord
+from .pagination import CampaignKeysetPagination
+from .routers import ReplicaReadMixin
 from .serializers import (VoteCampaignDetailSerializer,
-                        VoteCampaignListSerializer, VoteRecordSerializer)
+                        VoteCampaignListSerializer, VoteCampaignLiteSerializer,
+                        VoteRecordSerializer)
+from .statement_timeout import StatementTimeoutMixin
 
+logger = logging.getLogger(__name__)
 
-class CampaignOverviewListView(ListAPIView):
+
+class CampaignOverviewListView(StatementTimeoutMixin, ReplicaReadMixin, result_cache.ResultCacheMixin,
+                               ListAPIView):
     """
-    List all voting campaign with total number of votes
+    List all voting campaign with total number of votes,
+    filtered by status and paginated by cursor when requested.
+    Campaigns are fetched as rows of the serializer fields and rendered as the serializer would.
     """
     serializer_class = VoteCampaignListSerializer
+    renderer_classes = (rendering.CompactJSONRenderer, BrowsableAPIRenderer)
     model = VoteCampaign
+    filterset_class = CampaignFilter
+    pagination_class = CampaignKeysetPagination
+
+    def is_lite(self):
+        # Client not interested in vote count skips the aggregation
+        return self.request.query_params.get('vote_count') in ('false', '0')
+
+    def get_serializer_class(self):
+        if self.is_lite():
+            return VoteCampaignLiteSerializer
+        return super().get_serializer_class()
+
+    def get_result_cache_key(self):
+        if self.request.query_params:
+            return None
+        return result_cache.LIST_KEY
+
+    def get_result_data(self):
+        return self.get_list_data(self.get_rows())
+
+    def get_rows(self):
+        fields = self.get_serializer_class().Meta.fields
+        return self.filter_queryset(self.get_queryset()).values_list(*fields, named=True)
+
+    def get_list_data(self, rows):
+        with measure_serializer():
+            return rendering.get_campaign_list(rows, self.get_serializer_class().Meta.fields)
+
+    def list(self, request, *args, **kwargs):
+        rows = self.get_rows()
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(self.get_list_data(page))
+        return Response(self.get_list_data(rows))
 
     def get_queryset(self):
-        queryset = self.model.objects.all().annotate(
-            number_of_vote=Count('record_set')
-        ).order_by(
-            '-end_time'
+        queryset = self.model.objects.all()
+        if not self.is_lite():
+            queryset = queryset.annotate(number_of_vote=self.get_number_of_vote())
+        return queryset.order_by(
+            '-end_time',
+            '-campaign_id'
         )
-        return queryset
+
+    @staticmethod
+    def get_number_of_vote():
+        # Counters are summed per listed campaign, unless its total is frozen in a snapshot
+        total = Subquery(
+            VoteCounter.objects.filter(
+                campaign=OuterRef('pk')
+            ).order_by().values('campaign').annotate(total=Sum('count')).values('total'),
+            output_field=IntegerField()
+        )
+        if snapshots.is_enabled():
+            return Coalesce('snapshot__number_of_vote', total, 0)
+        return Coalesce(total, 0)
 
 
-class CampaignDetailRetrieveView(RetrieveAPIView):
+class CampaignDetailRetrieveView(StatementTimeoutMixin, ReplicaReadMixin, result_cache.ResultCacheMixin,
+                                 RetrieveAPIView):
     """
-    List Current Campaign Result
+    List Current Campaign Result, served from its snapshot once the campaign is final
     """
     serializer_class = VoteCampaignDetailSerializer
+    renderer_classes = (rendering.CompactJSONRenderer, BrowsableAPIRenderer)
     lookup_field = 'campaign_id'
     model = VoteCampaign
-    queryset = VoteCampaign.objects.all()
+    queryset = VoteCampaign.objects.select_related('snapshot')
+
+    def get_result_cache_key(self):
+        return result_cache.get_detail_key(self.kwargs['campaign_id'])
+
+    def get_result_data(self):
+        return self.get_campaign_data(self.get_object())
+
+    def get_campaign_data(self, obj):
+        snapshot = snapshots.get_snapshot(obj)
+        if snapshot is not None:
+            return json.loads(snapshot.body)
+        with measure_serializer():
+            data = rendering.get_campaign_details([obj])[obj.campaign_id]
+        if snapshots.is_final(obj):
+            snapshots.freeze(obj, data)
+        return data
+
+    def retrieve(self, request, *args, **kwargs):
+        obj = self.get_object()
+        snapshot = snapshots.get_snapshot(obj)
+        if snapshot is not None and request.accepted_renderer.format == 'json':
+            # Snapshot body is rendered by JSONRenderer already
+            return HttpResponse(snapshot.body, content_type='application/json')
+        return Response(self.get_campaign_data(obj))
 
     def get_object(self):
         # Leverage default get object logic for default lookup
@@ -51,31 +146,58 @@ class CampaignDetailRetrieveView(RetrieveAPIView):
             raise NotFoundException()
         except Exception:
             raise InternalServerError()
-        prefetch_related_objects([obj], Prefetch(
-            'option_set',
-            queryset=VoteOption.objects.filter(
-                campaign=obj
-            ).order_by(
-                'option_code'
-            ).annotate(
-                number_of_vote=Count('record_set')
-            )
-        ))
         return obj
 
 
+class CampaignLiveView(GenericAPIView):
+    """
+    Stream Current Campaign Result as server-sent events whenever it changes
+    """
+    renderer_classes = (live.EventStreamRenderer, JSONRenderer)
+
+    def get(self, request, *args, **kwargs):
+        campaign_id = kwargs.get('campaign_id')
+        if campaign_cache.get(campaign_id).campaign is None:
+            raise NotFoundException()
+        return live.LiveResponse(campaign_id, request.META.get('HTTP_LAST_EVENT_ID', ''))
+
+
+class CampaignPollView(GenericAPIView):
+    """
+    Long-poll Current Campaign Result, answering once it differs from the ETag in If-None-Match.
+    Only the ASGI handler waits for a change; under WSGI a wait would hold a worker thread,
+    so current results are answered at once.
+    """
+    def get(self, request, *args, **kwargs):
+        campaign_id = kwargs.get('campaign_id')
+        if campaign_cache.get(campaign_id).campaign is None:
+            raise NotFoundException()
+        if request.META.get(live.ASYNC_KEY):
+            return live.PollResponse(request, campaign_id, result_cache.get_etags(request))
+        entry = live.broadcaster.load([campaign_id]).get(campaign_id)
+        if entry is None:
+            raise NotFoundException()
+        return result_cache.to_response(request, entry)
+
+
 class VoteRecordView(GenericAPIView):
     """
-    Vote for certain Campaign
+    Vote for certain Campaign, throttled per client IP and per HKID before the form is validated
     """
     model = VoteRecord
     serializer = VoteRecordSerializer
+    throttle_classes = (throttling.VoteIPThrottle, throttling.VoterThrottle)
+
+    def throttled(self, request, wait):
+        raise TooManyRequestsException(wait)
 
     def post(self, request, *args, **kwargs):
         """
         1. Check if option and ID is included in POST form
         2. Check active campaign and option existent and the relation
-        3. Save record
+        3. Reject voters known to the duplicate vote filter without inserting
+        4. Save record and update the option counter in one transaction,
+           or hand the record to the ingestion queue in queue mode
         """
         form = VoteRecordForm(request.POST)
         form.full_clean()
@@ -84,21 +206,150 @@ class VoteRecordView(GenericAPIView):
 
         cleaned_data = form.cleaned_data
         try:
-            current_time = timezone.now()
-            campaign = VoteCampaign.objects.filter(
-                end_time__gt=timezone.make_aware(current_time, timezone.utc),
-                start_time__lte=timezone.make_aware(current_time, timezone.utc),
-            ).get(campaign_id=kwargs.get('campaign_id'))
-            option = VoteOption.objects.filter(campaign=campaign).get(option_code=cleaned_data.get('option_code'))
+            # Campaign and option codes are served from in-process cache once warm
+            entry = campaign_cache.get(kwargs.get('campaign_id'))
+            if entry.campaign is None or entry.campaign.status != 'ACTIVE':
+                raise InvalidFormException()
+            option_id = entry.options.get(cleaned_data.get('option_code'))
+            if option_id is None:
+                raise InvalidFormException()
             hkid = cleaned_data.get('hkid')
             # HKID will be hashed before saved to avoid privacy issue on storing hkid
-            hashed_hkid = hashlib.sha256(hkid.encode('utf-8')).hexdigest()
-            instance = self.model(campaign=campaign, option=option, user_id=hashed_hkid)
-            instance.save()
-            return Response(self.serializer(instance).data, status=status.HTTP_201_CREATED)
-        except ObjectDoesNotExist:
-            raise InvalidFormException()
+            hashed_hkid = hashers.hash_voter_id(hkid, entry.campaign.voter_id_algorithm)
+            instance = self.model(campaign=entry.campaign, option_id=option_id, user_id=hashed_hkid)
+            if ingestion.is_enabled():
+                accepted = ingestion.get_queue().submit(instance)
+                response_status = status.HTTP_202_ACCEPTED
+            elif duplicates.is_enabled() and duplicates.vote_filter.is_repeat(entry.campaign.campaign_id, hashed_hkid):
+                accepted = False
+            else:
+                # Option counter is updated by post_save signal within the same transaction
+                with transaction.atomic():
+                    instance.save()
+                accepted = True
+                response_status = status.HTTP_201_CREATED
+        except InvalidFormException:
+            raise
         except IntegrityError:
+            if duplicates.is_enabled():
+                duplicates.vote_filter.remember_repeat(entry.campaign.campaign_id, hashed_hkid)
+            raise AlreadyVoteException()
+        except Exception:
+            raise InternalServerError()
+        if not accepted:
             raise AlreadyVoteException()
+        if response_status == status.HTTP_201_CREATED and duplicates.is_enabled():
+            try:
+                duplicates.vote_filter.add(entry.campaign.campaign_id, hashed_hkid)
+            except Exception:
+                # Vote is recorded, a repeat of a voter missing from the filter fails on the unique index
+                logger.exception('Failed to add voter to duplicate vote filter of campaign %s',
+                                 entry.campaign.campaign_id)
+        return Response(self.serializer(instance).data, status=response_status)
+
+
+class VoteBatchView(GenericAPIView):
+    """
+    Vote for certain Campaign on behalf of many voters collected offline, for admin only
+    as it takes votes of any HKID without throttling
+    """
+    permission_classes = (IsAdminUser,)
+
+    def post(self, request, *args, **kwargs):
+        """
+        1. Check the batch is a list of votes within the size limit
+        2. Check active campaign, validate every HKID and option code in one pass
+        3. Save new records and option counters in one transaction
+        4. Return result per vote in the order of the batch
+        """
+        votes = request.data.get('votes') if isinstance(request.data, dict) else None
+        if not isinstance(votes, list) or not 0 < len(votes) <= settings.VOTE_BATCH_MAX_SIZE:
+            raise InvalidFormException()
+        if not all(isinstance(vote, dict) for vote in votes):
+            raise InvalidFormException()
+
+        try:
+            entry = campaign_cache.get(kwargs.get('campaign_id'))
+            if entry.campaign is None or entry.campaign.status != 'ACTIVE':
+                raise InvalidFormException()
+
+            results = ['INVALID_INPUT'] * len(votes)
+            # index in batch -> vote entry
+            pending = {}
+            # hashed HKID -> index of its first vote in batch
+            voters = {}
+            cleaned_hkids = HKIDField().clean_many([vote.get('hkid') for vote in votes])
+            hasher = hashers.get_hasher(entry.campaign.voter_id_algorithm)
+            for index, (vote, (hkid, error)) in enumerate(zip(votes, cleaned_hkids)):
+                option_code = vote.get('option_code')
+                option_id = entry.options.get(option_code) if isinstance(option_code, str) else None
+                if error or option_id is None:
+                    continue
+                hashed_hkid = hasher.hash(hkid)
+                if hashed_hkid in voters:
+                    results[index] = 'ALREADY_VOTE'
+                    continue
+                voters[hashed_hkid] = index
+                pending[index] = {
+                    'campaign_id': entry.campaign.campaign_id,
+                    'option_id': option_id,
+                    'user_id': hashed_hkid,
+                    'shard': shard_for(hashed_hkid, entry.campaign.counter_shards),
+                }
+
+            for index in pending:
+                results[index] = 'ALREADY_VOTE'
+            for new_entry in ingestion.write_votes(list(pending.values())):
+                results[voters[new_entry['user_id']]] = 'ACCEPTED'
+        except InvalidFormException:
+            raise
         except Exception:
             raise InternalServerError()
+        return Response({'results': results}, status=status.HTTP_200_OK)
+
+
+class VoteExportView(GenericAPIView):
+    """
+    Stream vote records or per-option results of campaigns as CSV or NDJSON, for admin only
+    """
+    permission_classes = (IsAdminUser,)
+    content_types = {
+        'csv': 'text/csv',
+        'ndjson': 'application/x-ndjson',
+    }
+
+    def get(self, request, *args, **kwargs):
+        """
+        1. Check export format, campaign and time range filters
+        2. Stream rows fetched in chunks so memory stays flat however many rows there are
+        """
+        params = request.query_params
+        output_format = params.get('output', 'csv')
+        if output_format not in export.FORMATS:
+            raise InvalidFormException()
+        try:
+            campaign_ids = [int(campaign_id) for campaign_id in params.getlist('campaign')]
+            start_time = self.parse_time(params.get('start'))
+            end_time = self.parse_time(params.get('end'))
+        except ValueError:
+            raise InvalidFormException()
+
+        if kwargs.get('kind') == 'results':
+            fields, rows = export.RESULT_FIELDS, export.iter_results(campaign_ids)
+        else:
+            fields, rows = export.RECORD_FIELDS, export.iter_records(campaign_ids, start_time, end_time)
+        response = StreamingHttpResponse(
+            export.render_lines(fields, rows, output_format),
+            content_type=self.content_types[output_format]
+        )
+        response['Content-Disposition'] = 'attachment; filename="{}.{}"'.format(kwargs.get('kind'), output_format)
+        return response
+
+    @staticmethod
+    def parse_time(value):
+        if value is None:
+            return None
+        parsed_time = parse_datetime(value)
+        if parsed_time is None:
+            raise ValueError(f'Invalid time {value}')
+        return parsed_time